@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Synthetic SAP CVE datasets for the benchmarks
+Same columns and value formats as data/sap_cve_2026.csv, at any size. The enrichment
+columns (Priority, CVSS, EPSS, KEV, CWE, product, vector...) are bootstrapped as whole rows
+from the real CSV, so their skews and correlations are kept; the identity columns
+(cve_id, Note#, Title, dates, sap_note_year) are generated, with the real share of CVEs
+listed in more than one note and the real spread of notes per year.
+
+Usage:
+    python benchmarks/generate.py 10000 100000 1000000
+    python benchmarks/generate.py 50000 --seed 7 --out /tmp/sap_cve_50k.csv
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SOURCE_CSV = REPO_ROOT / 'data' / 'sap_cve_2026.csv'
+OUTPUT_DIR = Path(__file__).resolve().parent / 'data'
+SIZES = (10_000, 100_000, 1_000_000)
+
+logger = logging.getLogger(__name__)
+
+
+def dataset_path(rows, out_dir=OUTPUT_DIR):
+    return Path(out_dir) / f"sap_cve_{rows}.csv"
+
+
+def generate_dataset(rows, seed=0, source=SOURCE_CSV):
+    """DataFrame of `rows` synthetic SAP Note rows with the columns of the source CSV"""
+    rng = np.random.default_rng(seed)
+    real = pd.read_csv(source, low_memory=False)
+    df = real.iloc[rng.integers(0, len(real), rows)].reset_index(drop=True)
+
+    # CVEs shared by several notes at the source notes-per-CVE ratio, CVE years spread as the
+    # source notes per year (recent years denser); a few notes come out the year after the CVE
+    years = real['sap_note_year'].value_counts(normalize=True).sort_index()
+    n_cves = max(int(rows * real['cve_id'].nunique() / len(real)), 1)
+    cve_years = rng.choice(years.index.to_numpy(), n_cves, p=years.to_numpy())
+    cve_seq = rng.permutation(np.concatenate([np.arange(n_cves), rng.integers(0, n_cves, rows - n_cves)]))
+    note_year = np.minimum(cve_years[cve_seq] + (rng.random(rows) < 0.1), years.index.max())
+
+    now = np.datetime64('now', 's')
+    start = pd.to_datetime(pd.Series(note_year).astype(str) + '-01-01').to_numpy().astype('datetime64[s]')
+    span = np.minimum(now - start, np.timedelta64(365 * 86400, 's')).astype(float)
+    published = start + (rng.random(rows) * span).astype('timedelta64[s]')
+    updated = np.minimum(published + (rng.exponential(200, rows) * 86400).astype('timedelta64[s]'), now)
+    note_numbers = rng.permutation(np.arange(2_900_000, 2_900_000 + rows * 2))[:rows]
+
+    df['cve_id'] = [f"CVE-{cve_years[s]}-{20000 + s}" for s in cve_seq]
+    df['Note#'] = note_numbers
+    df['note_id'] = [f"['{n}']" for n in note_numbers]
+    df['Title'] = [f"[{cve}] Security vulnerability in {product}"
+                   for cve, product in zip(df['cve_id'], df['product_l'].fillna('SAP NetWeaver'))]
+    df['datePublished'] = pd.to_datetime(published).strftime('%Y-%m-%dT%H:%M:%S')
+    df['dateUpdated'] = pd.to_datetime(updated).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    df['sap_note_year'] = note_year
+
+    # EPSS drifts a little around the bootstrapped value (same order of magnitude)
+    jitter = np.exp(rng.normal(0, 0.1, rows))
+    for col in ('epss', 'epss_l'):
+        if col in df.columns:
+            df[col] = (df[col] * jitter).clip(upper=1).round(5)
+    return df[real.columns]
+
+
+def write_dataset(rows, seed=0, out=None):
+    path = Path(out) if out else dataset_path(rows)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    generate_dataset(rows, seed).to_csv(path, index=False)
+    logger.info(f"{rows} rows -> {path} ({path.stat().st_size / (1 << 20):.1f} MB)")
+    return path
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Synthetic SAP CVE datasets (schema of sap_cve_2026.csv)')
+    parser.add_argument('rows', type=int, nargs='*', default=list(SIZES), help='Row counts to generate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='Output CSV (only with a single row count)')
+    args = parser.parse_args()
+    if args.out and len(args.rows) != 1:
+        parser.error('--out needs a single row count')
+    for rows in args.rows:
+        write_dataset(rows, args.seed, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+SAP CVE benchmark suite
+Times the dashboard and pipeline hot paths on synthetic datasets (benchmarks/generate.py)
+and appends the results to benchmarks/results.jsonl, one line per case and size. Each run
+is compared with the previous runs of the same case, size and host: a case whose best time
+is more than --threshold times the median of the last BASELINE_RUNS best times is reported
+as a regression (exit code 1 with --fail-on-regression).
+
+Cases:
+    load_data                  streamlit_app.load_data (CSV read + derivations), cache cleared
+    filter                     the dashboard Priority / year / month filter
+    sap_cve_top_priority       top priority rows + EPSS matrix (stub EPSS store, no network)
+    process_vulnerability_data Rethink scores of the top priority rows
+    csv_merger                 sap_utils.CSVMerger merge + save of the dataset and a 20% update
+    sploitscan_frame           sap_patchday.sploitscan_frame (the notebooks' dataframeSplotscan)
+    write_output_csv           CVEDataUpdater.write_output_csv with 10% of the rows updated
+
+Usage:
+    python benchmarks/run.py                       # 10k and 100k rows
+    python benchmarks/run.py --rows 1000000 --repeat 1
+    python benchmarks/run.py --cases load_data filter --no-record
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+UPDATER_DIR = REPO_ROOT / 'sap_cve_updater'
+for path in (REPO_ROOT, UPDATER_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from generate import dataset_path, write_dataset  # noqa: E402
+
+RESULTS_FILE = BENCH_DIR / 'results.jsonl'
+DEFAULT_ROWS = (10_000, 100_000)
+BASELINE_RUNS = 5
+THRESHOLD = 1.25
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silences the prints (and ANSI banners) of the code under test"""
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+
+def import_app():
+    """streamlit_app run once in bare mode (no server) for its cached functions"""
+    import streamlit.logger
+
+    logging.disable(logging.WARNING)  # bare mode warns on every st.* call
+    try:
+        with quiet(), contextlib.chdir(REPO_ROOT):
+            import streamlit_app
+    finally:
+        logging.disable(logging.NOTSET)
+    streamlit.logger.set_log_level('error')  # and on every cached call
+    return streamlit_app
+
+
+def stub_epss(cve_ids, seed=0, days=30):
+    """EPSSMatrix of random-walk series for cve_ids, standing in for the local EPSS store"""
+    from sap_epss import EPSSMatrix
+
+    rng = np.random.default_rng(seed)
+    cve_ids = pd.unique(pd.Series(list(cve_ids), dtype=object))
+    base = rng.lognormal(-2, 1.5, (len(cve_ids), 1)).clip(max=100)
+    walk = np.exp(np.cumsum(rng.normal(0, 0.05, (len(cve_ids), days)), axis=1))
+    values = (base * walk).clip(max=100).astype(np.float32)
+    values[rng.random(len(cve_ids)) < 0.05] = np.nan  # CVEs without EPSS
+    end = np.datetime64('today', 'D')
+    return EPSSMatrix(cve_ids, end - np.arange(days)[::-1], values)
+
+
+def sploitscan_records(df):
+    """One SploitScan-like record per CVE of df (fields read by sploitscan_frame)"""
+    rows = df.drop_duplicates(subset=['cve_id']).to_dict('records')
+    return [{
+        'CVE Data': {
+            'cveMetadata': {'cveId': r['cve_id'], 'datePublished': r['datePublished'],
+                            'dateUpdated': r['dateUpdated']},
+            'containers': {'cna': {
+                'descriptions': [{'lang': 'en', 'value': r['descriptions']}],
+                'affected': [{'vendor': 'SAP_SE', 'product': r['product_l']}],
+                'problemTypes': [{'descriptions': [{'cweId': r['cweId'], 'description': r['cweId']}]}],
+                'references': [{'url': f"https://me.sap.com/notes/{r['Note#']}"}],
+            }},
+        },
+        'EPSS Data': {'data': [{'cve': r['cve_id'], 'epss': r['epss'], 'percentile': r['percentile']}]},
+        'Priority': {'Priority': r['priority_l']},
+    } for r in rows]
+
+
+# ==================== CASES ====================
+# Each case is setup(ctx) -> run(), only run() is timed
+
+def case_load_data(ctx):
+    app = ctx['app']
+    patches = [
+        mock.patch.object(app, 'DATA_FILES', {True: str(ctx['csv']), False: str(ctx['csv'])}),
+        mock.patch.object(app, 'dataset_partitions', lambda use_history_file: []),
+        mock.patch.object(app, 'use_master_store', lambda use_history_file: False),
+    ]
+
+    def run():
+        with contextlib.ExitStack() as stack:
+            for patch in patches:
+                stack.enter_context(patch)
+            app.load_data.clear()
+            ctx['df'] = app.load_data(False, f"bench:{ctx['rows']}")
+    return run
+
+
+def case_filter(ctx):
+    df = ctx['df']
+    priorities = df['Priority'].unique().tolist()
+    years = sorted(df['sap_note_year'].unique().tolist())[-3:]
+    months = df['monthName'].unique().tolist()
+
+    def run():
+        ctx['filtered'] = df[
+            (df['Priority'].isin(priorities)) &
+            (df['sap_note_year'].isin(years)) &
+            (df['monthName'].isin(months))
+        ]
+    return run
+
+
+def case_sap_cve_top_priority(ctx):
+    app = ctx['app']
+    store = stub_epss(ctx['df']['cve_id'])
+
+    def epss_matrix(cves, live=False):
+        cves = pd.unique(pd.Series(list(cves), dtype=object))
+        return type(store)(cves, store.dates, store.take(cves))
+
+    def run():
+        with mock.patch.object(app, 'epss_matrix', epss_matrix):
+            app.sap_cve_top_priority.clear()
+            ctx['top'], ctx['top_epss'] = app.sap_cve_top_priority(ctx['filtered'], ('bench', ctx['rows']))
+    return run
+
+
+def case_process_vulnerability_data(ctx):
+    app = ctx['app']
+
+    def run():
+        app.process_vulnerability_data.clear()
+        app.process_vulnerability_data(ctx['top'], ('bench', ctx['rows']), ctx['top_epss'])
+    return run
+
+
+def case_csv_merger(ctx):
+    with quiet():
+        from sap_utils import CSVMerger
+
+    update = Path(ctx['tmp']) / 'update.csv'
+    raw = pd.read_csv(ctx['csv'], low_memory=False)
+    part = raw.sample(frac=0.2, random_state=0)
+    part['epss'] = (part['epss'] * 1.1).round(5)
+    part.to_csv(update, index=False)
+    output = Path(ctx['tmp']) / 'merged.csv'
+
+    def run():
+        with quiet():
+            CSVMerger(str(output)).add_file(str(ctx['csv']), 1).add_file(str(update), 2).merge().save()
+    return run
+
+
+def case_sploitscan_frame(ctx):
+    from sap_patchday import sploitscan_frame
+
+    records = sploitscan_records(pd.read_csv(ctx['csv'], low_memory=False))
+
+    def run():
+        sploitscan_frame(records)
+    return run
+
+
+def case_write_output_csv(ctx):
+    with quiet():
+        from sap_cve_updater_v3 import CVEDataUpdater
+
+        updater = CVEDataUpdater(ctx['csv'], Path(ctx['tmp']) / 'updated.csv', Path(ctx['tmp']) / 'updater.log',
+                                 Path(ctx['tmp']) / 'checkpoint.json')
+    with open(ctx['csv'], encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        updater.fieldnames = reader.fieldnames
+        updater.all_rows = list(reader)
+    updater.updated_indices = {i: {**row, 'epss': '0.5'} for i, row in enumerate(updater.all_rows) if i % 10 == 0}
+
+    def run():
+        updater.write_output_csv()
+    return run
+
+
+CASES = {
+    'load_data': case_load_data,
+    'filter': case_filter,
+    'sap_cve_top_priority': case_sap_cve_top_priority,
+    'process_vulnerability_data': case_process_vulnerability_data,
+    'csv_merger': case_csv_merger,
+    'sploitscan_frame': case_sploitscan_frame,
+    'write_output_csv': case_write_output_csv,
+}
+# Cases that need the output of an earlier one, run (untimed) when only they are selected
+REQUIRES = {
+    'filter': ['load_data'],
+    'sap_cve_top_priority': ['load_data', 'filter'],
+    'process_vulnerability_data': ['load_data', 'filter', 'sap_cve_top_priority'],
+}
+
+
+# ==================== RESULTS ====================
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                               capture_output=True, text=True, timeout=30).stdout.strip()
+        return f"{commit}-dirty" if commit and dirty else commit
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def read_results(path=RESULTS_FILE):
+    if not Path(path).exists():
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline(history, case, rows, host):
+    """Median best time of the last BASELINE_RUNS runs of a case on this host, None if none"""
+    times = [r['min'] for r in history if r['case'] == case and r['rows'] == rows and r['host'] == host]
+    return statistics.median(times[-BASELINE_RUNS:]) if times else None
+
+
+def time_case(run, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def run_suite(sizes, cases, repeat, results_file=RESULTS_FILE, record=True, threshold=THRESHOLD):
+    """Runs the cases on every size; returns the result rows (with baseline and regression)"""
+    history = read_results(results_file)
+    meta = {'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'commit': git_commit(),
+            'host': platform.node(), 'python': platform.python_version(), 'pandas': pd.__version__}
+    app = import_app()
+    needed = [c for c in CASES if c in cases or any(c in REQUIRES.get(x, []) for x in cases)]
+    results = []
+    for rows in sizes:
+        csv_file = dataset_path(rows)
+        if not csv_file.exists():
+            write_dataset(rows)
+        with tempfile.TemporaryDirectory() as tmp:
+            ctx = {'app': app, 'rows': rows, 'csv': csv_file, 'tmp': tmp}
+            for case in needed:
+                run = CASES[case](ctx)
+                if case not in cases:
+                    run()
+                    continue
+                times = time_case(run, repeat)
+                base = baseline(history, case, rows, meta['host'])
+                result = {**meta, 'case': case, 'rows': rows, 'repeat': repeat,
+                          'min': round(min(times), 6), 'median': round(statistics.median(times), 6),
+                          'baseline': round(base, 6) if base else None,
+                          'regression': bool(base and min(times) > threshold * base)}
+                results.append(result)
+                print_result(result)
+    if record and results:
+        with open(results_file, 'a', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+    return results
+
+
+def print_result(r):
+    change = f"{(r['min'] / r['baseline'] - 1) * 100:+6.1f}%" if r['baseline'] else '    new'
+    flag = '  REGRESSION' if r['regression'] else ''
+    print(f"{r['case']:28s} {r['rows']:>9,d} rows  min {r['min'] * 1000:10.1f} ms  "
+          f"median {r['median'] * 1000:10.1f} ms  {change}{flag}", flush=True)
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='SAP CVE benchmark suite on synthetic datasets')
+    parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_ROWS), help='Dataset sizes')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case (best and median kept)')
+    parser.add_argument('--results', default=str(RESULTS_FILE), help='JSON Lines file of the results')
+    parser.add_argument('--no-record', action='store_true', help='Do not append the results')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='Regression when best time > threshold x baseline')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit code 1 on regressions')
+    args = parser.parse_args()
+
+    results = run_suite(args.rows, args.cases, args.repeat, args.results, not args.no_record, args.threshold)
+    regressions = [r for r in results if r['regression']]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against the last {BASELINE_RUNS} runs")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,16 @@
 import pandas as pd
 import numpy as np
-import tabula
 import re
+import sys
 import argparse
 from pathlib import Path
 
+from pdf_tables import bulletin_notes, read_pdfs_tables
+
+# sap_cwe.py lives in the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from sap_cwe import normalize_cwe_ids
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Process CVE data and generate a CSV file.')
@@ -103,83 +109,8 @@ def dataframe_splotscan(file_json):
     return data
 
 def standardize_cwe_ids(df):
-    """Standardize CWE IDs in the DataFrame."""
-    cwe_mappings = {
-        'Cross-Site Scripting': 'CWE-79',
-        'Cross Site Scripting': 'CWE-79',
-        'Cross-Site Scripting (XSS)': 'CWE-79',
-        'Missing Authorization check': 'CWE-862',
-        'Missing Authorization': 'CWE-862',
-        'Missing Authorization Check': 'CWE-862',
-        'CVE-2021-21484': 'CWE-863',
-        'CVE-2023-30533': 'CWE-1321',
-        'CVE-2022-35737': 'CWE-129',
-        'CVE-2023-44487': 'CWE-400',
-        'CVE-2020-6308': 'CWE-918',
-        'CVE-2020-6207': 'CWE-306',
-        'CVE-2021-33690': 'CWE-918',
-        'CVE-2021-38163': 'CWE-78',
-        'CVE-2021-44235': 'CWE-78',
-        'CVE-2021-37531': 'CWE-78',
-        'CVE-2021-33663': 'CWE-74',
-        'CVE-2024-33007': 'CWE-79',
-        'CVE-2021-27608': 'CWE-428',
-        'CVE-2021-27635': 'CWE-112',
-        'CVE-2021-27617': 'CWE-112',
-        'CVE-2021-40499': 'CWE-94',
-        'CVE-2021-27611': 'CWE-94',
-        'CVE-2021-21466': 'CWE-94',
-        'CVE-2021-27602': 'CWE-94',
-        'CVE-2021-44231': 'CWE-94',
-        'CVE-2021-21480': 'CWE-94',
-        'CVE-2020-10683': 'CWE-611',
-        'CVE-2021-21444': 'CWE-1021',
-        'CVE-2019-17495': 'CWE-352',
-        'CVE-2021-44151': 'CWE-330',
-        'CVE-2013-3587': 'CWE-200',
-        'CVE-2019-0388': 'CWE-290',
-        'CVE-2020-26816': 'CWE-312',
-        'CVE-2020-6215': 'CWE-601',
-        'CVE-2020-6224': 'CWE-532',
-        'CVE-2021-21445': 'CWE-444',
-        'CVE-2021-21449': 'CWE-119',
-        'CVE-2021-21465': 'CWE-89',
-        'CVE-2021-21469': 'CWE-200',
-        'CVE-2021-21470': 'CWE-611',
-        'CVE-2021-21472': 'CWE-306',
-        'CVE-2021-21474': 'CWE-326',
-        'CVE-2021-21475': 'CWE-22',
-        'CVE-2021-21476': 'CWE-601',
-        'CVE-2021-21477': 'CWE-94',
-        'CVE-2021-21478': 'CWE-601',
-        'CVE-2021-21488': 'CWE-502',
-        'CVE-2021-21491': 'CWE-601',
-        'CVE-2021-27610': 'CWE-287',
-        'CVE-2021-27612': 'CWE-601',
-        'CVE-2021-27638': 'CWE-20',
-        'CVE-2021-33672': 'CWE-116',
-        'CVE-2021-33676': 'CWE-862',
-        'CVE-2021-33685': 'CWE-22',
-        'CVE-2021-33687': 'CWE-200',
-        'CVE-2021-33688': 'CWE-89',
-        'CVE-2021-38150': 'CWE-312',
-        'CVE-2021-38176': 'CWE-89',
-        'CVE-2021-38177': 'CWE-476',
-        'CVE-2021-40497': 'CWE-668',
-        'CVE-2021-42064': 'CWE-89',
-        'CVE-2021-42068': 'CWE-20',
-        'CVE-2021-44232': 'CWE-22',
-        'CVE-2023-0215': 'CWE-416',
-        'CVE-2020-6369': 'CWE-798',
-        'CVE-2020-13936': 'CWE-94',
-        'CVE-2021-21446': 'CWE-400',
-        'CVE-2021-21482': 'CWE-200',
-        'CVE-2021-21483': 'CWE-200',
-        'CVE-2021-21485': 'CWE-200',
-        'CVE-2024-47593': 'CWE-524',
-        'CVE-2022-26104': 'CWE-862',
-    }
-    df['cweId'] = df['cweId'].replace(cwe_mappings)
+    """Standardize CWE IDs in the DataFrame (lookup table: data/cwe_normalization.csv)."""
+    df['cweId'] = normalize_cwe_ids(df['cweId'], df['cve_id'])
     return df
 
 def main():
@@ -187,21 +118,15 @@ def main():
     output_file = Path(args.output)
 
     # Load and process PDF data
-    dft_2021 = tabula.read_pdf('2021 Blog.pdf', pages='all', stream=True, pandas_options={'header': None})
-    dft_2022 = tabula.read_pdf('2022 12 Patch Day Blog V9.0.pdf', pages='all', stream=True, pandas_options={'header': None})
-    dft_2023 = tabula.read_pdf('2023 12 Patch Day Blog V2.0 (1).pdf', pages='all', stream=True, pandas_options={'header': None})
-
-    dftt_2021 = new_header(dft_2021)
-    dftt_2022 = new_header(dft_2022)
-    dftt_2023 = new_header(dft_2023)
-
-    sap_2021 = pd.concat(dftt_2021)
-    sap_2022 = pd.concat(dftt_2022)
-    sap_2023 = pd.concat(dftt_2023)
-
-    sap_2021_notes = merge_title(sap_2021)
-    sap_2022_notes = merge_title(sap_2022)
-    sap_2023_notes = merge_title(sap_2023)
+    pdf_tables = read_pdfs_tables(['2021 Blog.pdf', '2022 12 Patch Day Blog V9.0.pdf', '2023 12 Patch Day Blog V2.0 (1).pdf'])
+    dft_2021 = pdf_tables['2021 Blog.pdf']
+    dft_2022 = pdf_tables['2022 12 Patch Day Blog V9.0.pdf']
+    dft_2023 = pdf_tables['2023 12 Patch Day Blog V2.0 (1).pdf']
+
+    # Header, title blocks and cve_id in one pass per year (see pdf_tables --benchmark)
+    sap_2021_notes = bulletin_notes(dft_2021)
+    sap_2022_notes = bulletin_notes(dft_2022)
+    sap_2023_notes = bulletin_notes(dft_2023)
 
     # Load and process HTML data
     sap_2024_all = pd.read_html('https://support.sap.com/en/my-support/knowledge-base/security-notes-news/bulletin-2024.html', flavor='html5lib')
@@ -5,10 +5,11 @@ Script to extract CVE-IDs from SAP security notes for a specified year and save
 
 import argparse
 import pandas as pd
-import tabula
 import re
 from typing import List
 
+from pdf_tables import read_pdf_tables
+
 # Configure logging
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,8 +20,8 @@ def extract_cve_ids_from_pdf(pdf_path: str) -> List[str]:
     Extract CVE-IDs from a PDF file containing SAP security notes.
     """
     try:
-        # Read the PDF using tabula
-        df_list = tabula.read_pdf(pdf_path, pages='all', stream=True, pandas_options={'header': None})
+        # Read the PDF using tabula (page shards in parallel, cached by PDF hash)
+        df_list = read_pdf_tables(pdf_path)
         
         # Process the extracted data
         cve_ids = []
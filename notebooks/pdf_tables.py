@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Parallel, cached table extraction from the SAP Patch Day blog PDFs (2021-2023).
+
+tabula.read_pdf(pages='all') parses every page of a PDF in one process. Here the pages
+are split in ranges (shards) that a process pool extracts concurrently. Each worker imports
+tabula once, and with jpype installed (see requirements.txt) tabula-py starts its JVM
+in-process on the first call and reuses it for every later shard of that worker.
+
+The tables of each PDF are cached under .pdf_cache/ by the SHA-256 of the file, so a re-run
+on an unchanged PDF does not touch tabula at all.
+
+bulletin_notes() turns the page tables of a blog into one row per SAP Note.
+
+Usage:
+    python pdf_tables.py "2021 Blog.pdf" "2022 12 Patch Day Blog V9.0.pdf" --workers 8
+    python pdf_tables.py *.pdf --benchmark
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(__file__).resolve().parent / '.pdf_cache'
+CACHE_VERSION = 1
+PAGES_PER_SHARD = 4
+TABULA_OPTIONS = dict(stream=True, pandas_options={'header': None})
+
+CVE_PATTERN = r'(CVE-....-\d+)'
+
+_PAGES_DICT = re.compile(rb'<<((?:(?!>>).)*?/Type\s*/Pages\b(?:(?!>>).)*)', re.S)
+_PAGE_COUNT = re.compile(rb'/Count\s+(\d+)')
+
+_tabula = None
+
+
+def pdf_sha256(pdf_path: str) -> str:
+    """SHA-256 of the PDF contents, the cache key of its tables"""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pdf_page_count(pdf_path: str) -> Optional[int]:
+    """
+    Number of pages from the /Count of the page tree root, without a PDF library.
+
+    Returns None when the page tree is not readable as plain text (e.g. inside compressed
+    object streams); the PDF is then extracted as a single shard.
+    """
+    data = Path(pdf_path).read_bytes()
+    counts = [int(c) for d in _PAGES_DICT.findall(data) for c in _PAGE_COUNT.findall(d)]
+    return max(counts) if counts else None
+
+
+def page_shards(n_pages: Optional[int], shard_size: int = PAGES_PER_SHARD) -> List[str]:
+    """tabula page ranges ('1-4', '5-8', ...) covering n_pages, in page order"""
+    if not n_pages:
+        return ['all']
+    return [f'{start}-{min(start + shard_size - 1, n_pages)}'
+            for start in range(1, n_pages + 1, shard_size)]
+
+
+def _init_worker() -> None:
+    """Process pool initializer: one tabula import (and JVM) per worker"""
+    global _tabula
+    import tabula
+    _tabula = tabula
+
+
+def _read_shard(pdf_path: str, pages: str) -> List[pd.DataFrame]:
+    if _tabula is None:
+        _init_worker()
+    return _tabula.read_pdf(pdf_path, pages=pages, **TABULA_OPTIONS)
+
+
+def _cache_file(sha: str, cache_dir: Path) -> Path:
+    return Path(cache_dir) / f'{sha}.v{CACHE_VERSION}.pkl'
+
+
+def _read_cache(path: Path) -> Optional[List[pd.DataFrame]]:
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _write_cache(path: Path, tables: List[pd.DataFrame]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def read_pdfs_tables(pdf_paths: Sequence[str], workers: Optional[int] = None,
+                     shard_size: int = PAGES_PER_SHARD, cache_dir: Path = CACHE_DIR,
+                     use_cache: bool = True) -> Dict[str, List[pd.DataFrame]]:
+    """
+    Tables of several PDFs, same result as tabula.read_pdf(pages='all', stream=True,
+    pandas_options={'header': None}) for each one.
+
+    The shards of all the uncached PDFs go to one process pool, so a full rebuild keeps
+    every core busy even when one PDF is much longer than the others.
+
+    Args:
+        pdf_paths: PDF files
+        workers: worker processes, defaults to os.cpu_count()
+        shard_size: pages per tabula call
+        cache_dir: directory of the table cache
+        use_cache: False re-extracts (and refreshes the cache)
+
+    Returns:
+        {pdf_path: [DataFrame per table, in page order]}
+    """
+    tables: Dict[str, List[pd.DataFrame]] = {}
+    pending = {}
+    for pdf_path in dict.fromkeys(pdf_paths):
+        cache_file = _cache_file(pdf_sha256(pdf_path), cache_dir)
+        cached = _read_cache(cache_file) if use_cache else None
+        if cached is not None:
+            logger.info(f"{pdf_path}: {len(cached)} tables from cache")
+            tables[pdf_path] = cached
+        else:
+            pending[pdf_path] = cache_file
+
+    if pending:
+        jobs = [(pdf_path, pages) for pdf_path in pending
+                for pages in page_shards(pdf_page_count(pdf_path), shard_size)]
+        workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+        logger.info(f"Extracting {len(pending)} PDFs: {len(jobs)} shards on {workers} workers")
+        # spawn: the workers start their own JVM instead of inheriting the parent's state
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_init_worker) as executor:
+            results = executor.map(_read_shard, *zip(*jobs))
+            for (pdf_path, _), shard_tables in zip(jobs, results):
+                tables.setdefault(pdf_path, []).extend(shard_tables)
+        for pdf_path, cache_file in pending.items():
+            tables.setdefault(pdf_path, [])
+            _write_cache(cache_file, tables[pdf_path])
+            logger.info(f"{pdf_path}: {len(tables[pdf_path])} tables extracted")
+
+    return {pdf_path: tables[pdf_path] for pdf_path in dict.fromkeys(pdf_paths)}
+
+
+def read_pdf_tables(pdf_path: str, **kwargs) -> List[pd.DataFrame]:
+    """Tables of one PDF, see read_pdfs_tables"""
+    return read_pdfs_tables([pdf_path], **kwargs)[pdf_path]
+
+
+def bulletin_notes(tables: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    One row per SAP Note from the page tables of a Patch Day blog PDF.
+
+    The first row of the first table is the header; tables of another width (legends,
+    summaries) are skipped. A note starts at each row with a CVSS value and its Title
+    continues on the following rows, which are joined in one pass over the concatenated
+    pages. cve_id is extracted once from the joined titles, so a CVE ID wrapped to a
+    continuation line is found too.
+
+    Args:
+        tables: tables from read_pdf_tables, in page order
+
+    Returns:
+        DataFrame with the header columns plus cve_id, Note# as int
+    """
+    header = tables[0].iloc[0].tolist()
+    frames = [tables[0].iloc[1:]] + [t for t in tables[1:] if t.shape[1] == len(header)]
+    df = pd.concat(frames, ignore_index=True)
+    df.columns = header
+
+    blocks = df['CVSS'].notna().cumsum().to_numpy()
+    starts = np.flatnonzero(np.r_[True, blocks[1:] != blocks[:-1]])
+    pieces = (df['Title'].dropna().astype(str) + ' ').reindex(df.index, fill_value='')
+    titles = np.add.reduceat(pieces.to_numpy(dtype=object), starts) if len(df) else []
+
+    # first non-null value of each block, as groupby.agg('first')
+    notes = df.drop(columns='Title').groupby(blocks, sort=False).first()
+    notes.insert(header.index('Title'), 'Title', pd.Series(titles, index=notes.index).str.strip())
+    notes['cve_id'] = notes['Title'].str.extract(CVE_PATTERN, expand=False)
+
+    notes = notes.replace({'Title': {'': np.nan}}).dropna()
+    notes = notes[notes['Note#'] != 'Note#']
+    notes['Note#'] = notes['Note#'].astype(int)
+    return notes.reset_index(drop=True)
+
+
+def benchmark_post_processing(tables_by_pdf: Dict[str, List[pd.DataFrame]], repeat: int = 5) -> pd.DataFrame:
+    """
+    Best-of-repeat seconds of create_rawdata.new_header + merge_title against bulletin_notes
+    on the same page tables, with the notes each one finds.
+    """
+    from create_rawdata import merge_title, new_header
+
+    def legacy(tables):
+        return merge_title(pd.concat(new_header([t.copy() for t in tables])))
+
+    def best(fn, tables):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn(tables)
+            times.append(time.perf_counter() - start)
+        return min(times), len(result)
+
+    rows = []
+    for pdf_path, tables in tables_by_pdf.items():
+        legacy_s, legacy_notes = best(legacy, tables)
+        new_s, new_notes = best(bulletin_notes, tables)
+        rows.append(dict(pdf=pdf_path, tables=len(tables), legacy_s=legacy_s, legacy_notes=legacy_notes,
+                         bulletin_s=new_s, bulletin_notes=new_notes, speedup=legacy_s / new_s))
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract (and cache) the tables of SAP Patch Day PDFs.")
+    parser.add_argument('pdfs', nargs='+', help="PDF files")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--shard-size', type=int, default=PAGES_PER_SHARD, help="Pages per tabula call")
+    parser.add_argument('--no-cache', action='store_true', help="Re-extract even if cached")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Time bulletin_notes against new_header + merge_title on the tables")
+    args = parser.parse_args()
+
+    pdf_tables = read_pdfs_tables(args.pdfs, workers=args.workers, shard_size=args.shard_size,
+                                  use_cache=not args.no_cache)
+    if args.benchmark:
+        print(benchmark_post_processing(pdf_tables).to_string(index=False))
@@ -2,13 +2,14 @@ import io
 import pandas as pd
 import numpy as np
 import airbyte as ab
-import tabula
 import requests
 from typing import List, Dict, Any
 
+from pdf_tables import bulletin_notes, read_pdf_tables, read_pdfs_tables
+
 def extract_pdf_data(pdf_path: str) -> List[pd.DataFrame]:
     """
-    Extract data from PDF using Tabula
+    Extract data from PDF using Tabula (page shards in parallel, cached by PDF hash)
     
     Args:
         pdf_path (str): Path to the PDF file
@@ -16,7 +17,7 @@ def extract_pdf_data(pdf_path: str) -> List[pd.DataFrame]:
     Returns:
         List[pd.DataFrame]: List of DataFrames extracted from PDF
     """
-    return tabula.read_pdf(pdf_path, pages='all', stream=True, pandas_options={'header': None})
+    return read_pdf_tables(pdf_path)
 
 def process_pdf_headers(dataframes: List[pd.DataFrame]) -> List[pd.DataFrame]:
     """
@@ -116,12 +117,12 @@ def create_sap_notes_pipeline():
         ('2023 12 Patch Day Blog V2.0 (1).pdf', '2023_patch_notes.csv')
     ]
     
+    # All the PDFs share one process pool
+    pdf_tables = read_pdfs_tables([pdf_path for pdf_path, _ in pdf_years])
+    
     pdf_dataframes = []
     for pdf_path, csv_path in pdf_years:
-        raw_dataframes = extract_pdf_data(pdf_path)
-        processed_dataframes = process_pdf_headers(raw_dataframes)
-        merged_df = pd.concat(processed_dataframes)
-        final_df = merge_pdf_titles(merged_df)
+        final_df = bulletin_notes(pdf_tables[pdf_path])
         final_df.to_csv(csv_path, index=False)
         pdf_dataframes.append(final_df)
     
@@ -1,92 +1,71 @@
 import streamlit as st
 import streamlit_antd_components as sac
-import vulncheck_sdk
 import pandas as pd
 import plotly.express as px
 import logfire
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from sap_kev import KEV_MIRROR_FILE, VULNCHECK_API, read_kev_mirror, sync_kev_mirror, vulncheck_indices_client
 #import calplot
 
 # VulnCheck config
-DEFAULT_HOST = "https://api.vulncheck.com"
-DEFAULT_API = DEFAULT_HOST + "/v3"
 TOKEN = st.secrets["VULNCHECK_API"]
 YEAR = 2025
-
-# Configure the VulnCheck API client
-configuration = vulncheck_sdk.Configuration(host=DEFAULT_API)
-configuration.api_key["Bearer"] = TOKEN
+KEV_SYNC_INTERVAL = timedelta(hours=6)  # Mirror age that triggers a background sync
 
 # Config Logfire
 LOGFIRE = st.secrets["LOGFIRE"]
 logfire.configure(token=LOGFIRE)
 logfire.info('Vulncheck, {place}!', place='SAP COMPASS Vulns')
 
+# KEV index sync into the local mirror (data/vulncheck_kev.parquet, see sap_kev.py)
+def kev_sync(full=False):
+    with vulncheck_indices_client(TOKEN, VULNCHECK_API) as indices_client:
+        return sync_kev_mirror(indices_client, full=full)
+
+# One background sync at a time per server process
+@st.cache_resource
+def kev_sync_worker():
+    return {'thread': None, 'error': None}
+
+def start_kev_sync(full=False):
+    worker = kev_sync_worker()
+    if worker['thread'] is not None and worker['thread'].is_alive():
+        return
+
+    def run():
+        try:
+            _, meta = kev_sync(full)
+            worker['error'] = None
+            logfire.info('VulnCheck KEV mirror synced {meta}', meta=meta)
+        except Exception as e:
+            worker['error'] = e
+            logfire.error('VulnCheck KEV mirror sync failed: {error}', error=str(e))
+
+    worker['thread'] = threading.Thread(target=run, daemon=True)
+    worker['thread'].start()
+
+def kev_mirror_version():
+    if not KEV_MIRROR_FILE.exists():
+        return None
+    stat = os.stat(KEV_MIRROR_FILE)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
 @st.cache_data
-def get_df():
-    with vulncheck_sdk.ApiClient(configuration) as api_client:
-        indices_client = vulncheck_sdk.IndicesApi(api_client)
-
-        limit = 2000
-
-        # Initialize lists to store vendor and CVE data
-        cve = []
-        vendor = []
-        product = []
-        ransomware = []
-        date_added = []
-        cisa_date_added = []
-
-        # Make the initial request to start pagination
-        api_response = indices_client.index_vulncheck_kev_get(start_cursor="true", limit=limit)
-
-        # Process the first page of results
-        for entry in api_response.data:
-            # Directly access the first element of the list
-            cve.append(entry.cve[0])  # Since there is always one CVE in the list
-            vendor.append(entry.vendor_project)
-            product.append(entry.product)
-            ransomware.append(entry.known_ransomware_campaign_use)
-            date_added.append(entry.date_added[:10])
-
-            # Handle cisa_date_added when it's None or has a date
-            if entry.cisa_date_added is None:
-                cisa_date_added.append("none")
-            else:
-                cisa_date_added.append(entry.cisa_date_added[:10])
-
-        # Continue fetching data while there's a next cursor
-        while api_response.meta.next_cursor is not None:
-
-            # Fetch the next page using the cursor
-            api_response = indices_client.index_vulncheck_kev_get(
-                cursor=api_response.meta.next_cursor, limit=limit
-            )
-
-            # Append the new data from the next pa2025ge
-            for entry in api_response.data:
-                cve.append(entry.cve[0])
-                vendor.append(entry.vendor_project)
-                product.append(entry.product)
-                ransomware.append(entry.known_ransomware_campaign_use)
-                date_added.append(entry.date_added[:10])
-
-                # Handle cisa_date_added when it's None or has a date
-                if entry.cisa_date_added is None:
-                    cisa_date_added.append("none")
-                else:
-                    cisa_date_added.append(entry.cisa_date_added[:10])
-
-    # Create a DataFrame from the accumulated data
-    df_original = pd.DataFrame({
-        'CVE': cve,
-        'Vendor': vendor,
-        'Product': product,
-        'Ransomware': ransomware,
-        'Date Added': date_added,
-        'CISA Date Added': cisa_date_added
+def get_df(mirror_version):
+    kev, meta = read_kev_mirror()
+    if kev is None:  # Written by another mirror version: build it again
+        kev, meta = kev_sync(full=True)
+    df_original = kev.rename(columns={
+        'cve': 'CVE',
+        'vendor': 'Vendor',
+        'product': 'Product',
+        'ransomware': 'Ransomware',
+        'date_added': 'Date Added',
+        'cisa_date_added': 'CISA Date Added',
     })
-
-    return df_original
+    return df_original, meta
 
 # Streamlit app setup
 st.set_page_config(
@@ -104,19 +83,34 @@ sac.divider(label="<img height='96' width='96' src='https://cdn.simpleicons.org/
 
 st.title("VulnCheck Known Exploited Vulnerabilties", anchor=False)
 
-vuln_data = get_df()
+# First run: build the mirror before rendering, afterwards it is refreshed in the background
+if not KEV_MIRROR_FILE.exists():
+    with st.spinner("Downloading VulnCheck KEV index..."):
+        kev_sync(full=True)
+
+vuln_data, kev_meta = get_df(kev_mirror_version())
 
-logfire.debug('Vulncheck, {place}!', place=vuln_data)
+synced_at = datetime.fromisoformat(kev_meta['synced_at'])
+worker = kev_sync_worker()
+if datetime.now(timezone.utc) - synced_at > KEV_SYNC_INTERVAL:
+    start_kev_sync()
+
+col1, col2 = st.columns([4, 1], vertical_alignment="center")
+syncing = worker['thread'] is not None and worker['thread'].is_alive()
+col1.caption(f"KEV mirror: {kev_meta['rows']} entries, synced {synced_at:%Y-%m-%d %H:%M} UTC"
+             + (" · syncing in background..." if syncing else ""))
+col2.button(":material/sync: Sync KEV", on_click=start_kev_sync, disabled=syncing, use_container_width=True)
+if worker['error'] is not None:
+    st.warning(f"Last KEV sync failed: {worker['error']}")
+
+logfire.debug('Vulncheck, {place}!', place=kev_meta)
 
 #filtered_vuln_data = vuln_data[vuln_data['Vendor'].isin(priority_filter) & df['sap_note_year'].isin(year_filter)]
 filtered_vuln_data = vuln_data[vuln_data['Vendor'] == "SAP"]
-st.dataframe(vuln_data)
-
-df_kev = vuln_data.copy()
+st.dataframe(filtered_vuln_data, hide_index=True)
 
-df_kev['Date Added'] = pd.to_datetime(df_kev['Date Added'])
-df_kev['CISA Date Added'] = df_kev['CISA Date Added'].replace('none', pd.NaT)
-df_kev['CISA Date Added'] = pd.to_datetime(df_kev['CISA Date Added'], format='%Y-%m-%d', errors='coerce')
+# Mirror columns are already typed (dates as datetime64, missing CISA dates as NaT)
+df_kev = vuln_data
 
 # Get the current date and calculate the number of months passed in the year
 current_date = df_kev['Date Added'].max()  # Use the latest date in 'Date Added'
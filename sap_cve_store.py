@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+SAP CVE Record Store
+Local store of CVE JSON 5 records (the fields the pipeline reads), fed from a cvelistV5
+checkout or archive and updated incrementally by cveMetadata.dateUpdated, so enrichment
+reads records from disk instead of fetching one per CVE.
+
+Layout (data/cve_store/):
+    records.jsonl  one compact JSON record per line, append-only
+    index.npy      sorted (key, offset, length, updated) rows, read as a memmap
+    meta.json      store version, rows, dead bytes, last sync
+
+A lookup is a binary search on the memmapped keys plus one slice of the memory-mapped
+records file: nothing is loaded up front and no record is parsed but the one asked for.
+
+Usage:
+    python sap_cve_store.py sync ~/cvelistV5            # git checkout (cves/YYYY/NNxxx/*.json)
+    python sap_cve_store.py sync cvelistV5-main.zip     # archive, nested zips included
+    python sap_cve_store.py get CVE-2025-31324
+"""
+
+import argparse
+import io
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+STORE_DIR = DATA_DIR / 'cve_store'
+STORE_VERSION = 1
+
+DATA_FILE = 'records.jsonl'
+INDEX_FILE = 'index.npy'
+META_FILE = 'meta.json'
+
+INDEX_DTYPE = np.dtype([('key', '<i8'), ('offset', '<i8'), ('length', '<i4'), ('updated', '<i8')])
+UPDATE_CHUNK = 5000  # records compared against the index at a time
+COMPACT_RATIO = 0.5  # rewrite records.jsonl when dead bytes exceed this share
+
+CVE_FILE_PATTERN = re.compile(r'CVE-\d{4}-\d+\.json$')
+
+# containers.cna fields kept (sap_patchday.sploitscan_frame, sap_enrich)
+CNA_FIELDS = ['title', 'descriptions', 'affected', 'problemTypes', 'references', 'metrics']
+AFFECTED_FIELDS = ['vendor', 'product', 'cpes']
+
+
+def cve_key(cve_id):
+    """CVE-YYYY-NNNN -> YYYY * 10^8 + NNNN (sortable int64), -1 if not a CVE ID"""
+    parts = str(cve_id).strip().upper().split('-')
+    if len(parts) != 3 or parts[0] != 'CVE' or not (parts[1].isdigit() and parts[2].isdigit()):
+        return -1
+    return int(parts[1]) * 10**8 + int(parts[2])
+
+
+def cve_keys(cve_ids):
+    return np.fromiter((cve_key(c) for c in cve_ids), dtype=np.int64, count=len(cve_ids))
+
+
+def updated_seconds(date_updated):
+    """cveMetadata.dateUpdated -> epoch seconds (0 if missing)"""
+    if not date_updated:
+        return 0
+    return int(np.datetime64(str(date_updated).rstrip('Z')[:19], 's').astype(np.int64))
+
+
+def project_record(record):
+    """The parts of a CVE JSON 5 record the pipeline reads (drops version ranges, ADP text, ...)"""
+    containers = record.get('containers', {})
+    cna = {k: v for k, v in containers.get('cna', {}).items() if k in CNA_FIELDS}
+    if 'affected' in cna:
+        cna['affected'] = [{k: v for k, v in a.items() if k in AFFECTED_FIELDS} for a in cna['affected']]
+    adp = [{'metrics': a['metrics']} for a in containers.get('adp', []) if a.get('metrics')]
+    meta = record.get('cveMetadata', {})
+    return {
+        'dataType': record.get('dataType'),
+        'dataVersion': record.get('dataVersion'),
+        'cveMetadata': {k: meta.get(k) for k in ('cveId', 'state', 'datePublished', 'dateUpdated') if k in meta},
+        'containers': {'cna': cna, **({'adp': adp} if adp else {})},
+    }
+
+
+# ==================== SOURCES ====================
+
+def _iter_zip(zf, since=None):
+    for info in zf.infolist():
+        if info.filename.endswith('.zip'):
+            with zf.open(info) as f, zipfile.ZipFile(io.BytesIO(f.read())) as inner:
+                yield from _iter_zip(inner, since)
+        elif CVE_FILE_PATTERN.search(info.filename):
+            with zf.open(info) as f:
+                yield json.load(f)
+
+
+def iter_cvelist(source, since=None):
+    """CVE JSON 5 records of a cvelistV5 directory or zip archive
+
+    since: epoch seconds; in a directory, files not modified after it are skipped (a git pull
+    touches only the changed files). Archives are read whole, the dateUpdated check of
+    CVEStore.update keeps it incremental.
+    """
+    source = Path(source)
+    if source.is_dir():
+        for path in source.rglob('CVE-*.json'):
+            if since is not None and path.stat().st_mtime <= since:
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    yield json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"{path}: {e}")
+    else:
+        with zipfile.ZipFile(source) as zf:
+            yield from _iter_zip(zf, since)
+
+
+# ==================== STORE ====================
+
+class CVEStore:
+    """CVE ID -> projected CVE JSON 5 record, on disk"""
+
+    def __init__(self, path=STORE_DIR):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._index = None
+        self._data = None
+        self._data_file = None
+        self._stamp = None
+
+    # ---------- read ----------
+
+    def _files_stamp(self):
+        try:
+            return os.stat(self.path / INDEX_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _open(self):
+        """(index, records mmap), reopened when an update replaced the files"""
+        with self._lock:
+            stamp = self._files_stamp()
+            if stamp != self._stamp:
+                self._close()
+                self._stamp = stamp
+                if stamp is not None:
+                    self._index = np.load(self.path / INDEX_FILE, mmap_mode='r')
+                    self._data_file = open(self.path / DATA_FILE, 'rb')
+                    size = os.fstat(self._data_file.fileno()).st_size
+                    self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            if self._index is None:
+                return np.empty(0, dtype=INDEX_DTYPE), b''
+            return self._index, self._data
+
+    def _close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._data_file is not None:
+            self._data_file.close()
+        self._index, self._data, self._data_file = None, None, None
+
+    @staticmethod
+    def _rows(index, keys):
+        """Index positions of keys (-1 where missing)"""
+        pos = np.searchsorted(index['key'], keys)
+        pos = np.minimum(pos, max(len(index) - 1, 0))
+        found = (len(index) > 0) & (index['key'][pos] == keys) if len(index) else np.zeros(len(keys), bool)
+        return np.where(found, pos, -1)
+
+    def __len__(self):
+        return len(self._open()[0])
+
+    def __contains__(self, cve_id):
+        return self._rows(self._open()[0], np.array([cve_key(cve_id)]))[0] >= 0
+
+    def get(self, cve_id):
+        """Record of cve_id, None if not stored"""
+        return self.get_many([cve_id]).get(str(cve_id).strip().upper())
+
+    def get_many(self, cve_ids):
+        """{cve_id: record} for the stored CVE IDs of cve_ids"""
+        cve_ids = [str(c).strip().upper() for c in cve_ids]
+        index, data = self._open()
+        rows = self._rows(index, cve_keys(cve_ids))
+        records = {}
+        for cve_id, row in zip(cve_ids, rows):
+            if row >= 0:
+                offset, length = int(index['offset'][row]), int(index['length'][row])
+                records[cve_id] = json.loads(data[offset:offset + length])
+        return records
+
+    def updated(self, cve_ids):
+        """dateUpdated (epoch seconds) of each CVE ID, -1 if not stored"""
+        index, _ = self._open()
+        rows = self._rows(index, cve_keys(list(cve_ids)))
+        return np.where(rows >= 0, index['updated'][np.maximum(rows, 0)] if len(index) else -1, -1)
+
+    def meta(self):
+        try:
+            with open(self.path / META_FILE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # ---------- write ----------
+
+    def update(self, records, synced_at=None):
+        """Adds the records newer (dateUpdated) than the stored ones; returns the update stats"""
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            index, _ = self._open()
+            index = np.array(index)  # own copy, the memmap is replaced below
+            meta = self.meta()
+            if meta.get('version') not in (None, STORE_VERSION):
+                logger.info(f"Store version {meta.get('version')} != {STORE_VERSION}, rebuilding")
+                index, meta = np.empty(0, dtype=INDEX_DTYPE), {}
+                open(self.path / DATA_FILE, 'wb').close()
+
+            stats = {'read': 0, 'added': 0, 'updated': 0, 'unchanged': 0}
+            new_rows = []
+            with open(self.path / DATA_FILE, 'ab') as out:
+                offset = out.tell()
+                chunk = []
+                for record in records:
+                    chunk.append(record)
+                    if len(chunk) >= UPDATE_CHUNK:
+                        offset = self._append(chunk, index, out, offset, new_rows, stats)
+                        chunk = []
+                if chunk:
+                    self._append(chunk, index, out, offset, new_rows, stats)
+
+            dead = meta.get('dead_bytes', 0)
+            if new_rows:
+                written = np.concatenate(new_rows)
+                # newest version of each key wins (also among duplicates of this update)
+                new = written[np.lexsort((written['offset'], written['updated'], written['key']))[::-1]]
+                new = new[np.unique(new['key'], return_index=True)[1]]
+                replaced = np.isin(index['key'], new['key'])
+                dead += int(index['length'][replaced].sum()) + int(written['length'].sum() - new['length'].sum())
+                index = np.concatenate([index[~replaced], new])
+                index.sort(order='key')
+
+            total = int(index['length'].sum()) + dead
+            if dead and total and dead / total > COMPACT_RATIO:
+                index = self._compact(index)
+                dead = 0
+            self._write_index(index)
+            meta = {'version': STORE_VERSION, 'rows': len(index), 'dead_bytes': dead,
+                    'synced_at': synced_at if synced_at is not None else meta.get('synced_at'),
+                    'updated_at': datetime.now(timezone.utc).isoformat()}
+            with open(self.path / META_FILE, 'w') as f:
+                json.dump(meta, f)
+            logger.info(f"CVE store: {stats}, {len(index)} records")
+            return stats
+
+    def _append(self, chunk, index, out, offset, new_rows, stats):
+        projected = [project_record(r) for r in chunk]
+        cve_ids = [p['cveMetadata'].get('cveId', '') for p in projected]
+        keys = cve_keys(cve_ids)
+        updated = np.array([updated_seconds(p['cveMetadata'].get('dateUpdated')) for p in projected], dtype=np.int64)
+
+        pos = np.searchsorted(index['key'], keys)
+        pos_c = np.minimum(pos, max(len(index) - 1, 0))
+        stored = (index['key'][pos_c] == keys) if len(index) else np.zeros(len(keys), bool)
+        newer = (keys >= 0) & (~stored | (updated > (index['updated'][pos_c] if len(index) else 0)))
+
+        stats['read'] += len(chunk)
+        stats['added'] += int((newer & ~stored).sum())
+        stats['updated'] += int((newer & stored).sum())
+        stats['unchanged'] += int((~newer & (keys >= 0)).sum())
+
+        rows = np.empty(int(newer.sum()), dtype=INDEX_DTYPE)
+        for i, j in enumerate(np.flatnonzero(newer)):
+            line = json.dumps(projected[j], separators=(',', ':'), ensure_ascii=False).encode() + b'\n'
+            out.write(line)
+            rows[i] = (keys[j], offset, len(line) - 1, updated[j])
+            offset += len(line)
+        new_rows.append(rows)
+        return offset
+
+    def _compact(self, index):
+        """Rewrites records.jsonl with the live records only, in key order"""
+        self._close()
+        tmp = self.path / (DATA_FILE + '.tmp')
+        compacted = index.copy()
+        with open(self.path / DATA_FILE, 'rb') as f, open(tmp, 'wb') as out, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for i, row in enumerate(index):
+                start, length = int(row['offset']), int(row['length'])
+                compacted['offset'][i] = out.tell()
+                out.write(data[start:start + length] + b'\n')
+        self._stamp = None
+        os.replace(tmp, self.path / DATA_FILE)
+        logger.info(f"CVE store compacted: {len(index)} records")
+        return compacted
+
+    def _write_index(self, index):
+        tmp = self.path / (INDEX_FILE + '.tmp.npy')
+        np.save(tmp, index)
+        os.replace(tmp, self.path / INDEX_FILE)
+
+
+_cve_store = None
+_cve_store_lock = threading.Lock()
+
+
+def cve_store(path=STORE_DIR):
+    """Shared CVEStore of data/cve_store (empty until the first sync)"""
+    global _cve_store
+    with _cve_store_lock:
+        if _cve_store is None or _cve_store.path != Path(path):
+            _cve_store = CVEStore(path)
+        return _cve_store
+
+
+def sync_cve_store(source, path=STORE_DIR, full=False):
+    """Adds the records of a cvelistV5 directory/archive changed since the last sync"""
+    store = cve_store(path)
+    started = datetime.now(timezone.utc).timestamp()
+    since = None if full else store.meta().get('synced_at')
+    return store.update(iter_cvelist(source, since), synced_at=started)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Local CVE JSON 5 record store')
+    parser.add_argument('--store', default=str(STORE_DIR), help='Store directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sync = sub.add_parser('sync', help='Add new/updated records from a cvelistV5 directory or zip')
+    sync.add_argument('source')
+    sync.add_argument('--full', action='store_true', help='Read every file, not only the ones changed since the last sync')
+    get = sub.add_parser('get', help='Print stored records')
+    get.add_argument('cves', nargs='+')
+    sub.add_parser('stats', help='Print the store meta')
+    args = parser.parse_args()
+
+    if args.command == 'sync':
+        print(json.dumps(sync_cve_store(args.source, args.store, args.full)))
+    elif args.command == 'get':
+        print(json.dumps(cve_store(args.store).get_many(args.cves), indent=2))
+    else:
+        print(json.dumps({**cve_store(args.store).meta(), 'records': len(cve_store(args.store))}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
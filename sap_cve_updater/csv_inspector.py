@@ -2,6 +2,11 @@
 """
 CSV Inspector - Diagnóstico rápido de CSV
 Muestra información detallada sobre el archivo CSV
+
+Modo completo (--full) para exports muy grandes: el archivo se corta en bloques de bytes
+en límites de registro, cada bloque se cuenta en un proceso aparte y los Counters se
+combinan; la memoria queda acotada por el tamaño de bloque. Con --sample K se guarda
+además una muestra aleatoria uniforme de K filas (reservoir por claves aleatorias).
 """
 
 try:
@@ -10,10 +15,21 @@ try:
 except ImportError:
     pass
 
+import argparse
 import csv
+import heapq
+import io
+import os
+import random
 import sys
 import re
+import time
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+CVE_PATTERN = re.compile(r'CVE-(\d{4})-\d+', re.IGNORECASE)
+CHUNK_MB = 64
+READ_BLOCK = 1 << 24  # 16 MB por lectura al buscar límites de registro
 
 
 def inspect_csv(filename):
@@ -120,9 +136,183 @@ def inspect_csv(filename):
         sys.exit(1)
 
 
+# ==================== MODO COMPLETO (BLOQUES EN PARALELO) ====================
+
+def chunk_ranges(filename, chunk_bytes):
+    """(fin de la cabecera, [(inicio, fin)] de bloques de ~chunk_bytes que empiezan y terminan
+    en un registro), en una sola lectura del archivo
+
+    Un '\\n' solo cierra un registro si el número de comillas antes de él es par: los que
+    quedan dentro de un campo entre comillas (descripciones con saltos de línea) no cortan.
+    """
+    size = os.path.getsize(filename)
+    bounds = []
+    target = 0  # el primer límite es el fin de la cabecera
+    quotes = 0
+    pos = 0
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            end = pos + len(block)
+            offset = 0  # comillas contadas hasta block[offset]
+            while target < end:
+                rel = max(target - pos, offset)
+                quotes += block.count(b'"', offset, rel)
+                offset = rel
+                nl = block.find(b'\n', offset)
+                if nl < 0:
+                    target = end  # seguir buscando en el bloque siguiente
+                    break
+                quotes += block.count(b'"', offset, nl)
+                offset = nl + 1
+                if quotes % 2 == 0:
+                    bounds.append(pos + offset)
+                    target = pos + offset + chunk_bytes
+                else:
+                    target = pos + offset
+            quotes += block.count(b'"', offset)
+            pos = end
+    if not bounds:
+        return size, []
+    if bounds[-1] < size:
+        bounds.append(size)
+    return bounds[0], list(zip(bounds, bounds[1:]))
+
+
+def inspect_chunk(task):
+    """Counters de un bloque: filas, celdas con datos y CVEs por columna, CVEs por año,
+    y las `sample` filas con menor clave aleatoria (muestra del bloque)"""
+    filename, fieldnames, start, end, sample, seed = task
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8', errors='replace')
+    rng = random.Random(f"{seed}:{start}")
+    rows = 0
+    filled = Counter()
+    cve_stats = Counter()
+    years = Counter()
+    reservoir = []  # heap de (-clave, fila): quedan las `sample` claves menores
+    for row in csv.reader(io.StringIO(text, newline='')):
+        if not row:
+            continue
+        rows += 1
+        for col, value in zip(fieldnames, row):
+            value = value.strip()
+            if value:
+                filled[col] += 1
+                match = CVE_PATTERN.match(value)
+                if match:
+                    cve_stats[col] += 1
+                    years[match.group(1)] += 1
+        if sample:
+            key = rng.random()
+            if len(reservoir) < sample:
+                heapq.heappush(reservoir, (-key, row))
+            elif key < -reservoir[0][0]:
+                heapq.heapreplace(reservoir, (-key, row))
+    return rows, filled, cve_stats, years, [(-k, row) for k, row in reservoir]
+
+
+def inspect_csv_full(filename, workers=None, chunk_mb=CHUNK_MB, sample=0, sample_out=None, seed=None):
+    """Inspecciona el archivo completo en bloques paralelos y combina los Counters"""
+    print("="*70)
+    print(f"INSPECCIÓN COMPLETA: {filename}")
+    print("="*70)
+    
+    started = time.perf_counter()
+    with open(filename, 'r', encoding='utf-8-sig', newline='') as f:
+        fieldnames = next(csv.reader(f), [])
+    header_end, ranges = chunk_ranges(filename, chunk_mb << 20)
+    seed = seed if seed is not None else random.randrange(1 << 30)
+    tasks = [(filename, fieldnames, a, b, sample, seed) for a, b in ranges]
+    
+    total_rows = 0
+    filled, cve_stats, years = Counter(), Counter(), Counter()
+    keyed = []
+    workers = workers or os.cpu_count() or 1
+    if len(tasks) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(inspect_chunk, tasks))
+    else:
+        results = [inspect_chunk(task) for task in tasks]
+    for rows, chunk_filled, chunk_cves, chunk_years, chunk_sample in results:
+        total_rows += rows
+        filled.update(chunk_filled)
+        cve_stats.update(chunk_cves)
+        years.update(chunk_years)
+        keyed = heapq.nsmallest(sample, keyed + chunk_sample, key=lambda item: item[0]) if sample else []
+    elapsed = time.perf_counter() - started
+    
+    print(f"\n📋 COLUMNAS ({len(fieldnames)}):")
+    print("-" * 70)
+    for i, col in enumerate(fieldnames, 1):
+        print(f"  {i:2d}. '{col}'")
+    
+    size_mb = os.path.getsize(filename) / (1 << 20)
+    print(f"\n📈 ESTADÍSTICAS:")
+    print("-" * 70)
+    print(f"  Total de filas: {total_rows}")
+    print(f"  {size_mb:.1f} MB en {len(tasks)} bloques, {min(workers, max(len(tasks), 1))} procesos, {elapsed:.2f}s")
+    
+    if cve_stats:
+        print(f"\n  Columnas con CVE-IDs encontrados:")
+        for col, count in cve_stats.most_common():
+            print(f"    '{col}': {count} CVEs en {total_rows} filas")
+        best_column = cve_stats.most_common(1)[0][0]
+        print(f"\n  ✅ COLUMNA SUGERIDA: '{best_column}'")
+        print(f"\n  CVEs por año:")
+        for year in sorted(years):
+            print(f"    {year}: {years[year]}")
+    else:
+        print(f"\n  ⚠ NO se encontraron CVE-IDs en formato 'CVE-YYYY-NNNNN'")
+    
+    print(f"\n📊 COMPLETITUD:")
+    print("-" * 70)
+    for col in fieldnames:
+        pct = filled[col] / total_rows * 100 if total_rows else 0
+        status = "✓" if pct > 80 else "⚠" if pct > 50 else "✗"
+        print(f"  {status} {col:25s}: {filled[col]}/{total_rows} ({pct:5.1f}%)")
+    
+    sample_rows = [row for _, row in keyed]
+    if sample:
+        print(f"\n🎲 MUESTRA ALEATORIA: {len(sample_rows)} filas (seed {seed})")
+        print("-" * 70)
+        for row in sample_rows[:3]:
+            print("  " + " | ".join(value[:30] for value in row[:4]))
+        if sample_out:
+            with open(sample_out, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(fieldnames)
+                writer.writerows(sample_rows)
+            print(f"  ✓ Muestra guardada en: {sample_out}")
+    
+    print("\n" + "="*70)
+    print("DIAGNÓSTICO COMPLETADO")
+    print("="*70)
+    
+    return {'rows': total_rows, 'filled': filled, 'cve_stats': cve_stats, 'years': years,
+            'sample': sample_rows}
+
+
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Uso: python csv_inspector.py <archivo.csv>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Diagnóstico rápido de CSV de CVEs')
+    parser.add_argument('file', help='Archivo CSV a inspeccionar')
+    parser.add_argument('--full', action='store_true',
+                        help='Recorrer todo el archivo en bloques paralelos (exports muy grandes)')
+    parser.add_argument('-w', '--workers', type=int, help='Procesos para --full (por defecto: CPUs)')
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_MB, help='Tamaño de bloque en MB para --full')
+    parser.add_argument('--sample', type=int, default=0, help='Filas de la muestra aleatoria (--full)')
+    parser.add_argument('--sample-out', help='Guardar la muestra aleatoria en este CSV')
+    parser.add_argument('--seed', type=int, help='Semilla de la muestra (reproducible)')
+    args = parser.parse_args()
     
-    inspect_csv(sys.argv[1])
+    if args.full or args.sample:
+        try:
+            inspect_csv_full(args.file, args.workers, args.chunk_mb, args.sample, args.sample_out, args.seed)
+        except FileNotFoundError:
+            print(f"\n❌ ERROR: Archivo no encontrado: {args.file}")
+            sys.exit(1)
+    else:
+        inspect_csv(args.file)
@@ -22,30 +22,35 @@ import tempfile
 import re
 from datetime import datetime
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
 import argparse
 
 # Configuración
-BATCH_SIZE = 10  # CVEs por lote
 MAX_WORKERS = 3  # Threads concurrentes
-DELAY_BETWEEN_BATCHES = 5  # Segundos entre lotes
 DELAY_BETWEEN_REQUESTS = 2  # Segundos entre requests individuales
 CHECKPOINT_INTERVAL = 20  # Guardar progreso cada N CVEs
 
-# Lock para escritura thread-safe
-write_lock = Lock()
-progress_lock = Lock()
+# sap_kev.py / sap_scoring.py viven en la raíz del repo (necesitan pandas/pyarrow);
+# sap_pipeline.py (motor de etapas) solo usa la librería estándar
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def use_repo_modules():
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
 
 
 class CVEDataUpdater:
-    def __init__(self, input_csv, output_csv, log_file, checkpoint_file, force=False):
+    def __init__(self, input_csv, output_csv, log_file, checkpoint_file, force=False, scores_file=None,
+                 store_file=None):
         self.input_csv = input_csv
         self.output_csv = output_csv
+        self.store_file = store_file  # Maestro SQLite (sap_master_store.py): upsert en vez de reescribir el CSV
         self.log_file = log_file
         self.checkpoint_file = checkpoint_file
         self.force = force
+        self.scores_file = scores_file  # Tabla Rethink Score (Parquet), opcional
         self.processed_cves = set()
+        self.cves_to_process = []
         self.all_rows = []  # Almacenar TODAS las filas
         self.updated_indices = {}  # Mapeo de índice -> datos actualizados
         self.failed_cves = []
@@ -62,10 +67,16 @@ class CVEDataUpdater:
         )
         self.logger = logging.getLogger(__name__)
         
-        # Cargar checkpoint si existe (solo si no es force)
-        if not force:
-            self.load_checkpoint()
-        else:
+        # KEV local (CISA + VulnCheck), consultado sin red en merge_data
+        self.kev = self.load_kev_lookup()
+        # Tabla de normalización CWE compartida (sap_cwe.py)
+        self.cwe = self.load_cwe_normalizer()
+        
+        # Checkpoint con los resultados de SploitScan/CVE_Prioritizer por CVE (ignorado con force)
+        use_repo_modules()
+        from sap_pipeline import Checkpoint
+        self.checkpoint = Checkpoint(checkpoint_file, interval=CHECKPOINT_INTERVAL, reset=force)
+        if force:
             self.logger.info("Modo FORCE activado - reprocesando todos los CVEs")
     
     def detect_cve_column(self, row):
@@ -89,27 +100,27 @@ class CVEDataUpdater:
         
         return None
     
-    def load_checkpoint(self):
-        """Carga el estado previo si existe"""
-        if os.path.exists(self.checkpoint_file):
-            try:
-                with open(self.checkpoint_file, 'r') as f:
-                    data = json.load(f)
-                    self.processed_cves = set(data.get('processed', []))
-                    self.logger.info(f"Checkpoint cargado: {len(self.processed_cves)} CVEs ya procesados")
-            except Exception as e:
-                self.logger.warning(f"No se pudo cargar checkpoint: {e}")
+    def load_kev_lookup(self):
+        """Carga el set KEV local (sap_kev.py), None si no está disponible"""
+        try:
+            use_repo_modules()
+            from sap_kev import kev_lookup
+            kev = kev_lookup()
+            self.logger.info(f"KEV local: {len(kev)} CVEs (CISA + VulnCheck)")
+            return kev
+        except Exception as e:
+            self.logger.warning(f"KEV local no disponible, solo SploitScan/CVE_Prioritizer: {e}")
+            return None
     
-    def save_checkpoint(self):
-        """Guarda el estado actual"""
+    def load_cwe_normalizer(self):
+        """Carga el normalizador CWE (sap_cwe.py), None si no está disponible"""
         try:
-            with open(self.checkpoint_file, 'w') as f:
-                json.dump({
-                    'processed': list(self.processed_cves),
-                    'timestamp': datetime.now().isoformat()
-                }, f)
+            use_repo_modules()
+            from sap_cwe import cwe_normalizer
+            return cwe_normalizer()
         except Exception as e:
-            self.logger.error(f"Error guardando checkpoint: {e}")
+            self.logger.warning(f"Normalización CWE no disponible, cweId sin cambios: {e}")
+            return None
     
     def read_input_csv(self):
         """Lee el CSV completo y extrae CVEs a procesar"""
@@ -144,17 +155,17 @@ class CVEDataUpdater:
                         cve_id = cve_id.upper()
                         row[self.cve_column] = cve_id
                         
-                        # Solo agregar a lista de procesamiento si es necesario
-                        if self.force or cve_id not in self.processed_cves:
-                            cves_to_process.append({'index': idx, 'row': row, 'cve_id': cve_id})
+                        # Los CVEs del checkpoint se combinan con sus resultados guardados
+                        cves_to_process.append({'index': idx, 'row': row, 'cve_id': cve_id})
                 
             total_rows = len(self.all_rows)
             valid_cves = sum(1 for row in self.all_rows if row.get(self.cve_column, '').strip())
             
             self.logger.info(f"Total de filas en CSV: {total_rows}")
             self.logger.info(f"CVEs válidos encontrados: {valid_cves}")
-            self.logger.info(f"CVEs ya procesados: {len(self.processed_cves)}")
-            self.logger.info(f"CVEs a procesar ahora: {len(cves_to_process)}")
+            pending = {i['cve_id'] for i in cves_to_process} - set(self.checkpoint.results)
+            self.logger.info(f"CVEs en checkpoint: {len(self.checkpoint)}")
+            self.logger.info(f"CVEs a procesar ahora: {len(pending)}")
             
             return cves_to_process
             
@@ -359,6 +370,18 @@ class CVEDataUpdater:
                 if kev_field and result.get('kev'):
                     updated_row[kev_field] = 'Yes' if result['kev'] == 'Yes' else 'No'
         
+        # KEV local: un CVE presente en CISA/VulnCheck siempre queda en 'Yes'
+        kev_field = self.map_field_name('kev')
+        if kev_field and self.kev is not None and original_row.get(self.cve_column, '') in self.kev:
+            updated_row[kev_field] = 'Yes'
+        
+        # CWE: mismo normalizador que el dashboard y el pipeline
+        cwe_field = self.map_field_name('cwe')
+        if cwe_field and self.cwe is not None:
+            cwe_id = self.cwe.normalize_one(updated_row.get(cwe_field) or None, original_row.get(self.cve_column))
+            if isinstance(cwe_id, str):
+                updated_row[cwe_field] = cwe_id
+        
         # Actualizar fecha de modificación si existe esa columna
         updated_field = self.map_field_name('updated')
         if updated_field:
@@ -366,50 +389,47 @@ class CVEDataUpdater:
         
         return updated_row
     
-    def process_cve(self, item):
-        """Procesa un CVE individual"""
-        idx = item['index']
-        row = item['row']
-        cve_id = item['cve_id']
-        
-        try:
-            self.logger.info(f"Procesando {cve_id}...")
-            
-            # Ejecutar SploitScan
-            sploitscan_data = self.run_sploitscan(cve_id)
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-            
-            # Ejecutar CVE_Prioritizer
-            prioritizer_data = self.run_cve_prioritizer(cve_id)
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-            
-            # Combinar datos
-            updated_row = self.merge_data(row, sploitscan_data, prioritizer_data)
-            
-            # Guardar actualización por índice
-            with write_lock:
-                self.updated_indices[idx] = updated_row
-            
-            # Marcar como procesado
-            with progress_lock:
+    def enrich_cve(self, cve_id):
+        """Resultados de SploitScan y CVE_Prioritizer de un CVE (lo que guarda el checkpoint)"""
+        self.logger.info(f"Procesando {cve_id}...")
+        sploitscan_data = self.run_sploitscan(cve_id)
+        time.sleep(DELAY_BETWEEN_REQUESTS)
+        prioritizer_data = self.run_cve_prioritizer(cve_id)
+        return {'cve_id': cve_id, 'sploitscan': sploitscan_data, 'prioritizer': prioritizer_data}
+    
+    def merge_all(self, results):
+        """Combina los resultados con cada fila de su CVE (varias Notas pueden tener el mismo CVE)"""
+        by_cve = {r['cve_id']: r for r in results}
+        for item in self.cves_to_process:
+            cve_id = item['cve_id']
+            if cve_id not in by_cve:
+                continue
+            try:
+                result = by_cve[cve_id]
+                self.updated_indices[item['index']] = self.merge_data(
+                    item['row'], result['sploitscan'], result['prioritizer'])
                 self.processed_cves.add(cve_id)
-            
-            self.logger.info(f"✓ {cve_id} procesado exitosamente")
-            return {'success': True, 'cve_id': cve_id, 'index': idx}
-            
-        except Exception as e:
-            self.logger.error(f"✗ Error procesando {cve_id}: {e}")
-            with progress_lock:
-                self.failed_cves.append(cve_id)
-            return {'success': False, 'cve_id': cve_id, 'index': idx}
+            except Exception as e:
+                self.logger.error(f"✗ Error procesando {cve_id}: {e}")
+                if cve_id not in self.failed_cves:
+                    self.failed_cves.append(cve_id)
+        return self.output_csv
     
-    def process_batch(self, batch):
-        """Procesa un lote de CVEs en paralelo"""
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = {executor.submit(self.process_cve, item): item for item in batch}
-            
-            for future in as_completed(futures):
-                result = future.result()
+    def pipeline(self):
+        """Etapas: enrich (por CVE, en paralelo) -> merge -> persist -> score"""
+        from sap_pipeline import Pipeline, Stage
+        
+        stages = [
+            Stage('enrich', self.enrich_cve, workers=MAX_WORKERS, delay=DELAY_BETWEEN_REQUESTS,
+                  key=lambda cve_id: cve_id,
+                  cache_if=lambda r: r['sploitscan'] is not None or r['prioritizer'] is not None),
+            Stage('merge', self.merge_all, gather=True, fatal=True),
+            Stage('persist', lambda output_csv: (self.write_store() if self.store_file else self.write_output_csv())
+                  or output_csv, fatal=True),
+        ]
+        if self.scores_file:
+            stages.append(Stage('score', lambda output_csv: self.write_scores() or output_csv))
+        return Pipeline(stages, checkpoint=self.checkpoint)
     
     def run(self):
         """Ejecuta el proceso completo"""
@@ -419,59 +439,35 @@ class CVEDataUpdater:
         self.logger.info("="*80)
         
         # Leer CSV completo
-        cves_to_process = self.read_input_csv()
-        
-        if not cves_to_process:
-            self.logger.info("No hay CVEs nuevos para procesar")
-            if not self.force and self.processed_cves:
-                self.logger.info("SUGERENCIA: Usa --force para reprocesar todos los CVEs")
-                self.logger.info(f"O elimina el checkpoint: rm {self.checkpoint_file}")
-            
-            # Aunque no haya nada que procesar, escribir el CSV de salida
-            self.write_output_csv()
-            return
-        
-        total_cves = len(cves_to_process)
-        
-        # Procesar en lotes
-        for i in range(0, total_cves, BATCH_SIZE):
-            batch = cves_to_process[i:i + BATCH_SIZE]
-            batch_num = (i // BATCH_SIZE) + 1
-            total_batches = (total_cves + BATCH_SIZE - 1) // BATCH_SIZE
-            
-            self.logger.info(f"\n{'='*60}")
-            self.logger.info(f"Procesando lote {batch_num}/{total_batches} ({len(batch)} CVEs)")
-            self.logger.info(f"{'='*60}")
-            
-            self.process_batch(batch)
-            
-            # Guardar checkpoint periódicamente
-            if len(self.processed_cves) % CHECKPOINT_INTERVAL == 0:
-                self.save_checkpoint()
-                self.logger.info(f"Checkpoint guardado: {len(self.processed_cves)} CVEs procesados")
-            
-            # Delay entre lotes (excepto último)
-            if i + BATCH_SIZE < total_cves:
-                self.logger.info(f"Esperando {DELAY_BETWEEN_BATCHES}s antes del siguiente lote...")
-                time.sleep(DELAY_BETWEEN_BATCHES)
+        self.cves_to_process = self.read_input_csv()
+        if self.cves_to_process is None:
+            self.logger.error(f"No se pudo leer el CSV de entrada: {self.input_csv}")
+            sys.exit(1)
         
-        # Guardar checkpoint final
-        self.save_checkpoint()
+        if not self.cves_to_process:
+            self.logger.info("No hay CVEs para procesar")
         
-        # Escribir CSV actualizado
-        self.write_output_csv()
+        # Un CVE repetido en varias filas se consulta una sola vez
+        cves = list(dict.fromkeys(item['cve_id'] for item in self.cves_to_process))
+        pipeline = self.pipeline()
+        pipeline.run(cves)
+        self.failed_cves.extend(c for c in pipeline.stats['enrich'].failed if c not in self.failed_cves)
         
         # Reporte final
         elapsed_time = time.time() - start_time
         self.logger.info("\n" + "="*80)
         self.logger.info("REPORTE FINAL")
         self.logger.info("="*80)
+        for line in pipeline.report():
+            self.logger.info(f"Etapa {line}")
         self.logger.info(f"Total de filas en CSV: {len(self.all_rows)}")
-        self.logger.info(f"CVEs procesados en esta ejecución: {len(self.updated_indices)}")
+        self.logger.info(f"Filas actualizadas en esta ejecución: {len(self.updated_indices)}")
+        self.logger.info(f"CVEs del checkpoint: {pipeline.stats['enrich'].cached}")
         self.logger.info(f"CVEs exitosos: {len(self.processed_cves)}")
         self.logger.info(f"CVEs fallidos: {len(self.failed_cves)}")
         self.logger.info(f"Tiempo total: {elapsed_time:.2f}s")
-        self.logger.info(f"CSV actualizado: {self.output_csv}")
+        self.logger.info(f"{'Maestro actualizado' if self.store_file else 'CSV actualizado'}: "
+                         f"{self.store_file or self.output_csv}")
         self.logger.info(f"Log completo: {self.log_file}")
         
         if self.failed_cves:
@@ -506,6 +502,52 @@ class CVEDataUpdater:
             self.logger.error(f"Error escribiendo CSV: {e}")
             import traceback
             self.logger.error(traceback.format_exc())
+    
+    def write_store(self):
+        """Upsert en el maestro SQLite: las filas del CSV que aún no están (sin tocar las
+        existentes) y luego solo las filas actualizadas, cada paso en una transacción.
+        Las filas actualizadas llevan su número de aparición en el CSV completo, así una
+        nota republicada con la misma clave actualiza su propia fila"""
+        try:
+            use_repo_modules()
+            from sap_master_store import ENRICHED_PRIORITY, OCCURRENCE, MasterStore, row_ids
+            
+            store = MasterStore(self.store_file)
+            loaded = store.upsert(self.all_rows, source=str(self.input_csv), insert_only=True)
+            ids = row_ids(self.all_rows)
+            updated = store.upsert(({**row, OCCURRENCE: ids[i][-1]} for i, row in self.updated_indices.items()),
+                                   source=str(self.input_csv), priority=ENRICHED_PRIORITY)
+            self.logger.info(f"✓ Maestro actualizado: {self.store_file}")
+            self.logger.info(f"  - Filas nuevas del CSV: {loaded['inserted']}")
+            self.logger.info(f"  - Filas actualizadas: {updated['rows']}")
+            self.logger.info(f"  - Filas totales: {len(store)}")
+            
+        except Exception as e:
+            self.logger.error(f"Error actualizando el maestro: {e}")
+            import traceback
+            self.logger.error(traceback.format_exc())
+    
+    def write_scores(self):
+        """Calcula el Rethink Priority Score del CSV de salida y guarda la tabla versionada"""
+        if not self.scores_file:
+            return
+        try:
+            use_repo_modules()
+            import pandas as pd
+            from sap_scoring import build_score_table, write_score_table
+            
+            if self.store_file:
+                from sap_master_store import MasterStore
+                source, df = self.store_file, MasterStore(self.store_file).read_frame()
+            else:
+                source, df = self.output_csv, pd.read_csv(self.output_csv)
+            scores, epss = build_score_table(df)
+            meta = write_score_table(scores, epss, self.scores_file, sources=[source])
+            self.logger.info(f"✓ Rethink scores guardados: {self.scores_file}")
+            self.logger.info(f"  - CVEs: {meta['rows']} (tabla v{meta['version']})")
+            
+        except Exception as e:
+            self.logger.error(f"Error calculando Rethink scores: {e}")
 
 
 def check_dependencies():
@@ -555,6 +597,16 @@ def main():
         action='store_true',
         help='Forzar reprocesamiento de todos los CVEs (ignorar checkpoint)'
     )
+    parser.add_argument(
+        '--scores',
+        default=None,
+        help='Tabla Rethink Score a generar desde el CSV de salida (ej: ../data/rethink_scores.parquet)'
+    )
+    parser.add_argument(
+        '--store',
+        default=None,
+        help='Maestro SQLite a actualizar por upsert en lugar de reescribir el CSV (ej: ../data/sap_master.db)'
+    )
     parser.add_argument(
         '--skip-check',
         action='store_true',
@@ -578,7 +630,9 @@ def main():
         output_csv=args.output,
         log_file=args.log,
         checkpoint_file=args.checkpoint,
-        force=args.force
+        force=args.force,
+        scores_file=args.scores,
+        store_file=args.store
     )
     
     updater.run()
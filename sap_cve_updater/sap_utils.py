@@ -11,6 +11,7 @@ except ImportError:
     pass
 
 import csv
+import hashlib
 import json
 import sys
 import argparse
@@ -19,38 +20,326 @@ from collections import Counter, defaultdict
 from datetime import datetime
 import re
 
+# sap_master_store.py (maestro SQLite, solo librería estándar) vive en la raíz del repo
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+CVE_FORMAT = r'^CVE-\d{4}-\d+$'
+CVE_YEAR = r'CVE-(\d{4})'
+INVALID_EXAMPLES = 20  # CVEs inválidos que se guardan con su línea
+
+
+def detect_cve_column(fieldnames):
+    """Primera columna con 'cve' en el nombre"""
+    for col in fieldnames:
+        if 'cve' in col.lower():
+            return col
+    return None
+
+
+class CSVProfile:
+    """Perfil de un CSV en una sola pasada por columnas (pandas, opcionalmente por bloques)
+
+    Por columna: celdas con datos, valores distintos (hash de 64 bits, sin guardar los
+    textos) y tipo inferido; de la columna CVE: total, CVEs por año, repetidos y formatos
+    inválidos. stats, validate y export_summary leen el mismo perfil.
+    """
+    
+    def __init__(self, fieldnames, cve_column=None):
+        self.fieldnames = list(fieldnames)
+        self.cve_column = cve_column
+        self.rows = 0
+        self.filled = Counter()
+        self.distinct = {col: set() for col in self.fieldnames}
+        # Celdas con datos que son entero / número / fecha ISO / booleano, para inferir el tipo
+        self.kinds = {col: Counter() for col in self.fieldnames}
+        self.cve_total = 0
+        self.cve_years = Counter()
+        self.cve_counts = Counter()
+        self.invalid_cves = 0
+        self.invalid_examples = []
+    
+    @classmethod
+    def from_csv(cls, filepath, chunksize=None):
+        """Perfil del archivo; con chunksize se lee en bloques de ese número de filas"""
+        import pandas as pd
+        
+        chunks = pd.read_csv(filepath, dtype=str, keep_default_na=False, na_filter=False,
+                             encoding='utf-8', chunksize=chunksize)
+        if chunksize is None:
+            chunks = [chunks]
+        profile = None
+        for chunk in chunks:
+            if profile is None:
+                profile = cls(chunk.columns, detect_cve_column(chunk.columns))
+            profile.update(chunk)
+        if profile is None:  # solo cabecera, sin bloques
+            with open(filepath, 'r', encoding='utf-8') as f:
+                fieldnames = next(csv.reader(f), [])
+            profile = cls(fieldnames, detect_cve_column(fieldnames))
+        return profile
+    
+    def update(self, chunk):
+        """Agrega un bloque de filas (DataFrame de textos) al perfil"""
+        import pandas as pd
+        
+        offset = self.rows
+        self.rows += len(chunk)
+        for col in self.fieldnames:
+            values = chunk[col]
+            stripped = values.str.strip()
+            present = values[stripped != '']
+            self.filled[col] += len(present)
+            self.distinct[col].update(pd.util.hash_array(present.to_numpy(dtype=object)).tolist())
+            if present.empty:
+                continue
+            numbers = pd.to_numeric(present, errors='coerce')
+            kinds = self.kinds[col]
+            kinds['number'] += int(numbers.notna().sum())
+            kinds['integer'] += int((numbers % 1 == 0).sum())
+            kinds['date'] += int(present.str.match(r'\s*\d{4}-\d{2}-\d{2}').sum())
+            kinds['bool'] += int(present.str.strip().str.lower().isin(['true', 'false']).sum())
+        
+        if self.cve_column:
+            cves = chunk[self.cve_column]
+            cves = cves[cves != '']
+            self.cve_total += len(cves)
+            self.cve_years.update(cves.str.extract(CVE_YEAR, expand=False).dropna().value_counts().to_dict())
+            self.cve_counts.update(cves.value_counts(sort=False).to_dict())
+            invalid = cves[~cves.str.match(CVE_FORMAT)]
+            self.invalid_cves += len(invalid)
+            room = INVALID_EXAMPLES - len(self.invalid_examples)
+            # +2 por header y 0-index
+            self.invalid_examples += [(offset + int(i) + 2 - chunk.index[0], cve)
+                                      for i, cve in invalid.iloc[:room].items()]
+        return self
+    
+    def dtype(self, col):
+        """Tipo inferido: vacio, entero, decimal, fecha, booleano o texto"""
+        filled = self.filled[col]
+        kinds = self.kinds[col]
+        if not filled:
+            return 'vacio'
+        for kind, name in (('integer', 'entero'), ('number', 'decimal'), ('date', 'fecha'), ('bool', 'booleano')):
+            if kinds[kind] == filled:
+                return name
+        return 'texto'
+    
+    def completeness(self, col):
+        filled = self.filled[col]
+        return {
+            'filled': filled,
+            'total': self.rows,
+            'percentage': round(filled / self.rows * 100, 2) if self.rows else 0
+        }
+    
+    def duplicates(self):
+        """{CVE: apariciones} de los CVEs que aparecen más de una vez"""
+        return {cve: count for cve, count in self.cve_counts.items() if count > 1}
+
+
+class CSVDiff:
+    """Diff por fila de dos CSV por clave (cve_id, o Nota + CVE), en streaming
+
+    Primera pasada: un hash de 64 bits de cada fila (columnas comunes) por clave, sin guardar
+    las filas. Segunda pasada: solo las filas agregadas, eliminadas o modificadas, para los
+    cambios campo a campo. La memoria crece con el número de claves y de cambios, no con
+    el tamaño de los archivos. Las filas con la clave repetida (notas republicadas) se
+    distinguen como en el maestro: con Nota + CVE también por el hash del Título, y siempre
+    por su número de aparición, así se comparan como cualquier otra fila.
+    """
+    
+    def __init__(self, file1, file2, key=None):
+        from sap_master_store import OCCURRENCE, TITLE_HASH
+        
+        self.files = (file1, file2)
+        self.fieldnames = tuple(self._header(f) for f in self.files)
+        self.common = [c for c in self.fieldnames[0] if c in set(self.fieldnames[1])]
+        self.key = list(key) if key else self._default_key()
+        self.key_columns = tuple(self._resolve_key(names) for names in self.fieldnames)
+        self.by_title = 'Note#' in self.key and all('Title' in names for names in self.fieldnames)
+        self.id_columns = self.key + ([TITLE_HASH] if self.by_title else []) + [OCCURRENCE]
+        self.cves = (set(), set())
+        self.rows = [0, 0]
+        self.duplicates = [0, 0]
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.field_changes = Counter()
+    
+    @staticmethod
+    def _header(path):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return next(csv.reader(f), [])
+    
+    def _default_key(self):
+        """Nota + CVE si ambos archivos tienen Note#, si no la columna CVE"""
+        if all('Note#' in names for names in self.fieldnames):
+            return ['Note#', 'cve_id']
+        return ['cve_id']
+    
+    def _resolve_key(self, fieldnames):
+        """Columnas de la clave en un archivo: cve_id es la columna CVE que tenga"""
+        columns = []
+        for col in self.key:
+            if col not in fieldnames and 'cve' in col.lower():
+                col = detect_cve_column(fieldnames)
+            if col not in fieldnames:
+                raise ValueError(f"Columna clave '{col}' no está en {fieldnames}")
+            columns.append(col)
+        return columns
+    
+    def _rows(self, side):
+        """(identidad, fila) de un archivo: la clave (Note# sin '.0', CVE sin espacios), el
+        hash del Título si corresponde y el número de aparición de esa clave"""
+        from sap_master_store import note_number, title_hash
+        
+        key_columns = self.key_columns[side]
+        seen = Counter()
+        with open(self.files[side], 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                key = tuple(note_number(row.get(c)) if c == 'Note#' else (row.get(c) or '').strip()
+                            for c in key_columns)
+                if self.by_title:
+                    key += (title_hash(row.get('Title')),)
+                yield key + (seen[key],), row
+                seen[key] += 1
+    
+    def _hash(self, row):
+        values = '\x1f'.join(row.get(c) or '' for c in self.common)
+        return hashlib.blake2b(values.encode('utf-8'), digest_size=8).digest()
+    
+    def _scan(self, side):
+        """{identidad: hash de la fila}, y los CVEs del archivo"""
+        hashes, keys = {}, set()
+        cve_index = self.key.index('cve_id') if 'cve_id' in self.key else None
+        for key, row in self._rows(side):
+            self.rows[side] += 1
+            if key[:len(self.key)] in keys:
+                self.duplicates[side] += 1
+            keys.add(key[:len(self.key)])
+            hashes[key] = self._hash(row)
+            if cve_index is not None and key[cve_index]:
+                self.cves[side].add(key[cve_index])
+        return hashes
+    
+    def run(self):
+        """Calcula las filas agregadas, eliminadas y modificadas"""
+        old, new = self._scan(0), self._scan(1)
+        removed = {k for k in old if k not in new}
+        added = {k for k in new if k not in old}
+        changed = {k for k, h in new.items() if k in old and old[k] != h}
+        del old, new
+        
+        before = {}
+        for key, row in self._rows(0):
+            if key in removed or key in changed:
+                before[key] = row
+        after = {}
+        for key, row in self._rows(1):
+            if key in added or key in changed:
+                after[key] = row
+        
+        self.removed = [(k, before[k]) for k in sorted(removed)]
+        self.added = [(k, after[k]) for k in sorted(added)]
+        self.changed = []
+        for k in sorted(changed):
+            fields = {c: [before[k].get(c) or '', after[k].get(c) or ''] for c in self.common
+                      if (before[k].get(c) or '') != (after[k].get(c) or '')}
+            self.field_changes.update(fields.keys())
+            self.changed.append((k, fields))
+        return self
+    
+    def changes(self):
+        """Cambios como dicts (una línea del JSONL cada uno)"""
+        for change, items in (('added', self.added), ('removed', self.removed)):
+            for key, row in items:
+                yield {'change': change, 'key': dict(zip(self.id_columns, key)), 'row': row}
+        for key, fields in self.changed:
+            yield {'change': 'changed', 'key': dict(zip(self.id_columns, key)), 'fields': fields}
+    
+    def summary(self):
+        cols1, cols2 = (set(names) for names in self.fieldnames)
+        return {
+            'file1': str(self.files[0]),
+            'file2': str(self.files[1]),
+            'key': self.key,
+            'columns': {
+                'common': len(self.common),
+                'only_in_1': sorted(cols1 - cols2),
+                'only_in_2': sorted(cols2 - cols1),
+            },
+            'rows': {
+                'added': len(self.added),
+                'removed': len(self.removed),
+                'changed': len(self.changed),
+                'file1': self.rows[0],
+                'file2': self.rows[1],
+                'duplicate_keys': {'file1': self.duplicates[0], 'file2': self.duplicates[1]},
+            },
+            'fields_changed': dict(self.field_changes.most_common()),
+        }
+    
+    def write(self, output_file):
+        """Exporta el change set: JSON Lines (.jsonl, resumen en la primera línea) o JSON"""
+        with open(output_file, 'w', encoding='utf-8') as f:
+            if str(output_file).endswith('.jsonl'):
+                f.write(json.dumps({'change': 'summary', **self.summary()}, ensure_ascii=False) + '\n')
+                for change in self.changes():
+                    f.write(json.dumps(change, ensure_ascii=False) + '\n')
+            else:
+                json.dump({**self.summary(), 'changes': list(self.changes())}, f, indent=2, ensure_ascii=False)
+        return output_file
+
 
 class CSVAnalyzer:
     """Analiza archivos CSV de CVEs SAP"""
     
-    def __init__(self, filepath):
+    def __init__(self, filepath, chunksize=None):
         self.filepath = filepath
-        self.rows = []
+        self.chunksize = chunksize
         self.fieldnames = []
         self.cve_column = None
+        self._rows = None
+        self._profile = None
     
     def load(self):
-        """Carga el archivo CSV"""
+        """Lee la cabecera del CSV; las filas se leen al usarlas y el perfil al pedirlo"""
         with open(self.filepath, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             self.fieldnames = list(reader.fieldnames)
-            self.rows = list(reader)
         
         # Detectar columna CVE
-        for col in self.fieldnames:
-            if 'cve' in col.lower():
-                self.cve_column = col
-                break
+        self.cve_column = detect_cve_column(self.fieldnames)
+        self._rows = None
+        self._profile = None
         
         return self
     
+    @property
+    def rows(self):
+        """Filas del CSV (dicts), leídas la primera vez que se usan"""
+        if self._rows is None:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                self._rows = list(csv.DictReader(f))
+        return self._rows
+    
+    def profile(self):
+        """Perfil del CSV (CSVProfile), calculado una vez para stats, validate y export_summary"""
+        if self._profile is None:
+            self._profile = CSVProfile.from_csv(self.filepath, self.chunksize)
+        return self._profile
+    
     def stats(self):
         """Genera estadísticas del CSV"""
+        profile = self.profile()
         print("\n" + "="*70)
         print("ESTADÍSTICAS DEL CSV")
         print("="*70)
         print(f"Archivo: {self.filepath}")
-        print(f"Total de filas: {len(self.rows)}")
+        print(f"Total de filas: {profile.rows}")
         print(f"Total de columnas: {len(self.fieldnames)}")
         print(f"\nColumnas:")
         for i, col in enumerate(self.fieldnames, 1):
@@ -58,69 +347,79 @@ class CSVAnalyzer:
         
         if self.cve_column:
             print(f"\n📊 Análisis de CVEs (columna: {self.cve_column}):")
-            cves = [row[self.cve_column] for row in self.rows if row.get(self.cve_column)]
-            print(f"  Total de CVEs: {len(cves)}")
+            print(f"  Total de CVEs: {profile.cve_total}")
             
             # CVEs por año
-            years = Counter()
-            for cve in cves:
-                match = re.search(r'CVE-(\d{4})', cve)
-                if match:
-                    years[match.group(1)] += 1
-            
             print(f"\n  CVEs por año:")
-            for year in sorted(years.keys()):
-                print(f"    {year}: {years[year]}")
+            for year in sorted(profile.cve_years.keys()):
+                print(f"    {year}: {profile.cve_years[year]}")
         
         # Análisis de campos con datos
         print(f"\n📈 Completitud de datos:")
         for col in self.fieldnames:
-            filled = sum(1 for row in self.rows if row.get(col) and row[col].strip())
-            pct = (filled / len(self.rows) * 100) if self.rows else 0
+            filled = profile.filled[col]
+            pct = (filled / profile.rows * 100) if profile.rows else 0
             status = "✓" if pct > 80 else "⚠" if pct > 50 else "✗"
-            print(f"  {status} {col:25s}: {filled:4d}/{len(self.rows)} ({pct:5.1f}%)")
+            print(f"  {status} {col:25s}: {filled:4d}/{profile.rows} ({pct:5.1f}%)  "
+                  f"{profile.dtype(col):8s} {len(profile.distinct[col])} distintos")
         
         return self
     
-    def compare(self, other_filepath):
-        """Compara con otro CSV"""
+    def compare(self, other_filepath, key=None, output_file=None):
+        """Compara con otro CSV: estructura, CVEs y diff por fila (CSVDiff)"""
         print("\n" + "="*70)
         print("COMPARACIÓN DE ARCHIVOS")
         print("="*70)
         
-        other = CSVAnalyzer(other_filepath).load()
+        diff = CSVDiff(self.filepath, other_filepath, key).run()
+        summary = diff.summary()
         
         # Comparar estructura
         print(f"\n📋 Estructura:")
-        print(f"  Archivo 1: {len(self.fieldnames)} columnas, {len(self.rows)} filas")
-        print(f"  Archivo 2: {len(other.fieldnames)} columnas, {len(other.rows)} filas")
+        print(f"  Archivo 1: {len(diff.fieldnames[0])} columnas, {diff.rows[0]} filas")
+        print(f"  Archivo 2: {len(diff.fieldnames[1])} columnas, {diff.rows[1]} filas")
         
         # Columnas diferentes
-        cols1 = set(self.fieldnames)
-        cols2 = set(other.fieldnames)
-        
-        only_in_1 = cols1 - cols2
-        only_in_2 = cols2 - cols1
-        common = cols1 & cols2
-        
-        print(f"\n  Columnas comunes: {len(common)}")
-        if only_in_1:
-            print(f"  Solo en archivo 1: {', '.join(only_in_1)}")
-        if only_in_2:
-            print(f"  Solo en archivo 2: {', '.join(only_in_2)}")
-        
-        # Comparar CVEs si ambos tienen columna CVE
-        if self.cve_column and other.cve_column:
-            cves1 = set(row[self.cve_column] for row in self.rows if row.get(self.cve_column))
-            cves2 = set(row[other.cve_column] for row in other.rows if row.get(other.cve_column))
-            
+        print(f"\n  Columnas comunes: {summary['columns']['common']}")
+        if summary['columns']['only_in_1']:
+            print(f"  Solo en archivo 1: {', '.join(summary['columns']['only_in_1'])}")
+        if summary['columns']['only_in_2']:
+            print(f"  Solo en archivo 2: {', '.join(summary['columns']['only_in_2'])}")
+        
+        # Comparar CVEs
+        cves1, cves2 = diff.cves
+        if cves1 or cves2:
             print(f"\n📊 CVEs:")
             print(f"  Solo en archivo 1: {len(cves1 - cves2)}")
             print(f"  Solo en archivo 2: {len(cves2 - cves1)}")
             print(f"  En ambos: {len(cves1 & cves2)}")
+        
+        # Diff por fila
+        rows = summary['rows']
+        print(f"\n🔀 Filas (clave: {' + '.join(diff.key)}):")
+        print(f"  Agregadas: {rows['added']}")
+        print(f"  Eliminadas: {rows['removed']}")
+        print(f"  Modificadas: {rows['changed']}")
+        if any(diff.duplicates):
+            print(f"  ⚠ Claves repetidas: {diff.duplicates[0]} / {diff.duplicates[1]} (comparadas por título y aparición)")
+        if diff.field_changes:
+            print(f"\n  Campos modificados:")
+            for col, count in diff.field_changes.most_common(10):
+                print(f"    {col:25s}: {count}")
+        for key, fields in diff.changed[:5]:
+            print(f"  {' / '.join(map(str, key))}: {', '.join(fields)}")
+        if len(diff.changed) > 5:
+            print(f"  ... y {len(diff.changed)-5} más")
+        
+        if output_file:
+            diff.write(output_file)
+            print(f"\n✓ Cambios exportados a: {output_file}")
+        
+        return diff
     
     def validate(self):
         """Valida el formato y contenido del CSV"""
+        profile = self.profile()
         print("\n" + "="*70)
         print("VALIDACIÓN DEL CSV")
         print("="*70)
@@ -129,24 +428,16 @@ class CSVAnalyzer:
         warnings = []
         
         # Validar formato CVE
-        if self.cve_column:
-            invalid_cves = []
-            for i, row in enumerate(self.rows):
-                cve = row.get(self.cve_column, '')
-                if cve and not re.match(r'^CVE-\d{4}-\d+$', cve):
-                    invalid_cves.append((i+2, cve))  # +2 por header y 0-index
-            
-            if invalid_cves:
-                issues.append(f"CVEs con formato inválido: {len(invalid_cves)}")
-                for line, cve in invalid_cves[:5]:
-                    print(f"  Línea {line}: {cve}")
-                if len(invalid_cves) > 5:
-                    print(f"  ... y {len(invalid_cves)-5} más")
+        if self.cve_column and profile.invalid_cves:
+            issues.append(f"CVEs con formato inválido: {profile.invalid_cves}")
+            for line, cve in profile.invalid_examples[:5]:
+                print(f"  Línea {line}: {cve}")
+            if profile.invalid_cves > 5:
+                print(f"  ... y {profile.invalid_cves-5} más")
         
         # Verificar filas duplicadas
         if self.cve_column:
-            cve_counts = Counter(row[self.cve_column] for row in self.rows if row.get(self.cve_column))
-            duplicates = {cve: count for cve, count in cve_counts.items() if count > 1}
+            duplicates = profile.duplicates()
             
             if duplicates:
                 warnings.append(f"CVEs duplicados: {len(duplicates)}")
@@ -159,9 +450,9 @@ class CSVAnalyzer:
             matching_cols = [col for col in self.fieldnames if field.lower() in col.lower()]
             if matching_cols:
                 col = matching_cols[0]
-                empty = sum(1 for row in self.rows if not row.get(col) or not row[col].strip())
-                if empty > len(self.rows) * 0.2:  # >20% vacío
-                    warnings.append(f"Campo '{col}' vacío en {empty} filas ({empty/len(self.rows)*100:.1f}%)")
+                empty = profile.rows - profile.filled[col]
+                if empty > profile.rows * 0.2:  # >20% vacío
+                    warnings.append(f"Campo '{col}' vacío en {empty} filas ({empty/profile.rows*100:.1f}%)")
         
         # Resumen
         print(f"\n{'='*70}")
@@ -181,38 +472,25 @@ class CSVAnalyzer:
     
     def export_summary(self, output_file):
         """Exporta un resumen en JSON"""
+        profile = self.profile()
         summary = {
             'file': str(self.filepath),
             'timestamp': datetime.now().isoformat(),
-            'total_rows': len(self.rows),
+            'total_rows': profile.rows,
             'total_columns': len(self.fieldnames),
             'columns': self.fieldnames,
         }
         
         if self.cve_column:
-            cves = [row[self.cve_column] for row in self.rows if row.get(self.cve_column)]
-            years = Counter()
-            for cve in cves:
-                match = re.search(r'CVE-(\d{4})', cve)
-                if match:
-                    years[match.group(1)] += 1
-            
             summary['cves'] = {
-                'total': len(cves),
-                'by_year': dict(years)
+                'total': profile.cve_total,
+                'by_year': dict(profile.cve_years)
             }
         
-        # Completitud de datos
-        completeness = {}
-        for col in self.fieldnames:
-            filled = sum(1 for row in self.rows if row.get(col) and row[col].strip())
-            completeness[col] = {
-                'filled': filled,
-                'total': len(self.rows),
-                'percentage': round(filled / len(self.rows) * 100, 2) if self.rows else 0
-            }
-        
-        summary['completeness'] = completeness
+        # Completitud de datos, tipos y valores distintos
+        summary['completeness'] = {col: profile.completeness(col) for col in self.fieldnames}
+        summary['dtypes'] = {col: profile.dtype(col) for col in self.fieldnames}
+        summary['distinct'] = {col: len(profile.distinct[col]) for col in self.fieldnames}
         
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(summary, f, indent=2, ensure_ascii=False)
@@ -223,13 +501,20 @@ class CSVAnalyzer:
 
 
 class CSVMerger:
-    """Combina múltiples archivos CSV de CVEs"""
+    """Combina múltiples archivos CSV de CVEs
+
+    El merge es un INSERT ... ON CONFLICT en un maestro SQLite (sap_master_store.py): en
+    memoria y por CVE, como siempre, o en un maestro persistente (store) por fila (Nota + CVE + Título).
+    Una fila de mayor o igual prioridad sobrescribe solo los valores no vacíos.
+    """
     
-    def __init__(self, output_file):
+    def __init__(self, output_file, store=None):
+        from sap_master_store import MasterStore
+        
         self.output_file = output_file
         self.files = []
-        self.merged_rows = {}
         self.all_fieldnames = set()
+        self.store = MasterStore(store) if store else MasterStore(':memory:', key=('cve_id',))
     
     def add_file(self, filepath, priority=1):
         """Agrega un archivo para mergear"""
@@ -254,7 +539,6 @@ class CSVMerger:
             with open(filepath, 'r', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
                 fieldnames = list(reader.fieldnames)
-                self.all_fieldnames.update(fieldnames)
                 
                 # Detectar columna CVE
                 cve_col = None
@@ -267,55 +551,30 @@ class CSVMerger:
                     print(f"  ⚠ No se encontró columna CVE, saltando archivo")
                     continue
                 
-                # Procesar filas
-                count = 0
-                for row in reader:
-                    cve_id = row.get(cve_col, '').strip()
-                    if not cve_id:
-                        continue
-                    
-                    # Solo agregar/actualizar si no existe o tiene menor prioridad
-                    if cve_id not in self.merged_rows:
-                        self.merged_rows[cve_id] = {'priority': priority, 'data': row, 'source': filepath}
-                        count += 1
-                    elif self.merged_rows[cve_id]['priority'] < priority:
-                        # Actualizar con datos de mayor prioridad
-                        old_data = self.merged_rows[cve_id]['data']
-                        for key, value in row.items():
-                            if value and value.strip():  # Solo sobrescribir si hay valor
-                                old_data[key] = value
-                        self.merged_rows[cve_id]['priority'] = priority
-                        count += 1
-                
-                print(f"  ✓ {count} CVEs procesados")
+                # El maestro usa cve_id como clave
+                self.all_fieldnames.update('cve_id' if col == cve_col else col for col in fieldnames)
+                rows = ({('cve_id' if k == cve_col else k): v for k, v in row.items()} for row in reader)
+                result = self.store.upsert(rows, source=filepath, priority=priority, replace_equal=False)
+                print(f"  ✓ {result['rows']} filas: {result['inserted']} nuevas, {result['updated']} combinadas")
         
         print(f"\n{'='*70}")
-        print(f"Total de CVEs únicos: {len(self.merged_rows)}")
+        print(f"Total de filas en el maestro: {len(self.store)}")
         print(f"Total de columnas: {len(self.all_fieldnames)}")
         
         return self
     
     def save(self):
         """Guarda el resultado mergeado"""
-        if not self.merged_rows:
+        if not len(self.store):
             print("ERROR: No hay datos para guardar")
             return
         
         # Ordenar fieldnames
         fieldnames = sorted(self.all_fieldnames)
-        
-        with open(self.output_file, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for cve_id in sorted(self.merged_rows.keys()):
-                row = self.merged_rows[cve_id]['data']
-                # Asegurar que todas las columnas existen
-                output_row = {col: row.get(col, '') for col in fieldnames}
-                writer.writerow(output_row)
+        rows = self.store.export_csv(self.output_file, fieldnames)
         
         print(f"\n✓ Archivo mergeado guardado: {self.output_file}")
-        print(f"  - CVEs: {len(self.merged_rows)}")
+        print(f"  - Filas: {rows}")
         print(f"  - Columnas: {len(fieldnames)}")
 
 
@@ -331,21 +590,26 @@ def main():
     stats_parser = subparsers.add_parser('stats', help='Mostrar estadísticas del CSV')
     stats_parser.add_argument('file', help='Archivo CSV a analizar')
     stats_parser.add_argument('-o', '--output', help='Exportar resumen a JSON')
+    stats_parser.add_argument('-c', '--chunksize', type=int, help='Leer el CSV en bloques de N filas (archivos muy grandes)')
     
     # Comando: compare
     compare_parser = subparsers.add_parser('compare', help='Comparar dos archivos CSV')
     compare_parser.add_argument('file1', help='Primer archivo CSV')
     compare_parser.add_argument('file2', help='Segundo archivo CSV')
+    compare_parser.add_argument('-k', '--key', help='Columnas clave (ej: cve_id o Note#,cve_id; por defecto Note#,cve_id si ambos tienen Note#)')
+    compare_parser.add_argument('-o', '--output', help='Exportar los cambios a JSON o JSON Lines (.jsonl)')
     
     # Comando: validate
     validate_parser = subparsers.add_parser('validate', help='Validar formato del CSV')
     validate_parser.add_argument('file', help='Archivo CSV a validar')
+    validate_parser.add_argument('-c', '--chunksize', type=int, help='Leer el CSV en bloques de N filas (archivos muy grandes)')
     
     # Comando: merge
     merge_parser = subparsers.add_parser('merge', help='Combinar múltiples archivos CSV')
     merge_parser.add_argument('files', nargs='+', help='Archivos CSV a combinar')
     merge_parser.add_argument('-o', '--output', required=True, help='Archivo de salida')
     merge_parser.add_argument('-p', '--priorities', help='Prioridades (ej: 1,2,3)')
+    merge_parser.add_argument('-s', '--store', help='Maestro SQLite donde hacer el upsert (ej: ../data/sap_master.db)')
     
     args = parser.parse_args()
     
@@ -355,22 +619,22 @@ def main():
     
     # Ejecutar comando
     if args.command == 'stats':
-        analyzer = CSVAnalyzer(args.file).load()
+        analyzer = CSVAnalyzer(args.file, args.chunksize).load()
         analyzer.stats()
         if args.output:
             analyzer.export_summary(args.output)
     
     elif args.command == 'compare':
         analyzer = CSVAnalyzer(args.file1).load()
-        analyzer.compare(args.file2)
+        analyzer.compare(args.file2, args.key.split(',') if args.key else None, args.output)
     
     elif args.command == 'validate':
-        analyzer = CSVAnalyzer(args.file).load()
+        analyzer = CSVAnalyzer(args.file, args.chunksize).load()
         is_valid = analyzer.validate()
         sys.exit(0 if is_valid else 1)
     
     elif args.command == 'merge':
-        merger = CSVMerger(args.output)
+        merger = CSVMerger(args.output, args.store)
         
         priorities = None
         if args.priorities:
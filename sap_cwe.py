@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+SAP CWE Normalization
+Free-text weakness names and CVE-specific fixes -> CWE IDs (data/cwe_normalization.csv),
+plus the CWE Top 25 rank index across editions (data/cwe_top25_ranks.parquet),
+shared by the dashboard, the CLI pipeline and the CVE updater
+"""
+
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+CWE_NORMALIZATION_FILE = DATA_DIR / 'cwe_normalization.csv'
+
+# 'CWE-79', 'cwe 79', 'CWE-20,CWE-116' (first one), 'CW-653'
+CWE_ID_PATTERN = re.compile(r'^\s*CWE?[\s_:-]*(\d+)\b', re.IGNORECASE)
+VALID_CWE = re.compile(r'^CWE-\d+$')
+
+# One CSV per CWE Top 25 edition: cwe_top_25_<year>.csv, or cwe_top_25.csv with the
+# edition given by its "Rank Change vs. <previous year>" header
+CWE_TOP25_GLOB = 'cwe_top_25*.csv'
+CWE_RANK_INDEX_FILE = DATA_DIR / 'cwe_top25_ranks.parquet'
+CWE_RANK_INDEX_VERSION = 1
+
+
+def _name_key(values):
+    """Exact-key form of weakness names: trimmed, lower case, single spaces"""
+    return values.str.strip().str.lower().str.replace(r'\s+', ' ', regex=True)
+
+
+def cwe_table_version(path=CWE_NORMALIZATION_FILE):
+    """'<version>:<mtime>:<size>' of the normalization table, for cache keys"""
+    path = Path(path)
+    if not path.exists():
+        return ''
+    stat = path.stat()
+    return f"{read_table_version(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def read_table_version(path=CWE_NORMALIZATION_FILE):
+    """Version declared in the '# version: N' first line of the table"""
+    with open(path) as f:
+        match = re.match(r'#\s*version:\s*(\S+)', f.readline())
+    return match.group(1) if match else '0'
+
+
+class CWENormalizer:
+    """CWE ID normalizer built from the lookup table
+
+    Rows of the table (kind, key, cweId):
+        cve:     the cweId of that CVE (CNA records with no or a wrong CWE)
+        name:    exact weakness name, compared trimmed and case-insensitive
+        pattern: regex for the variants of a name, all combined in one compiled alternation
+
+    normalize() works on the distinct values of the column, so its cost is one factorize
+    over the rows plus a few vectorized string ops over a few hundred distinct values.
+    """
+
+    def __init__(self, table, version=''):
+        table = table.dropna(subset=['kind', 'key', 'cweId'])
+        by_kind = {kind: rows for kind, rows in table.groupby('kind')}
+        empty = table.iloc[:0]
+        cves = by_kind.get('cve', empty)
+        names = by_kind.get('name', empty)
+        patterns = by_kind.get('pattern', empty)
+
+        self.cves = dict(zip(cves['key'].str.strip().str.upper(), cves['cweId']))
+        self.names = dict(zip(_name_key(names['key']), names['cweId']))
+        self.pattern_cwes = list(patterns['cweId'])
+        self.pattern = re.compile('|'.join(f'(?P<p{i}>{p})' for i, p in enumerate(patterns['key'])),
+                                  re.IGNORECASE) if len(patterns) else None
+        self.version = version
+
+    @classmethod
+    def from_file(cls, path=CWE_NORMALIZATION_FILE):
+        return cls(pd.read_csv(path, comment='#', dtype=str), cwe_table_version(path))
+
+    def _fuzzy(self, value):
+        match = self.pattern.search(value) if self.pattern is not None else None
+        if match is None:
+            return np.nan
+        group = next(name for name, text in match.groupdict().items() if text is not None)
+        return self.pattern_cwes[int(group[1:])]
+
+    def normalize_values(self, values):
+        """Normalized CWE ID of each value (unknown names are kept, missing stay missing)"""
+        values = pd.Series(values, dtype=object)
+        out = values.map(self.cves)
+        text = values[out.isna() & values.notna()].astype(str)
+
+        cwe_number = text.str.extract(CWE_ID_PATTERN, expand=False)
+        out = out.fillna('CWE-' + cwe_number)
+        out = out.fillna(_name_key(text).map(self.names))
+
+        rest = out.isna() & values.notna()
+        if rest.any():
+            out = out.fillna(text[rest[text.index]].map(self._fuzzy))
+        return out.fillna(values)
+
+    def normalize(self, cwe_ids, cve_ids=None):
+        """
+        Normalized cweId column.
+
+        Args:
+            cwe_ids: Series of raw cweId values
+            cve_ids: optional Series of CVE IDs (same index); their table entry is applied
+                     where the value did not normalize to a CWE ID
+
+        Returns:
+            Series aligned with cwe_ids
+        """
+        codes, uniques = pd.factorize(cwe_ids)
+        # code -1 (missing value) takes the trailing NaN
+        normalized = np.append(self.normalize_values(uniques).to_numpy(dtype=object), np.nan)
+        out = pd.Series(normalized[codes], index=cwe_ids.index, dtype=object)
+
+        if cve_ids is not None and self.cves:
+            fix = cve_ids.astype('string').str.strip().str.upper().map(self.cves)
+            invalid = ~out.astype('string').str.match(VALID_CWE).fillna(False).astype(bool)
+            out = out.mask(invalid & fix.notna(), fix)
+        return out
+
+    def normalize_one(self, cwe_id, cve_id=None):
+        """Normalized CWE ID of a single value (row-wise callers)"""
+        series = pd.Series([cwe_id], dtype=object)
+        return self.normalize(series, None if cve_id is None else pd.Series([cve_id]))[0]
+
+
+_cwe_normalizer = None
+_cwe_normalizer_lock = threading.Lock()
+
+
+def cwe_normalizer(path=CWE_NORMALIZATION_FILE):
+    """Shared CWENormalizer, rebuilt only when the table changes (one stat per call)"""
+    global _cwe_normalizer
+    version = cwe_table_version(path)
+    with _cwe_normalizer_lock:
+        if _cwe_normalizer is None or _cwe_normalizer.version != version:
+            _cwe_normalizer = CWENormalizer.from_file(path)
+        return _cwe_normalizer
+
+
+def normalize_cwe_ids(cwe_ids, cve_ids=None):
+    """cweId column normalized with the shared table, see CWENormalizer.normalize"""
+    return cwe_normalizer().normalize(cwe_ids, cve_ids)
+
+
+# ==================== CWE TOP 25 RANK INDEX ====================
+
+def top25_edition(path):
+    """Edition (year) of a CWE Top 25 CSV"""
+    path = Path(path)
+    match = re.search(r'_(\d{4})$', path.stem)
+    if match:
+        return int(match.group(1))
+    with open(path) as f:
+        match = re.search(r'vs\.?\s*(\d{4})', f.readline())
+    if match is None:
+        raise ValueError(f"Unknown CWE Top 25 edition: {path}")
+    return int(match.group(1)) + 1
+
+
+def top25_files(data_dir=DATA_DIR):
+    """{edition: CSV} of the CWE Top 25 lists in data_dir"""
+    return dict(sorted((top25_edition(p), p) for p in Path(data_dir).glob(CWE_TOP25_GLOB)))
+
+
+def top25_sources_version(files):
+    """Content token of the edition CSVs (a few KB), stored with the index to detect stale
+    builds; unlike mtimes it survives a git checkout, so the committed index stays valid"""
+    digest = hashlib.sha1()
+    for edition, path in files.items():
+        digest.update(f"{edition}:".encode())
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+def build_cwe_rank_index(files):
+    """Long table (cweId, edition, rank) of every CWE Top 25 edition"""
+    editions = []
+    for edition, path in files.items():
+        # By position: the 2025 CSV header has one field less than its rows
+        ranks = pd.read_csv(path, usecols=[0, 1], header=0, names=['rank', 'cweId'], index_col=False)
+        ranks['edition'] = edition
+        editions.append(ranks)
+    index = pd.concat(editions, ignore_index=True)
+    index['cweId'] = index['cweId'].astype(str).str.strip()
+    return index.astype({'edition': 'int16', 'rank': 'int8'})[['cweId', 'edition', 'rank']]
+
+
+def write_cwe_rank_index(index, sources_version, path=CWE_RANK_INDEX_FILE):
+    """Writes the rank index as Parquet (atomic), with the sources token in the schema metadata"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    meta = {'version': CWE_RANK_INDEX_VERSION, 'sources': sources_version}
+    table = pa.Table.from_pandas(index, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b'cwe_top25': json.dumps(meta).encode()})
+    path = Path(path)
+    tmp = path.with_suffix('.tmp')
+    pq.write_table(table, tmp)
+    tmp.replace(path)
+
+
+def read_cwe_rank_index(sources_version, path=CWE_RANK_INDEX_FILE):
+    """The stored rank index, or None if missing, from another version or from other CSVs"""
+    import pyarrow.parquet as pq
+
+    if not Path(path).exists():
+        return None
+    table = pq.read_table(path)
+    meta = json.loads((table.schema.metadata or {}).get(b'cwe_top25', b'{}'))
+    if meta.get('version') != CWE_RANK_INDEX_VERSION or meta.get('sources') != sources_version:
+        return None
+    return table.to_pandas()
+
+
+class CWERankIndex:
+    """CWE -> {edition: rank} of the CWE Top 25 lists, as a dense rank matrix
+
+    ranks() is a vectorized join: one get_indexer for the CWE rows, one searchsorted for the
+    edition columns and one fancy-indexing gather, instead of a list scan per row.
+    """
+
+    def __init__(self, index, version=''):
+        matrix = index.pivot(index='cweId', columns='edition', values='rank')
+        self.cwes = matrix.index
+        self.editions = matrix.columns.to_numpy(dtype=int)
+        # trailing NaN row/column: target of the CWEs (and years) with no entry
+        self.matrix = np.full((len(self.cwes) + 1, len(self.editions)), np.nan, dtype=np.float32)
+        self.matrix[:-1] = matrix.to_numpy(dtype=np.float32)
+        self.version = version
+
+    @classmethod
+    def from_files(cls, data_dir=DATA_DIR, path=None):
+        """Index from the stored table (in data_dir by default), rebuilt and stored again when
+        the edition CSVs change"""
+        path = Path(data_dir) / CWE_RANK_INDEX_FILE.name if path is None else path
+        files = top25_files(data_dir)
+        version = top25_sources_version(files)
+        index = read_cwe_rank_index(version, path)
+        if index is None:
+            index = build_cwe_rank_index(files)
+            try:
+                write_cwe_rank_index(index, version, path)
+            except OSError:
+                pass  # read-only data/: the index is still built in memory
+        return cls(index, version)
+
+    @property
+    def latest(self):
+        return int(self.editions[-1])
+
+    def edition_positions(self, years):
+        """Column of the edition in force for each year: the latest one published up to that
+        year, or the oldest available edition for earlier years"""
+        years = pd.to_numeric(pd.Series(years).astype('string'), errors='coerce').to_numpy(dtype=float)
+        pos = np.searchsorted(self.editions, years, side='right') - 1
+        pos = np.clip(pos, 0, len(self.editions) - 1)
+        return np.where(np.isnan(years), len(self.editions) - 1, pos)
+
+    def ranks(self, cwe_ids, years=None, edition=None):
+        """
+        CWE Top 25 rank (1-25, NaN if not listed) of each CWE ID.
+
+        Args:
+            cwe_ids: normalized cweId values
+            years: optional year of each row (e.g. sap_note_year) to use the edition in force
+            edition: fixed edition for every row (default: latest, if years is not given)
+        """
+        rows = self.cwes.get_indexer(pd.Index(cwe_ids, dtype=object))
+        if years is not None:
+            cols = self.edition_positions(years)
+        else:
+            edition = self.latest if edition is None else edition
+            cols = np.full(len(rows), int(np.searchsorted(self.editions, edition)))
+        return self.matrix[rows, cols]
+
+    def members(self, edition=None):
+        """CWE IDs of one edition (default: latest)"""
+        edition = self.latest if edition is None else edition
+        col = int(np.searchsorted(self.editions, edition))
+        return list(self.cwes[~np.isnan(self.matrix[:-1, col])])
+
+
+_cwe_rank_index = None
+_cwe_rank_index_lock = threading.Lock()
+
+
+def cwe_top25_version(data_dir=DATA_DIR):
+    """Content token of the CWE Top 25 CSVs, for cache keys"""
+    return top25_sources_version(top25_files(data_dir))
+
+
+def cwe_rank_index(data_dir=DATA_DIR):
+    """Shared CWERankIndex, reloaded only when the edition CSVs change"""
+    global _cwe_rank_index
+    version = cwe_top25_version(data_dir)
+    with _cwe_rank_index_lock:
+        if _cwe_rank_index is None or _cwe_rank_index.version != version:
+            _cwe_rank_index = CWERankIndex.from_files(data_dir)
+        return _cwe_rank_index
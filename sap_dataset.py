@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+SAP CVE Dataset
+The SAP CVE master as Parquet files partitioned by sap_note_year (hive layout), so the
+dashboard reads only the years and columns it shows and the history toggle adds the
+older partitions instead of swapping whole CSVs.
+
+Layout (data/sap_cve_dataset/):
+    sap_note_year=2025/part-0.parquet
+    sap_note_year=2026/part-0.parquet
+    ...
+    _sources.json    mtime and size of the CSVs it was built from (ignored by the reader)
+
+Years from HISTORY_SPLIT on come from the current CSV (sap_cve_2026.csv), older years from
+the history CSV (sap_cve_all_2026.csv), as the two dashboard modes showed them. Once one of
+those CSVs changes (a Patch Day run, the updater) the dataset is stale and the dashboard
+reads the CSVs again until it is rebuilt.
+
+Usage:
+    python sap_dataset.py build
+    python sap_dataset.py years
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+DATASET_DIR = DATA_DIR / 'sap_cve_dataset'
+CURRENT_CSV = DATA_DIR / 'sap_cve_2026.csv'
+HISTORY_CSV = DATA_DIR / 'sap_cve_all_2026.csv'
+HISTORY_SPLIT = 2021  # first year of the current (non-history) view
+
+SOURCES_FILE = '_sources.json'
+PARTITION = 'sap_note_year'
+PARTITION_PATTERN = re.compile(rf'^{PARTITION}=(\d{{4}})$')
+# Mixed text/number columns, stored as text so every partition has the same schema
+TEXT_COLUMNS = ['Note#', 'note_id', 'Priority', 'CVSS', 'kev', 'ransomware', 'cweId']
+
+
+def normalize_frame(df):
+    """Column types shared by every partition (Note# as text without '.0', mixed columns as text)"""
+    df = df.copy()
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            text = df[col].astype(str).where(df[col].notna())
+            df[col] = text.str.replace(r'\.0$', '', regex=True) if col in ('Note#', 'note_id') else text
+    df[PARTITION] = pd.to_numeric(df[PARTITION], errors='coerce').astype('Int64')
+    return df[df[PARTITION].notna()]
+
+
+def dataset_years(path=DATASET_DIR):
+    """Years with a partition, from the directory names (no file is read)"""
+    path = Path(path)
+    if not path.is_dir():
+        return []
+    return sorted(int(m.group(1)) for p in path.iterdir() if p.is_dir() and (m := PARTITION_PATTERN.match(p.name)))
+
+
+def file_token(path):
+    """mtime and size of a file, '' if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ''
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def dataset_sources(path=DATASET_DIR):
+    """{source CSV: file_token when the dataset was built}, {} if unknown"""
+    try:
+        return json.loads((Path(path) / SOURCES_FILE).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def dataset_is_current(path=DATASET_DIR):
+    """True if no source CSV changed since the dataset was built"""
+    sources = dataset_sources(path)
+    return bool(sources) and all(file_token(source) == token for source, token in sources.items())
+
+
+def partition_version(years, path=DATASET_DIR):
+    """Cache token of some partitions: file names, sizes and mtimes"""
+    parts = []
+    for year in sorted(years):
+        for f in sorted((Path(path) / f"{PARTITION}={year}").glob('*.parquet')):
+            stat = f.stat()
+            parts.append(f"{year}/{f.name}:{stat.st_mtime_ns}:{stat.st_size}")
+    return '|'.join(parts)
+
+
+def write_partitions(df, path=DATASET_DIR):
+    """Writes df as one Parquet file per sap_note_year, replacing only the years it holds"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    df = normalize_frame(df)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(table, path, format='parquet',
+                     partitioning=ds.partitioning(pa.schema([(PARTITION, pa.int64())]), flavor='hive'),
+                     existing_data_behavior='delete_matching', basename_template='part-{i}.parquet')
+    return sorted(df[PARTITION].unique().tolist())
+
+
+def read_partitions(years, columns=None, path=DATASET_DIR):
+    """Rows of the given years only (partition pruning), with only the given columns"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet',
+                         partitioning=ds.partitioning(pa.schema([(PARTITION, pa.int64())]), flavor='hive'))
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + [PARTITION]))
+        columns = [c for c in columns if c in dataset.schema.names]
+    table = dataset.to_table(columns=columns, filter=ds.field(PARTITION).isin([int(y) for y in years]))
+    return table.to_pandas()
+
+
+def build_dataset(current_csv=CURRENT_CSV, history_csv=HISTORY_CSV, path=DATASET_DIR, split=HISTORY_SPLIT):
+    """Partitions from the two dashboard CSVs: current years from current_csv, older from history_csv"""
+    current = pd.read_csv(current_csv, low_memory=False)
+    frames = [current[pd.to_numeric(current[PARTITION], errors='coerce') >= split]]
+    if history_csv and Path(history_csv).exists():
+        history = pd.read_csv(history_csv, low_memory=False)
+        frames.append(history[pd.to_numeric(history[PARTITION], errors='coerce') < split])
+    df = pd.concat(frames, ignore_index=True)
+    years = write_partitions(df, path)
+    sources = {str(Path(p).resolve()): file_token(p) for p in (current_csv, history_csv) if p}
+    (Path(path) / SOURCES_FILE).write_text(json.dumps(sources, indent=1), encoding='utf-8')
+    logger.info(f"{len(df)} rows in {len(years)} partitions: {path}")
+    return {'rows': len(df), 'years': years}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Year-partitioned Parquet dataset of the SAP CVE master')
+    parser.add_argument('--path', default=str(DATASET_DIR), help='Dataset directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='(Re)build the partitions from the dashboard CSVs')
+    build.add_argument('--current', default=str(CURRENT_CSV))
+    build.add_argument('--history', default=str(HISTORY_CSV))
+    build.add_argument('--split', type=int, default=HISTORY_SPLIT, help='First year taken from --current')
+    sub.add_parser('years', help='List the partitions and whether they are current')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        print(json.dumps(build_dataset(args.current, args.history, args.path, args.split)))
+    else:
+        print(json.dumps({'years': dataset_years(args.path), 'current': dataset_is_current(args.path)}))
+
+
+if __name__ == '__main__':
+    main()
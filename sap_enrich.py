@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+SAP CVE Enrichment (asyncio)
+CVE JSON 5 records (CVE Services), EPSS (FIRST), KEV (local set, sap_kev.py) and NVD CVSS
+fetched directly over one pooled httpx.AsyncClient, with a concurrency cap per host and a
+minimum interval between the requests to rate-limited hosts (NVD).
+CVE records already in the local store (sap_cve_store.py) are read from disk instead.
+
+An alternative to running SploitScan and CVE_Prioritizer once per CVE: the results have the
+shape of their outputs (a SploitScan record and a CVE_Prioritizer CSV row), so
+sap_patchday.sploitscan_frame and merge_enrichment take them unchanged.
+
+Usage:
+    python sap_enrich.py CVE-2025-31324 CVE-2025-42999
+    python sap_enrich.py --benchmark 200 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from sap_cve_store import cve_store, project_record
+from sap_kev import kev_lookup
+from sap_scoring import EPSS_API
+
+logger = logging.getLogger(__name__)
+
+CVE_API = 'https://cveawg.mitre.org/api/cve'
+NVD_API = 'https://services.nvd.nist.gov/rest/json/cves/2.0'
+
+# Concurrent requests per host
+HOST_LIMITS = {'cveawg.mitre.org': 16, 'api.first.org': 4, 'services.nvd.nist.gov': 1}
+DEFAULT_HOST_LIMIT = 8
+# Minimum seconds between two requests to a host: NVD allows 5 requests per 30 s without
+# an API key (50 with one) and answers 403 past that
+NVD_HOST = 'services.nvd.nist.gov'
+HOST_INTERVALS = {NVD_HOST: 6.0}
+NVD_KEY_INTERVAL = 0.6
+EPSS_BATCH = 100  # CVE IDs per EPSS request (cve=a,b,c)
+RETRIES = 3
+TIMEOUT = 30
+
+# Thresholds of CVE_Prioritizer and SploitScan priorities
+CVSS_THRESHOLD = 6.0
+EPSS_THRESHOLD = 0.2
+
+# CVSS metrics of a CVE JSON 5 record, preferred first
+CVSS_KEYS = ['cvssV3_1', 'cvssV3_0', 'cvssV4_0', 'cvssV2_0']
+
+
+def prioritizer_priority(cvss, epss, kev):
+    """CVE_Prioritizer priority: 1+ in KEV, then CVSS / EPSS above or below the thresholds"""
+    high_cvss = cvss is not None and cvss >= CVSS_THRESHOLD
+    high_epss = epss is not None and epss >= EPSS_THRESHOLD
+    if kev:
+        return 'Priority 1+'
+    if high_cvss:
+        return 'Priority 1' if high_epss else 'Priority 2'
+    return 'Priority 3' if high_epss else 'Priority 4'
+
+
+def sploitscan_priority(cvss, epss, kev):
+    """SploitScan priority (A+ to D), same rules as prioritizer_priority"""
+    return {'Priority 1+': 'A+', 'Priority 1': 'A', 'Priority 2': 'B',
+            'Priority 3': 'C', 'Priority 4': 'D'}[prioritizer_priority(cvss, epss, kev)]
+
+
+def record_cvss(record):
+    """(score, version, severity, vector) of a CVE JSON 5 record (CNA first, then ADP), Nones if absent"""
+    containers = record.get('containers', {})
+    for container in [containers.get('cna', {})] + containers.get('adp', []):
+        for metric in container.get('metrics', []):
+            for key in CVSS_KEYS:
+                if key in metric:
+                    m = metric[key]
+                    return m.get('baseScore'), m.get('version'), m.get('baseSeverity'), m.get('vectorString')
+    return None, None, None, None
+
+
+def nvd_cvss(data):
+    """(score, version, severity, vector) from an NVD CVE API 2.0 response, Nones if absent"""
+    vulns = (data or {}).get('vulnerabilities', [])
+    metrics = vulns[0]['cve'].get('metrics', {}) if vulns else {}
+    for key in ('cvssMetricV31', 'cvssMetricV30', 'cvssMetricV40', 'cvssMetricV2'):
+        if metrics.get(key):
+            m = metrics[key][0]
+            cvss = m['cvssData']
+            return (cvss.get('baseScore'), cvss.get('version'),
+                    cvss.get('baseSeverity', m.get('baseSeverity')), cvss.get('vectorString'))
+    return None, None, None, None
+
+
+def enrichment_result(cve_id, record, epss, cvss, kev):
+    """{'sploitscan': SploitScan-like record, 'prioritizer': CVE_Prioritizer-like row}"""
+    score, version, severity, vector = cvss
+    epss_value = float(epss['epss']) if epss else None
+    in_kev = cve_id in kev
+
+    cna = (record or {}).get('containers', {}).get('cna', {})
+    affected = (cna.get('affected') or [{}])[0]
+    row = {
+        'cve_id': cve_id,
+        'priority': prioritizer_priority(score, epss_value, in_kev),
+        'epss': epss_value,
+        'cvss': score,
+        'cvss_version': f"CVSS {version}" if version else None,
+        'cvss_severity': severity,
+        'kev': in_kev,
+        'ransomware': None,
+        'kev_source': None,
+        'cpe': (affected.get('cpes') or [None])[0],
+        'vendor': affected.get('vendor'),
+        'product': affected.get('product'),
+        'vector': vector,
+    }
+
+    # sploitscan_frame needs the descriptions and the affected product of the record
+    sploitscan = None
+    if cna.get('descriptions') and cna.get('affected'):
+        sploitscan = {
+            'CVE Data': record,
+            'EPSS Data': {'data': [epss] if epss else []},
+            'Priority': {'Priority': sploitscan_priority(score, epss_value, in_kev)},
+        }
+    return {'sploitscan': sploitscan, 'prioritizer': row}
+
+
+class AsyncEnricher:
+    """Pooled async client for the enrichment APIs
+
+    Usage:
+        async with AsyncEnricher() as enricher:
+            results = await enricher.enrich(['CVE-2025-31324'])
+    """
+
+    def __init__(self, cve_api=CVE_API, epss_api=EPSS_API, nvd_api=NVD_API, host_limits=None,
+                 host_intervals=None, nvd_fallback=True, nvd_api_key=None, timeout=TIMEOUT, retries=RETRIES,
+                 store=None):
+        self.cve_api = cve_api.rstrip('/')
+        self.epss_api = epss_api
+        self.nvd_api = nvd_api
+        self.host_limits = {**HOST_LIMITS, **(host_limits or {})}
+        self.host_intervals = {**HOST_INTERVALS, **({NVD_HOST: NVD_KEY_INTERVAL} if nvd_api_key else {}),
+                               **(host_intervals or {})}
+        self.nvd_fallback = nvd_fallback
+        self.nvd_headers = {'apiKey': nvd_api_key} if nvd_api_key else {}
+        self.timeout = timeout
+        self.retries = retries
+        self.store = store  # CVEStore: records read from it, fetched records added to it
+        self._client = None
+        self._semaphores = {}
+        self._pacers = {}  # host -> (lock, [monotonic time of the next allowed request])
+
+    async def __aenter__(self):
+        hosts = [urlparse(u).netloc for u in (self.cve_api, self.epss_api, self.nvd_api)]
+        connections = sum(self._limit(h) for h in set(hosts))
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout, follow_redirects=True,
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    def _limit(self, host):
+        return self.host_limits.get(host, self.host_limits.get(host.split(':')[0], DEFAULT_HOST_LIMIT))
+
+    def _semaphore(self, host):
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self._limit(host))
+        return self._semaphores[host]
+
+    async def _pace(self, host):
+        """Waits until the host's minimum interval since its previous request has passed"""
+        interval = self.host_intervals.get(host, self.host_intervals.get(host.split(':')[0]))
+        if not interval:
+            return
+        if host not in self._pacers:
+            self._pacers[host] = (asyncio.Lock(), [0.0])
+        lock, next_at = self._pacers[host]
+        async with lock:
+            wait = next_at[0] - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            next_at[0] = time.monotonic() + interval
+
+    async def get_json(self, url, params=None, headers=None):
+        """JSON body of a GET, None on 404; retries 429/5xx and transport errors with backoff"""
+        host = urlparse(url).netloc
+        async with self._semaphore(host):
+            for attempt in range(self.retries + 1):
+                await self._pace(host)
+                try:
+                    r = await self._client.get(url, params=params, headers=headers)
+                    if r.status_code == 404:
+                        return None
+                    if r.status_code != 429 and r.status_code < 500:
+                        r.raise_for_status()
+                        return r.json()
+                    retry_after = r.headers.get('Retry-After', '')
+                    wait = float(retry_after) if retry_after.isdigit() else 2 ** attempt
+                except httpx.TransportError as e:
+                    if attempt == self.retries:
+                        raise
+                    logger.debug(f"{url}: {e}")
+                    wait = 2 ** attempt
+                if attempt == self.retries:
+                    r.raise_for_status()
+                await asyncio.sleep(wait)
+
+    async def cve_record(self, cve_id):
+        return await self.get_json(f"{self.cve_api}/{cve_id}")
+
+    async def epss_scores(self, cve_ids):
+        """{cve_id: {'cve', 'epss', 'percentile', 'date'}} in batches of EPSS_BATCH"""
+        batches = [cve_ids[i:i + EPSS_BATCH] for i in range(0, len(cve_ids), EPSS_BATCH)]
+        responses = await asyncio.gather(
+            *(self.get_json(self.epss_api, params={'cve': ','.join(b)}) for b in batches),
+            return_exceptions=True)
+        scores = {}
+        for batch, data in zip(batches, responses):
+            if isinstance(data, Exception):
+                logger.warning(f"EPSS batch of {len(batch)}: {data}")
+                continue
+            scores.update({d['cve']: d for d in (data or {}).get('data', [])})
+        return scores
+
+    async def nvd_cvss(self, cve_id):
+        return nvd_cvss(await self.get_json(self.nvd_api, params={'cveId': cve_id}, headers=self.nvd_headers))
+
+    async def enrich_one(self, cve_id, epss, kev, stored, fetched):
+        try:
+            record = stored.get(cve_id)
+            if record is None:
+                record = await self.cve_record(cve_id)
+                if record is not None:
+                    record = project_record(record)  # same record whether fetched or stored
+                    fetched.append(record)
+        except Exception as e:
+            logger.warning(f"{cve_id}: {e}")
+            return None
+        cvss = record_cvss(record or {})
+        if cvss[0] is None and self.nvd_fallback:
+            try:
+                cvss = await self.nvd_cvss(cve_id)
+            except Exception as e:  # NVD rate limit or outage: the record's result, without CVSS
+                logger.warning(f"{cve_id}: NVD: {e}")
+        return enrichment_result(cve_id, record, epss.get(cve_id), cvss, kev)
+
+    async def enrich(self, cve_ids):
+        """{cve_id: {'sploitscan': record or None, 'prioritizer': row}}, failed CVEs left out"""
+        cve_ids = list(dict.fromkeys(cve_ids))
+        kev = kev_lookup()
+        stored = self.store.get_many(cve_ids) if self.store is not None else {}
+        fetched = []
+        epss = await self.epss_scores(cve_ids)
+        results = await asyncio.gather(*(self.enrich_one(cve, epss, kev, stored, fetched) for cve in cve_ids))
+        if self.store is not None and fetched:
+            self.store.update(fetched)
+        return {cve: r for cve, r in zip(cve_ids, results) if r is not None}
+
+
+def enrich_cves(cve_ids, **kwargs):
+    """Blocking wrapper of AsyncEnricher.enrich (for the pipeline worker threads)"""
+    async def run():
+        async with AsyncEnricher(**kwargs) as enricher:
+            return await enricher.enrich(cve_ids)
+
+    return asyncio.run(run()) if cve_ids else {}
+
+
+# ==================== BENCHMARK ====================
+
+def stub_cve_record(cve_id):
+    return {
+        'cveMetadata': {'cveId': cve_id, 'datePublished': '2025-01-14T00:00:00', 'dateUpdated': '2025-01-14T00:00:00'},
+        'containers': {'cna': {
+            'descriptions': [{'lang': 'en', 'value': f'Stub record of {cve_id}'}],
+            'affected': [{'vendor': 'SAP_SE', 'product': 'SAP NetWeaver'}],
+            'problemTypes': [{'descriptions': [{'cweId': 'CWE-862', 'description': 'CWE-862: Missing Authorization'}]}],
+            'metrics': [{'cvssV3_1': {'version': '3.1', 'baseScore': 8.8, 'baseSeverity': 'HIGH',
+                                      'vectorString': 'CVSS:3.1/AV:N/AC:L/PR:L/UI:N/S:U/C:H/I:H/A:H'}}],
+            'references': [{'url': 'https://me.sap.com/notes/3300000'}],
+        }},
+    }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """CVE Services, EPSS and NVD endpoints with a fixed latency per request"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.startswith('/api/cve/'):
+            body = stub_cve_record(url.path.rsplit('/', 1)[-1])
+        elif url.path.startswith('/data/v1/epss'):
+            body = {'data': [{'cve': c, 'epss': '0.25', 'percentile': '0.96', 'date': '2025-01-15'}
+                             for c in query.get('cve', [''])[0].split(',') if c]}
+        else:
+            body = {'vulnerabilities': []}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def stub_servers(latency=0.05):
+    """Local CVE / EPSS / NVD stub servers (one port each, so each is its own host):
+    yields the AsyncEnricher URL kwargs"""
+    servers = []
+    for _ in range(3):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        server.daemon_threads = True
+        server.latency = latency
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    base = [f"http://127.0.0.1:{s.server_address[1]}" for s in servers]
+    try:
+        yield dict(cve_api=f"{base[0]}/api/cve", epss_api=f"{base[1]}/data/v1/epss",
+                   nvd_api=f"{base[2]}/rest/json/cves/2.0")
+    finally:
+        for s in servers:
+            s.shutdown()
+            s.server_close()
+
+
+def benchmark(n_cves=200, latency=0.05, workers=3, host_limit=16):
+    """CVEs/s of one subprocess per CVE on `workers` threads (how the CLIs run SploitScan)
+    against AsyncEnricher, both against the same local stub servers"""
+    cve_ids = [f"CVE-2025-{40000 + i}" for i in range(n_cves)]
+    with stub_servers(latency) as urls:
+        cmd = [sys.executable, __file__, '--json'] + [f"--{k.replace('_', '-')}={v}" for k, v in urls.items()]
+
+        def one(cve_id):
+            return subprocess.run(cmd + [cve_id], capture_output=True, text=True, timeout=120).returncode == 0
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            subprocess_ok = sum(executor.map(one, cve_ids))
+        subprocess_s = time.perf_counter() - start
+
+        limits = {urlparse(u).netloc: host_limit for u in urls.values()}
+        start = time.perf_counter()
+        async_ok = len(enrich_cves(cve_ids, host_limits=limits, **urls))
+        async_s = time.perf_counter() - start
+
+    return {'cves': n_cves, 'latency_s': latency,
+            'subprocess_s': round(subprocess_s, 3), 'subprocess_ok': subprocess_ok,
+            'subprocess_cves_per_s': round(n_cves / subprocess_s, 1),
+            'async_s': round(async_s, 3), 'async_ok': async_ok,
+            'async_cves_per_s': round(n_cves / async_s, 1),
+            'speedup': round(subprocess_s / async_s, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Enrich CVE IDs from CVE Services, EPSS, local KEV and NVD')
+    parser.add_argument('cves', nargs='*', help='CVE IDs')
+    parser.add_argument('--cve-api', default=CVE_API)
+    parser.add_argument('--epss-api', default=EPSS_API)
+    parser.add_argument('--nvd-api', default=NVD_API)
+    parser.add_argument('--no-nvd', action='store_true', help='Do not ask NVD when the record has no CVSS')
+    parser.add_argument('--store', action='store_true', help='Read/add records in the local CVE store')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='Benchmark on N CVEs against local stubs')
+    parser.add_argument('--latency', type=float, default=0.05, help='Stub latency per request (s)')
+    parser.add_argument('--workers', type=int, default=3, help='Subprocess workers in the benchmark')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(json.dumps(benchmark(args.benchmark, args.latency, args.workers), indent=2))
+        return
+
+    results = enrich_cves(args.cves, cve_api=args.cve_api, epss_api=args.epss_api, nvd_api=args.nvd_api,
+                          nvd_fallback=not args.no_nvd, store=cve_store() if args.store else None)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for cve, r in results.items():
+            row = r['prioritizer']
+            print(f"{cve}\t{row['priority']}\tCVSS {row['cvss']}\tEPSS {row['epss']}\tKEV {row['kev']}")
+    if len(results) < len(set(args.cves)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
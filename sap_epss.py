@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+SAP EPSS Store
+Local EPSS time-series (CVE x date, float32) built from FIRST's daily full-score files
+(epss_scores-YYYY-MM-DD.csv.gz), so 30/90/365-day windows and trends of every SAP CVE come
+from one slice of a memory-mapped matrix instead of one api.first.org request per CVE.
+
+Layout (data/epss_store/):
+    scores.f32  day-major float32 matrix (n_days x capacity), one row appended per day
+    cves.npy    CVE keys (sap_cve_store.cve_key) in column order, new CVEs appended
+    dates.npy   date of each row (datetime64[D], increasing)
+    meta.json   version, capacity, rows and columns committed (written last)
+
+Columns are added as new CVEs appear; when they outgrow the capacity the matrix is
+rewritten with twice the columns. meta.json is the commit point: a day is visible once
+meta.json counts it, so an interrupted ingest leaves the previous days readable.
+
+Usage:
+    python sap_epss.py ingest ~/epss_daily           # new days only
+    python sap_epss.py history CVE-2025-31324 --days 90
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sap_cve_store import cve_keys
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+EPSS_STORE_DIR = DATA_DIR / 'epss_store'
+EPSS_STORE_VERSION = 1
+
+SCORES_FILE = 'scores.f32'
+CVES_FILE = 'cves.npy'
+DATES_FILE = 'dates.npy'
+META_FILE = 'meta.json'
+
+EPSS_MAX_AGE_DAYS = 2  # older stores are not used in place of api.first.org
+MIN_CAPACITY = 1 << 18  # columns reserved up front (about 260k CVEs)
+EPSS_FILE_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})\.csv(\.gz)?$')
+
+
+def epss_file_date(path):
+    """Score date of a daily EPSS file from its name (epss_scores-YYYY-MM-DD.csv[.gz]), None if not one"""
+    m = EPSS_FILE_PATTERN.search(Path(path).name)
+    return np.datetime64(m.group(1), 'D') if m else None
+
+
+def read_epss_file(path):
+    """(cve keys, epss) of a daily file; the #model_version comment line is skipped"""
+    df = pd.read_csv(path, comment='#', usecols=['cve', 'epss'], dtype={'cve': str, 'epss': np.float32})
+    keys = cve_keys(df['cve'].tolist())
+    valid = keys >= 0
+    return keys[valid], df['epss'].to_numpy(dtype=np.float32)[valid]
+
+
+@dataclass
+class EPSSMatrix:
+    """EPSS windows of a set of CVEs on one fixed date axis
+
+    values is a dense float32 matrix (CVEs x days, EPSS %) with NaN where a CVE has no
+    score that day, so trends and averages are array reductions instead of loops over
+    lists. Rows are looked up by cve_id, so the matrix stays valid however the frame it
+    goes with is filtered, sorted or merged.
+    """
+    cve_ids: np.ndarray  # unique CVE IDs, one per row
+    dates: np.ndarray  # datetime64[D], one per column, oldest first (NaT for padding)
+    values: np.ndarray
+
+    @property
+    def mask(self):
+        """True where a CVE has a score that day"""
+        return ~np.isnan(self.values)
+
+    @property
+    def days(self):
+        return self.values.shape[1]
+
+    @classmethod
+    def from_histories(cls, cve_ids, histories, days=30, end=None):
+        """From {cve_id: [epss %, oldest first]} (api.first.org series), right-aligned on the
+        `days` days up to `end` (default today)"""
+        cve_ids = pd.unique(pd.Series(list(cve_ids), dtype=object))
+        values = np.full((len(cve_ids), days), np.nan, dtype=np.float32)
+        for i, cve in enumerate(cve_ids):
+            series = np.asarray(list(histories.get(cve) or [])[-days:], dtype=np.float32)
+            if len(series):
+                values[i, days - len(series):] = series
+        end = np.datetime64(end or 'today', 'D')
+        return cls(cve_ids, end - np.arange(days)[::-1], values)
+
+    @classmethod
+    def concat(cls, matrices):
+        """Rows of several matrices on the date axis of the first one (see align), the first
+        matrix wins for repeated CVEs"""
+        dates = matrices[0].dates
+        cve_ids = np.concatenate([m.cve_ids for m in matrices])
+        keep = ~pd.Series(cve_ids).duplicated().to_numpy()
+        values = np.concatenate([m.align(dates).values for m in matrices])
+        return cls(cve_ids[keep], dates, values[keep])
+
+    def align(self, dates):
+        """The same rows on another date axis: each day keeps its score, NaN for the days
+        this matrix does not have"""
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if len(dates) == self.days and (dates == self.dates).all():
+            return self
+        known = np.flatnonzero(~np.isnat(self.dates))
+        found = pd.Index(self.dates[known]).get_indexer(dates)
+        columns = np.where(found >= 0, known[np.maximum(found, 0)] if len(known) else -1, -1)
+        padded = np.hstack([self.values, np.full((len(self.cve_ids), 1), np.nan, dtype=np.float32)])
+        return EPSSMatrix(self.cve_ids, dates, padded[:, columns])  # -1 picks the NaN column
+
+    def rows(self, cve_ids):
+        """Row of each CVE, -1 if not in the matrix"""
+        return pd.Index(self.cve_ids).get_indexer(pd.Series(list(cve_ids), dtype=object))
+
+    def take(self, cve_ids):
+        """values of cve_ids in their order (repeats allowed), NaN rows for unknown CVEs"""
+        padded = np.vstack([self.values, np.full((1, self.days), np.nan, dtype=np.float32)])
+        return padded[self.rows(cve_ids)]  # -1 picks the NaN row
+
+    def lists(self, cve_ids):
+        """[epss %] per CVE without the empty days, for st.column_config.AreaChartColumn"""
+        return [row[~np.isnan(row)].astype(np.float64).round(4).tolist() for row in self.take(cve_ids)]
+
+    def summary(self, cve_ids, up_threshold=1.01, down_threshold=0.99):
+        """epss_last, epss_avg, epss_slope (% per day, least squares) and epss_trend of each
+        CVE (same trend rule as sap_scoring.calculate_epss_trend), as a frame in cve_ids order"""
+        cve_ids = list(cve_ids)
+        block = self.take(cve_ids).astype(np.float64)
+        valid = ~np.isnan(block)
+        n = valid.sum(axis=1)
+        rows, d = np.arange(len(cve_ids)), block.shape[1]
+        if d:
+            first = block[rows, np.argmax(valid, axis=1)]  # NaN where the CVE has no score
+            last = block[rows, d - 1 - np.argmax(valid[:, ::-1], axis=1)]
+        else:
+            first = last = np.full(len(cve_ids), np.nan)
+        x = np.where(valid, np.arange(d), 0)
+        y = np.where(valid, block, 0)
+        sx, sy = x.sum(axis=1), y.sum(axis=1)
+        denom = n * (x * x).sum(axis=1) - sx * sx
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = np.where(n > 0, sy / np.maximum(n, 1), 0)
+            slope = np.where(denom > 0, (n * (x * y).sum(axis=1) - sx * sy) / denom, 0)
+            trend = np.where(n < 2, 'stable',
+                             np.where(last > first * up_threshold, 'up',
+                                      np.where(last < first * down_threshold, 'down', 'stable')))
+        return pd.DataFrame({'cve_id': cve_ids, 'epss_last': last, 'epss_avg': avg,
+                             'epss_slope': slope, 'epss_trend': trend, 'epss_days': n})
+
+
+class EPSSStore:
+    """Memory-mapped EPSS matrix; reads reopen it when an ingest committed new days"""
+
+    def __init__(self, path=EPSS_STORE_DIR):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._state = None
+
+    def meta(self):
+        try:
+            with open(self.path / META_FILE) as f:
+                meta = json.load(f)
+            return meta if meta.get('version') == EPSS_STORE_VERSION else {}
+        except (OSError, ValueError):
+            return {}
+
+    def version(self):
+        """Token that changes when days are committed (for cache keys)"""
+        try:
+            return str(os.stat(self.path / META_FILE).st_mtime_ns)
+        except FileNotFoundError:
+            return ''
+
+    def _open(self):
+        """(dates, column keys, sorted keys, sort order, scores memmap) of the committed days"""
+        with self._lock:
+            stamp = self.version()
+            if stamp != self._stamp:
+                self._stamp = stamp
+                meta = self.meta()
+                if not meta.get('days'):
+                    self._state = None
+                else:
+                    dates = np.load(self.path / DATES_FILE)[:meta['days']]
+                    keys = np.load(self.path / CVES_FILE)[:meta['cves']]
+                    order = np.argsort(keys, kind='stable')
+                    scores = np.memmap(self.path / SCORES_FILE, dtype=np.float32, mode='r',
+                                       shape=(meta['days'], meta['capacity']))
+                    self._state = (dates, keys, keys[order], order, scores)
+            return self._state
+
+    def __len__(self):
+        state = self._open()
+        return 0 if state is None else len(state[0])
+
+    @property
+    def last_date(self):
+        state = self._open()
+        return None if state is None else state[0][-1]
+
+    def is_current(self, max_age_days=EPSS_MAX_AGE_DAYS):
+        """True if the last stored day is at most max_age_days old (FIRST publishes daily)"""
+        last = self.last_date
+        return last is not None and last >= np.datetime64('today', 'D') - max_age_days
+
+    def columns(self, cve_ids):
+        """Matrix column of each CVE ID, -1 if never scored"""
+        state = self._open()
+        keys = cve_keys(list(cve_ids))
+        if state is None:
+            return np.full(len(keys), -1)
+        _, _, sorted_keys, order, _ = state
+        pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        return np.where(sorted_keys[pos] == keys, order[pos], -1)
+
+    def window(self, cve_ids, days=30, end=None):
+        """(dates, float32 matrix len(cve_ids) x days) of the last `days` stored days up to `end`,
+        NaN where a CVE has no score that day"""
+        state = self._open()
+        if state is None:
+            return np.array([], dtype='datetime64[D]'), np.full((len(cve_ids), 0), np.nan, dtype=np.float32)
+        dates, _, _, _, scores = state
+        stop = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, 'D'), side='right'))
+        start = max(0, stop - days)
+        cols = self.columns(cve_ids)
+        block = np.asarray(scores[start:stop][:, np.maximum(cols, 0)]).T  # one slice: days x CVEs
+        block[cols < 0] = np.nan
+        return dates[start:stop], block
+
+    def histories(self, cve_ids, days=30, end=None):
+        """{cve_id: [epss %, oldest first]} like sap_scoring.fetch_epss_histories, [] if not stored"""
+        cve_ids = list(cve_ids)
+        _, block = self.window(cve_ids, days, end)
+        return {cve: (row[~np.isnan(row)] * 100).tolist() for cve, row in zip(cve_ids, block)}
+
+    def matrix(self, cve_ids, days=30, end=None):
+        """EPSSMatrix (EPSS %) of the unique cve_ids over the last `days` stored days up to
+        `end`, NaN-padded (NaT dates) on the left when the store holds fewer days"""
+        cve_ids = pd.unique(pd.Series(list(cve_ids), dtype=object))
+        dates, block = self.window(cve_ids, days, end)
+        values = np.full((len(cve_ids), days), np.nan, dtype=np.float32)
+        if len(dates):
+            values[:, days - len(dates):] = block * 100
+            dates = np.concatenate([np.full(days - len(dates), np.datetime64('NaT'), dtype='datetime64[D]'), dates])
+        else:
+            dates = np.datetime64(end or 'today', 'D') - np.arange(days)[::-1]
+        return EPSSMatrix(cve_ids, dates, values)
+
+    def summary(self, cve_ids, days=30, end=None, up_threshold=1.01, down_threshold=0.99):
+        """epss_last, epss_avg, epss_slope (%) and epss_trend of each CVE over the window"""
+        return self.matrix(cve_ids, days, end).summary(cve_ids, up_threshold, down_threshold)
+
+    # ---------- write ----------
+
+    def ingest(self, files, full=False):
+        """Appends the daily files dated after the last stored day (all of them with full)"""
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            meta = {} if full else self.meta()
+            if meta:
+                dates = list(np.load(self.path / DATES_FILE)[:meta['days']])
+                keys = np.load(self.path / CVES_FILE)[:meta['cves']]
+            else:
+                dates, keys = [], np.empty(0, dtype=np.int64)
+            capacity = meta.get('capacity', MIN_CAPACITY)
+
+            dated = sorted((d, f) for f in files if (d := epss_file_date(f)) is not None)
+            dated = [(d, f) for d, f in dated if not dates or d > dates[-1]]
+            if not dated:
+                logger.info("EPSS store up to date")
+                return {'days_added': 0, 'days': len(dates), 'cves': len(keys)}
+
+            scores_path = self.path / SCORES_FILE
+            # drop rows appended by an interrupted ingest, or everything on a full rebuild
+            with open(scores_path, 'ab') as f:
+                f.truncate(len(dates) * capacity * 4)
+
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            for day, path in dated:
+                day_keys, epss = read_epss_file(path)
+                pos = np.minimum(np.searchsorted(sorted_keys, day_keys), max(len(sorted_keys) - 1, 0))
+                known = (sorted_keys[pos] == day_keys) if len(sorted_keys) else np.zeros(len(day_keys), bool)
+                new_keys = np.unique(day_keys[~known])
+                if len(new_keys):
+                    keys = np.concatenate([keys, new_keys])
+                    order = np.argsort(keys, kind='stable')
+                    sorted_keys = keys[order]
+                    if len(keys) > capacity:
+                        capacity = self._grow(scores_path, len(dates), capacity, len(keys))
+                    pos = np.searchsorted(sorted_keys, day_keys)
+                row = np.full(capacity, np.nan, dtype=np.float32)
+                row[order[pos]] = epss
+                with open(scores_path, 'ab') as f:
+                    row.tofile(f)
+                dates.append(day)
+                logger.info(f"EPSS {day}: {len(day_keys)} CVEs ({len(new_keys)} new)")
+
+            self._commit(np.array(dates, dtype='datetime64[D]'), keys, capacity)
+            return {'days_added': len(dated), 'days': len(dates), 'cves': len(keys)}
+
+    def _grow(self, scores_path, n_days, capacity, needed):
+        """Rewrites the matrix with at least `needed` columns (doubling)"""
+        new_capacity = capacity
+        while new_capacity < needed:
+            new_capacity *= 2
+        tmp = scores_path.with_suffix('.tmp')
+        old = np.memmap(scores_path, dtype=np.float32, mode='r', shape=(n_days, capacity)) if n_days else None
+        new = np.memmap(tmp, dtype=np.float32, mode='w+', shape=(max(n_days, 1), new_capacity))
+        new[:] = np.nan
+        if n_days:
+            new[:, :capacity] = old
+        new.flush()
+        del old, new
+        with open(tmp, 'ab') as f:
+            f.truncate(n_days * new_capacity * 4)
+        os.replace(tmp, scores_path)
+        logger.info(f"EPSS store capacity {capacity} -> {new_capacity}")
+        return new_capacity
+
+    def _commit(self, dates, keys, capacity):
+        for name, arr in ((DATES_FILE, dates), (CVES_FILE, keys)):
+            tmp = self.path / (name + '.tmp.npy')
+            np.save(tmp, arr)
+            os.replace(tmp, self.path / name)
+        tmp = self.path / (META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'version': EPSS_STORE_VERSION, 'days': len(dates), 'cves': len(keys),
+                       'capacity': capacity, 'first_date': str(dates[0]), 'last_date': str(dates[-1])}, f)
+        os.replace(tmp, self.path / META_FILE)
+
+
+_epss_store = None
+_epss_store_lock = threading.Lock()
+
+
+def epss_store(path=EPSS_STORE_DIR):
+    """Shared EPSSStore of data/epss_store (empty until the first ingest)"""
+    global _epss_store
+    with _epss_store_lock:
+        if _epss_store is None or _epss_store.path != Path(path):
+            _epss_store = EPSSStore(path)
+        return _epss_store
+
+
+def epss_store_version(path=EPSS_STORE_DIR):
+    return epss_store(path).version()
+
+
+def ingest_epss_dir(source, path=EPSS_STORE_DIR, full=False):
+    """Ingests the daily EPSS files of a directory (recursively)"""
+    files = [p for p in Path(source).rglob('*.csv*') if epss_file_date(p) is not None]
+    return epss_store(path).ingest(files, full=full)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Local EPSS time-series store from FIRST daily score files')
+    parser.add_argument('--store', default=str(EPSS_STORE_DIR), help='Store directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+    ingest = sub.add_parser('ingest', help='Append the days newer than the store from a directory of daily files')
+    ingest.add_argument('source')
+    ingest.add_argument('--full', action='store_true', help='Rebuild from every file in the directory')
+    history = sub.add_parser('history', help='Print the EPSS window of some CVEs')
+    history.add_argument('cves', nargs='+')
+    history.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        print(json.dumps(ingest_epss_dir(args.source, args.store, args.full)))
+    else:
+        print(epss_store(args.store).summary(args.cves, args.days).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+SAP KEV Mirror
+Local Parquet mirror of the VulnCheck KEV index, synced incrementally by date_added,
+plus the CISA KEV feed and the KEVLookup set shared by the dashboard and the CLI pipeline
+
+Usage (cron, own schedule): VULNCHECK_API=<token> python sap_kev.py [--full] [--max-age-hours 6]
+"""
+
+import argparse
+import inspect
+import json
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+KEV_MIRROR_FILE = DATA_DIR / 'vulncheck_kev.parquet'
+KEV_MIRROR_VERSION = 1
+
+VULNCHECK_API = 'https://api.vulncheck.com/v3'
+KEV_PAGE_LIMIT = 2000
+KEV_PREFETCH = 2  # pages requested ahead of the one being processed
+# Newest entries first, so an incremental sync can stop at the mirror watermark
+# (server-side ordering needs vulncheck_sdk >= 0.1, older clients walk the whole index)
+KEV_ORDER = dict(sort='date_added', order='desc')
+
+# Columns of the mirror (same data as the VulnCheck page used to build)
+KEV_COLUMNS = ['cve', 'vendor', 'product', 'ransomware', 'date_added', 'cisa_date_added']
+
+CISA_KEV_FILE = DATA_DIR / 'cisa_kev.json'
+CISA_KEV_URL = 'https://www.cisa.gov/sites/default/files/feeds/known_exploited_vulnerabilities.json'
+KEV_MAX_AGE_HOURS = 6
+
+
+@contextmanager
+def vulncheck_indices_client(token, host=VULNCHECK_API):
+    """VulnCheck SDK IndicesApi client, as a context manager that closes its ApiClient"""
+    import vulncheck_sdk
+
+    configuration = vulncheck_sdk.Configuration(host=host)
+    configuration.api_key["Bearer"] = token
+    with vulncheck_sdk.ApiClient(configuration) as api_client:
+        yield vulncheck_sdk.IndicesApi(api_client)
+
+
+class OfflineKEVClient:
+    """Stand-in for vulncheck_sdk.IndicesApi serving KEV records from memory
+
+    Takes records shaped like the VulnCheck KEV JSON (cve list, vendorProject, product,
+    knownRansomwareCampaignUse, date_added, cisa_date_added) and answers
+    index_vulncheck_kev_get() with cursor pages, newest date_added first.
+    Used to seed the mirror from a KEV backup export and to run a sync without network.
+    """
+
+    def __init__(self, records):
+        self.records = sorted(records, key=lambda r: r.get('date_added') or '', reverse=True)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['data'] if isinstance(data, dict) else data)
+
+    def index_vulncheck_kev_get(self, start_cursor=None, cursor=None, limit=KEV_PAGE_LIMIT, **kwargs):
+        offset = int(cursor) if cursor else 0
+        page = self.records[offset:offset + limit]
+        next_offset = offset + limit
+        return SimpleNamespace(
+            data=[SimpleNamespace(
+                cve=r.get('cve') or [],
+                vendor_project=r.get('vendorProject', r.get('vendor_project')),
+                product=r.get('product'),
+                known_ransomware_campaign_use=r.get('knownRansomwareCampaignUse',
+                                                    r.get('known_ransomware_campaign_use')),
+                date_added=r.get('date_added'),
+                cisa_date_added=r.get('cisa_date_added'),
+            ) for r in page],
+            meta=SimpleNamespace(next_cursor=str(next_offset) if next_offset < len(self.records) else None),
+        )
+
+
+def kev_order_supported(indices_client):
+    """Does index_vulncheck_kev_get accept the KEV_ORDER parameters (pinned SDK releases
+    before 0.1 reject them with a ValidationError)"""
+    params = inspect.signature(indices_client.index_vulncheck_kev_get).parameters.values()
+    if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params):
+        return True
+    return set(KEV_ORDER) <= {p.name for p in params}
+
+
+def iter_kev_pages(indices_client, limit=KEV_PAGE_LIMIT, prefetch=KEV_PREFETCH, order=None):
+    """Yields the KEV index pages; a worker thread keeps requesting the next cursor pages
+    while the caller processes the current one. Closing the generator stops the worker.
+    order: extra sort parameters for the requests (KEV_ORDER), none by default."""
+    order = order or {}
+    pages = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def fetch():
+        try:
+            response = indices_client.index_vulncheck_kev_get(start_cursor="true", limit=limit, **order)
+            while True:
+                pages.put(response)
+                if stop.is_set() or response.meta.next_cursor is None:
+                    break
+                response = indices_client.index_vulncheck_kev_get(
+                    cursor=response.meta.next_cursor, limit=limit, **order)
+        except Exception as e:
+            pages.put(e)
+        pages.put(None)
+
+    worker = threading.Thread(target=fetch, daemon=True)
+    worker.start()
+    try:
+        while True:
+            page = pages.get()
+            if page is None:
+                break
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        stop.set()
+        # Unblock the worker if it is waiting on a full queue
+        while worker.is_alive():
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def kev_frame(columns):
+    """Typed DataFrame from the KEV column lists"""
+    df = pd.DataFrame(columns, columns=KEV_COLUMNS)
+    for col in ('cve', 'vendor', 'product', 'ransomware'):
+        df[col] = df[col].astype('string')
+    df['date_added'] = pd.to_datetime(df['date_added'], format='%Y-%m-%d', errors='coerce')
+    df['cisa_date_added'] = pd.to_datetime(df['cisa_date_added'], format='%Y-%m-%d', errors='coerce')
+    return df
+
+
+def fetch_kev_index(indices_client, watermark=None, limit=KEV_PAGE_LIMIT):
+    """KEV entries added on or after watermark (the whole index if None) as a typed DataFrame
+
+    When the client can ask for newest first pages (kev_order_supported), the walk stops at
+    the first page reaching the watermark; otherwise the whole index is walked and only the
+    entries since the watermark are kept. Entries of the watermark day are fetched again,
+    sync_kev_mirror dedupes them. A NaT watermark (a mirror without any date_added) fetches
+    the whole index.
+    """
+    watermark = watermark.strftime('%Y-%m-%d') if pd.notna(watermark) else None
+    ordered = kev_order_supported(indices_client)
+    columns = {col: [] for col in KEV_COLUMNS}
+    for page in iter_kev_pages(indices_client, limit, order=KEV_ORDER if ordered else None):
+        oldest = None
+        for entry in page.data:
+            date_added = (entry.date_added or '')[:10]
+            oldest = date_added if oldest is None else min(oldest, date_added)
+            if watermark and date_added < watermark:
+                continue
+            columns['cve'].append(entry.cve[0] if entry.cve else None)  # Always one CVE per entry
+            columns['vendor'].append(entry.vendor_project)
+            columns['product'].append(entry.product)
+            columns['ransomware'].append(entry.known_ransomware_campaign_use)
+            columns['date_added'].append(date_added)
+            columns['cisa_date_added'].append(entry.cisa_date_added[:10] if entry.cisa_date_added else None)
+        if ordered and watermark and oldest is not None and oldest < watermark:
+            break
+    return kev_frame(columns)
+
+
+def read_kev_mirror(path=KEV_MIRROR_FILE):
+    """Returns (kev, meta), or (None, None) if missing or written by another mirror version"""
+    import pyarrow.parquet as pq
+
+    if not Path(path).exists():
+        return None, None
+    table = pq.read_table(path)
+    meta = json.loads((table.schema.metadata or {}).get(b'kev_mirror', b'{}'))
+    if meta.get('version') != KEV_MIRROR_VERSION:
+        return None, meta
+    return table.to_pandas(), meta
+
+
+def write_kev_mirror(kev, path=KEV_MIRROR_FILE, **info):
+    """Writes the mirror as Parquet, sync info goes into the schema metadata"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    meta = {
+        'version': KEV_MIRROR_VERSION,
+        'synced_at': datetime.now(timezone.utc).isoformat(),
+        'rows': len(kev),
+        'watermark': kev['date_added'].max().strftime('%Y-%m-%d') if len(kev) else None,
+        **info,
+    }
+    table = pa.Table.from_pandas(kev, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b'kev_mirror': json.dumps(meta).encode()})
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    # Write + rename so readers never see a half written mirror
+    tmp = Path(path).with_suffix('.tmp')
+    pq.write_table(table, tmp)
+    tmp.replace(path)
+    return meta
+
+
+def sync_kev_mirror(indices_client, path=KEV_MIRROR_FILE, full=False):
+    """Brings the mirror up to date and returns (kev, meta)
+
+    Incremental by default: only entries added since the mirror watermark are fetched.
+    full=True walks the whole index again (picks up changes to older entries, e.g. cisa_date_added).
+    """
+    mirror, _ = (None, None) if full else read_kev_mirror(path)
+    watermark = mirror['date_added'].max() if mirror is not None and len(mirror) else None
+    new = fetch_kev_index(indices_client, watermark)
+
+    kev = new if mirror is None else pd.concat([new, mirror], ignore_index=True)
+    kev = kev.drop_duplicates(subset=['cve'], keep='first')
+    kev = kev.sort_values(by='date_added', ascending=False, kind='stable').reset_index(drop=True)
+    meta = write_kev_mirror(kev, path, mode='full' if watermark is None else 'incremental', fetched=len(new))
+    return kev, meta
+
+
+# ==================== CISA KEV ====================
+
+def sync_cisa_kev(path=CISA_KEV_FILE, url=CISA_KEV_URL):
+    """Downloads the CISA KEV feed as is, returns the number of vulnerabilities"""
+    import httpx
+
+    r = httpx.get(url, timeout=60, follow_redirects=True)
+    r.raise_for_status()
+    count = len(r.json()['vulnerabilities'])
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(path).with_suffix('.tmp')
+    tmp.write_bytes(r.content)
+    tmp.replace(path)
+    return count
+
+
+def read_cisa_kev_ids(path=CISA_KEV_FILE):
+    """CVE IDs of the local CISA KEV feed (empty if it was never synced)"""
+    if not Path(path).exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [v['cveID'] for v in json.load(f)['vulnerabilities']]
+
+
+def read_kev_mirror_ids(path=KEV_MIRROR_FILE):
+    """CVE IDs of the VulnCheck mirror, reading only the cve column"""
+    import pyarrow.parquet as pq
+
+    if not Path(path).exists():
+        return []
+    return pq.read_table(path, columns=['cve']).column('cve').drop_null().to_pylist()
+
+
+# ==================== KEV LOOKUP ====================
+
+def kev_sources_version(cisa_path=CISA_KEV_FILE, vulncheck_path=KEV_MIRROR_FILE):
+    """mtime/size token of the local KEV files, for cache keys"""
+    parts = []
+    for path in (cisa_path, vulncheck_path):
+        path = Path(path)
+        if path.exists():
+            stat = path.stat()
+            parts.append(f"{path.name}:{stat.st_mtime_ns}:{stat.st_size}")
+    return '|'.join(parts)
+
+
+class KEVLookup:
+    """Known exploited CVE IDs (CISA + VulnCheck) from the local files, no network calls
+
+    A frozenset: membership is O(1) per CVE and a few thousand IDs take well under 1 MB,
+    so an approximate structure (bloom filter) would not pay off.
+    """
+
+    def __init__(self, cves=(), version=''):
+        self.cves = frozenset(str(c).strip().upper() for c in cves if c)
+        self.version = version
+
+    @classmethod
+    def from_files(cls, cisa_path=CISA_KEV_FILE, vulncheck_path=KEV_MIRROR_FILE):
+        cves = list(read_cisa_kev_ids(cisa_path)) + list(read_kev_mirror_ids(vulncheck_path))
+        return cls(cves, kev_sources_version(cisa_path, vulncheck_path))
+
+    def __contains__(self, cve):
+        return isinstance(cve, str) and cve.strip().upper() in self.cves
+
+    def __len__(self):
+        return len(self.cves)
+
+    def flags(self, cve_ids):
+        """Boolean Series: is each CVE ID of cve_ids in the KEV set"""
+        return cve_ids.astype('string').str.strip().str.upper().isin(self.cves).fillna(False).astype(bool)
+
+
+_kev_lookup = None
+_kev_lookup_lock = threading.Lock()
+
+
+def kev_lookup(cisa_path=CISA_KEV_FILE, vulncheck_path=KEV_MIRROR_FILE):
+    """Shared KEVLookup, reloaded only when the local KEV files change (one stat per call)"""
+    global _kev_lookup
+    version = kev_sources_version(cisa_path, vulncheck_path)
+    with _kev_lookup_lock:
+        if _kev_lookup is None or _kev_lookup.version != version:
+            _kev_lookup = KEVLookup.from_files(cisa_path, vulncheck_path)
+        return _kev_lookup
+
+
+def file_age_hours(path):
+    """Hours since path was last written (None if missing)"""
+    if not Path(path).exists():
+        return None
+    return (datetime.now().timestamp() - Path(path).stat().st_mtime) / 3600
+
+
+def refresh_kev_sources(vulncheck_token=None, max_age_hours=KEV_MAX_AGE_HOURS, full=False):
+    """Syncs the CISA feed and (with a token) the VulnCheck mirror when older than max_age_hours"""
+    results = {}
+    age = file_age_hours(CISA_KEV_FILE)
+    if full or age is None or age > max_age_hours:
+        results['cisa'] = sync_cisa_kev()
+    age = file_age_hours(KEV_MIRROR_FILE)
+    if vulncheck_token and (full or age is None or age > max_age_hours):
+        with vulncheck_indices_client(vulncheck_token) as indices_client:
+            _, meta = sync_kev_mirror(indices_client, full=full)
+        results['vulncheck'] = meta['rows']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync the local KEV sources (CISA feed + VulnCheck mirror)')
+    parser.add_argument('--full', action='store_true', help='Sync everything again, ignoring file age and watermark')
+    parser.add_argument('--max-age-hours', type=float, default=KEV_MAX_AGE_HOURS,
+                        help=f'Only sync sources older than this (default: {KEV_MAX_AGE_HOURS})')
+    args = parser.parse_args()
+
+    token = os.environ.get('VULNCHECK_API')
+    if not token:
+        print('VULNCHECK_API not set: only the CISA KEV feed is synced')
+    results = refresh_kev_sources(token, args.max_age_hours, args.full)
+    for source, rows in results.items():
+        print(f'{source}: {rows} KEV entries')
+    print(f'KEV lookup: {len(kev_lookup())} CVE IDs')
+
+
+if __name__ == '__main__':
+    main()
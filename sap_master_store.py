@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+SAP Master Store
+Embedded SQLite master of the SAP CVE rows (one per CSV row), so the updater and
+the merger upsert the rows they touched instead of rewriting whole CSVs, and lookups by
+CVE, note or publication date use an index instead of reading every row.
+
+Layout (data/sap_master.db):
+    cve_rows   every CSV column as TEXT (NULL for empty cells) plus _source, _priority,
+               _loaded_at; primary key (Note#, cve_id, _title_hash, _occurrence), indexes
+               on cve_id, Note# and datePublished; columns are added as new CSV columns appear
+    columns    CSV column name -> SQL column (SQLite names are case-insensitive and the
+               CSVs have both Priority and priority), in the order first seen
+    meta       key columns and a generation counter bumped by every write (cache token)
+
+A note re-published for the same CVE ("Update to security note ...") is a row of its own:
+the key adds a hash of the Title and, for rows that still repeat the first three parts
+(Titles that differ only in case, exact copies), their occurrence number in the file.
+
+Conflicts follow the CSVMerger rule: a row replaces the stored values when its priority
+is higher than the stored one (or equal, for upserts of fresher data), and only with
+non-empty values.
+Standard library only (pandas is imported by read_frame), like sap_pipeline.py.
+
+Usage:
+    python sap_master_store.py load data/sap_cve_all_2026.csv --priority 1
+    python sap_master_store.py get CVE-2025-31324
+    python sap_master_store.py export data/sap_cve_all_2026.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import sqlite3
+from collections import Counter
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+MASTER_DB = DATA_DIR / 'sap_master.db'
+
+TABLE = 'cve_rows'
+TITLE_HASH = '_title_hash'
+OCCURRENCE = '_occurrence'
+KEY = ('Note#', 'cve_id', TITLE_HASH, OCCURRENCE)
+ROW_ID = (TITLE_HASH, OCCURRENCE)  # key parts derived from the rows, not CSV columns
+INDEXED = ('cve_id', 'Note#', 'datePublished')
+# SQL names of the columns every store has, the others are c<position>
+BASE_COLUMNS = {'Note#': 'note', 'cve_id': 'cve_id', 'datePublished': 'date_published', 'dateUpdated': 'date_updated'}
+INTERNAL = ('_source', '_priority', '_loaded_at')
+UPSERT_CHUNK = 5000  # rows per executemany
+ENRICHED_PRIORITY = 100  # rows just enriched by the updater win over any merged CSV
+
+
+def note_number(value):
+    """Note# as text, whether it was read as text, int or float ('3600000.0')"""
+    value = str(value).strip() if value is not None else ''
+    return value[:-2] if value.endswith('.0') else value
+
+
+def title_hash(title):
+    """Hash of a Title ignoring case and whitespace changes (16 hex digits)"""
+    norm = ' '.join(str(title or '').split()).casefold()
+    return hashlib.blake2b(norm.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def row_ids(rows):
+    """(Note#, cve_id, Title hash, occurrence) of each row, in order
+
+    The occurrence numbers the rows that repeat the first three parts, in file order. A
+    row that is part of a larger file (the updater's enriched rows) can carry its own
+    occurrence in the OCCURRENCE field.
+    """
+    seen = Counter()
+    ids = []
+    for row in rows:
+        base = (note_number(row.get('Note#')), (row.get('cve_id') or '').strip().upper(), title_hash(row.get('Title')))
+        given = row.get(OCCURRENCE)
+        ids.append(base + (int(given) if given not in (None, '') else seen[base],))
+        seen[base] += 1
+    return ids
+
+
+def sql_name(column):
+    return BASE_COLUMNS.get(column, column)
+
+
+class MasterStore:
+    """SQLite master of CSV rows keyed by `key` (KEY, one row per CSV row, or cve_id alone)
+
+    Every call opens its own connection (WAL journal), so the store can be shared by
+    threads and read by the dashboard while the updater writes. ':memory:' keeps one
+    connection for the life of the object.
+    """
+
+    def __init__(self, path=MASTER_DB, key=KEY):
+        self.path = str(path)
+        self._memory = self.path == ':memory:'
+        self._conn = sqlite3.connect(':memory:') if self._memory else None
+        if not self._memory:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+            stored = conn.execute("SELECT value FROM meta WHERE name = 'key'").fetchone()
+            self.key = tuple(json.loads(stored[0])) if stored else tuple(key)
+            if stored is None:
+                self._create(conn)
+        self._columns = None
+
+    def _connect(self):
+        if self._memory:
+            return _Borrowed(self._conn)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return _Owned(conn)
+
+    def _create(self, conn):
+        defs = [f"{sql} TEXT NOT NULL DEFAULT ''" if name in self.key else f"{sql} TEXT"
+                for name, sql in BASE_COLUMNS.items()]
+        defs += [f"{TITLE_HASH} TEXT NOT NULL DEFAULT ''"] if TITLE_HASH in self.key else []
+        defs += [f"{OCCURRENCE} INTEGER NOT NULL DEFAULT 0"] if OCCURRENCE in self.key else []
+        defs += ['_source TEXT', '_priority INTEGER NOT NULL DEFAULT 0', '_loaded_at TEXT']
+        conn.execute(f"CREATE TABLE {TABLE} ({', '.join(defs)}, "
+                     f"PRIMARY KEY ({', '.join(sql_name(c) for c in self.key)}))")
+        for col in INDEXED:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{BASE_COLUMNS[col]} ON {TABLE} ({BASE_COLUMNS[col]})")
+        conn.execute('CREATE TABLE columns (pos INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, sql TEXT NOT NULL)')
+        conn.executemany('INSERT INTO columns (name, sql) VALUES (?, ?)', BASE_COLUMNS.items())
+        conn.execute("INSERT INTO meta VALUES ('key', ?), ('generation', '0')", (json.dumps(self.key),))
+
+    def _mapping(self, conn=None):
+        """{CSV column: SQL column}, in the order first seen"""
+        if self._columns is None:
+            if conn is None:
+                with self._connect() as conn:
+                    return self._mapping(conn)
+            self._columns = dict(conn.execute('SELECT name, sql FROM columns ORDER BY pos').fetchall())
+        return dict(self._columns)
+
+    def columns(self):
+        """CSV columns, in the order they were first seen"""
+        return list(self._mapping())
+
+    def _add_columns(self, conn, names):
+        known = self._mapping(conn)
+        for name in dict.fromkeys(names):
+            if name and name not in known:
+                pos = conn.execute('INSERT INTO columns (name, sql) VALUES (?, ?)', (name, '')).lastrowid
+                conn.execute('UPDATE columns SET sql = ? WHERE pos = ?', (f'c{pos}', pos))
+                conn.execute(f'ALTER TABLE {TABLE} ADD COLUMN c{pos} TEXT')
+                self._columns = None
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM {TABLE}').fetchone()[0]
+
+    def version(self):
+        """Changes with every write (cache token for the dashboard)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+        return f"{self.path}:{row[0] if row else 0}"
+
+    # ---------- write ----------
+
+    def upsert(self, rows, source='', priority=0, insert_only=False, replace_equal=True):
+        """Inserts or updates rows (dicts of CSV values) in one transaction
+
+        Rows without a cve_id are skipped. insert_only leaves the stored rows untouched
+        (loads a CSV without overriding what the updater already wrote); without
+        replace_equal a row only replaces rows of lower priority (the first of a file wins).
+        A store keyed by Note# without the occurrence (created before it was part of KEY)
+        raises ValueError on repeated keys instead of merging the rows.
+        Returns {'rows', 'inserted', 'updated', 'skipped'}.
+        """
+        rows = list(rows)
+        names = list(dict.fromkeys(k for row in rows for k in row if k and k not in ROW_ID))
+        derived = [c for c in ROW_ID if c in self.key]
+        loaded_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with self._connect() as conn:
+            self._add_columns(conn, names)
+            mapping = self._mapping(conn)
+            columns = [c for c in mapping if c in names or c in self.key]
+            values, skipped, seen = [], 0, set()
+            strict = 'Note#' in self.key and OCCURRENCE not in self.key
+            for row, row_id in zip(rows, row_ids(rows)):
+                # Values as they come, whitespace-only cells are empty
+                record = {c: str(row[c]) if row.get(c) is not None and str(row[c]).strip() else None
+                          for c in columns}
+                if 'Note#' in record:
+                    record['Note#'] = note_number(record['Note#'])
+                if 'cve_id' in record:
+                    record['cve_id'] = (record['cve_id'] or '').strip().upper() or None
+                if not record.get('cve_id'):
+                    skipped += 1
+                    continue
+                record.update(zip(ROW_ID, row_id[2:]))
+                for c in self.key:
+                    record[c] = (record[c] or 0) if c == OCCURRENCE else (record[c] or '')
+                if strict:
+                    key = tuple(record[c] for c in self.key)
+                    if key in seen:
+                        raise ValueError(f"Repeated key {key} in {source or 'the rows'}: the store at {self.path} "
+                                         f"is keyed by {self.key}, rebuild it to keep every row")
+                    seen.add(key)
+                values.append([record[c] for c in columns] + [record[c] for c in derived]
+                              + [source, int(priority), loaded_at])
+
+            sql_cols = [mapping[c] for c in columns] + derived + list(INTERNAL)
+            sql = (f"INSERT INTO {TABLE} ({', '.join(sql_cols)}) VALUES ({', '.join('?' * len(sql_cols))}) "
+                   f"ON CONFLICT ({', '.join(sql_name(c) for c in self.key)}) ")
+            if insert_only:
+                sql += 'DO NOTHING'
+            else:
+                wins = f"excluded._priority {'>=' if replace_equal else '>'} {TABLE}._priority"
+                sets = [f"{col} = CASE WHEN {wins} AND excluded.{col} IS NOT NULL THEN excluded.{col} ELSE {TABLE}.{col} END"
+                        for col in (mapping[c] for c in columns if c not in self.key)]
+                sets += [f'_source = CASE WHEN {wins} THEN excluded._source ELSE {TABLE}._source END',
+                         f'_loaded_at = CASE WHEN {wins} THEN excluded._loaded_at ELSE {TABLE}._loaded_at END',
+                         f'_priority = MAX({TABLE}._priority, excluded._priority)']
+                sql += 'DO UPDATE SET ' + ', '.join(sets)
+
+            before = conn.execute(f'SELECT COUNT(*) FROM {TABLE}').fetchone()[0]
+            for start in range(0, len(values), UPSERT_CHUNK):
+                conn.executemany(sql, values[start:start + UPSERT_CHUNK])
+            inserted = conn.execute(f'SELECT COUNT(*) FROM {TABLE}').fetchone()[0] - before
+            conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE name = 'generation'")
+        return {'rows': len(values), 'inserted': inserted,
+                'updated': 0 if insert_only else len(values) - inserted, 'skipped': skipped}
+
+    def load_csv(self, path, priority=0, insert_only=False):
+        """Upserts every row of a CSV file"""
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return self.upsert(csv.DictReader(f), source=str(path), priority=priority, insert_only=insert_only)
+
+    # ---------- read ----------
+
+    def _select(self, where='', order_by='cve_id'):
+        mapping = self._mapping()
+        sql = f"SELECT {', '.join(mapping.values())} FROM {TABLE}"
+        if where:
+            sql += f' WHERE {where}'
+        if order_by:
+            sql += f' ORDER BY {BASE_COLUMNS[order_by]}'
+        return list(mapping), sql
+
+    def rows(self, where='', params=(), order_by='cve_id'):
+        """CSV rows (dicts, '' for empty cells) matching an optional SQL condition on the
+        base columns (note, cve_id, date_published, date_updated)"""
+        columns, sql = self._select(where, order_by)
+        with self._connect() as conn:
+            for values in conn.execute(sql, params):
+                yield {c: '' if v is None else v for c, v in zip(columns, values)}
+
+    def get(self, cve_id):
+        """Rows of one CVE (index lookup)"""
+        return list(self.rows('cve_id = ?', (str(cve_id).strip().upper(),)))
+
+    def note(self, note):
+        """Rows of one SAP Note (index lookup)"""
+        return list(self.rows('note = ?', (note_number(note),)))
+
+    def published_between(self, start, end):
+        """Rows published in [start, end) (ISO dates, index range scan)"""
+        return list(self.rows('date_published >= ? AND date_published < ?', (str(start), str(end)),
+                              order_by='datePublished'))
+
+    def export_csv(self, path, columns=None):
+        """Writes the rows to a CSV (columns: default every stored CSV column)"""
+        columns = columns or self.columns()
+        count = 0
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            for row in self.rows():
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def read_frame(self):
+        """Every row as a DataFrame (what the dashboard reads), numeric columns typed as
+        pd.read_csv would type them"""
+        import pandas as pd
+
+        columns, sql = self._select()
+        with self._connect() as conn:
+            df = pd.DataFrame(conn.execute(sql).fetchall(), columns=columns)
+        for col in df.columns:
+            numbers = pd.to_numeric(df[col], errors='coerce')
+            if numbers.notna().sum() == df[col].notna().sum():
+                df[col] = numbers
+        return df
+
+
+class _Owned:
+    """Connection closed (after commit or rollback) when the block ends"""
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        with closing(self.raw):
+            return self.raw.__exit__(*exc)
+
+    def execute(self, *args):
+        return self.raw.execute(*args)
+
+    def executemany(self, *args):
+        return self.raw.executemany(*args)
+
+
+class _Borrowed(_Owned):
+    """Shared ':memory:' connection: commit or rollback only"""
+
+    def __exit__(self, *exc):
+        return self.raw.__exit__(*exc)
+
+
+def master_store(path=MASTER_DB):
+    return MasterStore(path)
+
+
+def master_store_version(path=MASTER_DB):
+    """Cache token of the master store, '' if there is none"""
+    return MasterStore(path).version() if Path(path).exists() else ''
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='SQLite master store of the SAP CVE rows')
+    parser.add_argument('--db', default=str(MASTER_DB), help='Master database')
+    sub = parser.add_subparsers(dest='command', required=True)
+    load = sub.add_parser('load', help='Upsert the rows of CSV files')
+    load.add_argument('files', nargs='+')
+    load.add_argument('--priority', type=int, default=0)
+    load.add_argument('--insert-only', action='store_true', help='Do not update stored rows')
+    get = sub.add_parser('get', help='Print the rows of some CVEs')
+    get.add_argument('cves', nargs='+')
+    export = sub.add_parser('export', help='Write the master as CSV')
+    export.add_argument('output')
+    sub.add_parser('stats', help='Rows, columns and version')
+    args = parser.parse_args()
+
+    store = MasterStore(args.db)
+    if args.command == 'load':
+        for path in args.files:
+            print(path, json.dumps(store.load_csv(path, args.priority, args.insert_only)))
+    elif args.command == 'get':
+        print(json.dumps({cve: store.get(cve) for cve in args.cves}, indent=2, ensure_ascii=False))
+    elif args.command == 'export':
+        print(f"{store.export_csv(args.output)} rows -> {args.output}")
+    else:
+        print(json.dumps({'rows': len(store), 'key': store.key, 'columns': store.columns(),
+                          'version': store.version()}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+SAP Patch Day Stages
+Shared implementation of each pipeline stage (sap_pipeline.py) for the Patch Day CLIs:
+extract (support.sap.com tables) -> normalize (CVE IDs) -> enrich (SploitScan, CVE_Prioritizer)
+-> merge -> persist (CSV) -> score (Rethink table)
+
+With a master dataset (PatchDayConfig.master) the run is incremental: rows already in the
+master with the same (Note#, cve_id, Title) are reused instead of enriched again, and the
+result is upserted into the master.
+"""
+
+import glob
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sap_cwe import normalize_cwe_ids
+from sap_kev import kev_lookup
+from sap_master_store import row_ids
+from sap_pipeline import Checkpoint, Pipeline, Stage
+from sap_scoring import build_score_table, update_score_table, write_score_table
+
+logger = logging.getLogger(__name__)
+
+SAP_NOTES_URL = 'https://support.sap.com/en/my-support/knowledge-base/security-notes-news'
+MONTHS = {
+    1: 'january', 2: 'february', 3: 'march', 4: 'april',
+    5: 'may', 6: 'june', 7: 'july', 8: 'august',
+    9: 'september', 10: 'october', 11: 'november', 12: 'december'
+}
+
+NOTE_PATTERN = re.compile(r'[23]\d{6,7}')
+CVE_PATTERN = r'CVE-\d{4}-\d{4,7}'
+
+ENRICH_BACKENDS = ('tools', 'api')  # SploitScan + CVE_Prioritizer, or sap_enrich (asyncio)
+API_BATCH_SIZE = 200  # CVEs per AsyncEnricher run
+
+SPLOITSCAN_MODULES = 'cisa,epss,prio,references'
+SPLOITSCAN_TIMEOUT = 90
+PRIORITIZER_TIMEOUT = 300
+
+# Columnas del CSV maestro (orden de sap_cve_*.csv)
+FINAL_COLUMNS = [
+    'cve_id', 'datePublished', 'dateUpdated', 'descriptions',
+    'product_l', 'epss_l', 'percentile', 'priority_l', 'cweId',
+    'note_id', 'Note#', 'Title', 'Priority', 'CVSS',
+    'priority', 'epss', 'cvss', 'cvss_version', 'cvss_severity',
+    'kev', 'ransomware', 'kev_source', 'cpe', 'vendor',
+    'product', 'vector', 'sap_note_year'
+]
+
+
+# ==================== EXTRACT ====================
+
+def patch_day_url(year, month=None, archive=False):
+    """Patch Day page of a month, or the yearly bulletin (archive) of a finished year"""
+    if archive:
+        return f"{SAP_NOTES_URL}/bulletin-{year}.html"
+    return f"{SAP_NOTES_URL}/{MONTHS.get(month, '')}-{year}.html"
+
+
+def scrape_patch_day(url, timeout=30):
+    """Rows of every table in the page that mention a SAP Note number or a CVE ID"""
+    import requests
+    from bs4 import BeautifulSoup
+
+    resp = requests.get(url, timeout=timeout)
+    resp.raise_for_status()
+    soup = BeautifulSoup(resp.text, "lxml")
+
+    cve_pattern = re.compile(CVE_PATTERN)
+    rows = []
+    for tbl in soup.find_all("table"):
+        for tr in tbl.find_all("tr"):
+            cells = [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"])]
+            if cells and any(NOTE_PATTERN.search(c) or cve_pattern.search(c) for c in cells):
+                rows.append(cells)
+    logger.info(f"{url}: {len(rows)} rows")
+    return pd.DataFrame(rows)
+
+
+# ==================== NORMALIZE ====================
+
+def extract_cve_ids(df):
+    """(df with ColN columns and cve_id, unique CVE IDs): first CVE ID of each row, left to right
+
+    One str.extract per column instead of a Python regex loop per row.
+    """
+    if df.empty:
+        return pd.DataFrame(), []
+    df = df.copy()
+    df.columns = [f"Col{i}" for i in range(df.shape[1])]
+    found = pd.concat([df[c].astype(str).str.extract(f'({CVE_PATTERN})', expand=False) for c in df.columns],
+                      axis=1)
+    df['cve_id'] = found.bfill(axis=1).iloc[:, 0]
+    return df, df['cve_id'].dropna().unique().tolist()
+
+
+# ==================== INCREMENTAL ====================
+
+def row_keys(df, note='Note#', title='Title'):
+    """Row identity of each row of df, as in the master store (sap_master_store.row_ids:
+    Note#, cve_id, Title hash, occurrence)"""
+    rows = df[[note, 'cve_id', title]].astype(object)
+    rows = rows.where(rows.notna(), None)
+    rows.columns = ['Note#', 'cve_id', 'Title']
+    return pd.Series(row_ids(rows.to_dict('records')), index=df.index, dtype=object)
+
+
+def read_master(path):
+    """Master dataset (sap_cve_*.csv), empty if it does not exist yet"""
+    if not Path(path).exists():
+        return pd.DataFrame(columns=FINAL_COLUMNS)
+    return pd.read_csv(path, low_memory=False)
+
+
+def diff_patch_day(sap_df, master, store=None):
+    """Splits the scraped rows (Col0 = Note#, Col1 = Title, cve_id) against the master
+
+    A row is unchanged when the master has the same row key (row_keys) and the CVE
+    record in the local CVE store (if any) is not newer than the master's dateUpdated.
+    Every row of a CVE with a new or changed row is enriched again, so all the notes of
+    a CVE carry the same data.
+
+    Returns (rows to enrich, master rows reused for the unchanged ones, changed CVE IDs)
+    """
+    if sap_df.empty:
+        return sap_df, master.iloc[:0], []
+    keys = row_keys(sap_df, note='Col0', title='Col1')
+    master_keys = row_keys(master)
+    known = keys.isin(master_keys)
+
+    changed = []
+    if store is not None and len(master):
+        master_updated = (pd.to_datetime(master['dateUpdated'], utc=True, errors='coerce')
+                          .groupby(master['cve_id']).max())
+        cves = sap_df.loc[known, 'cve_id'].dropna().unique()
+        seen = ((master_updated.reindex(cves) - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1))
+        changed = cves[store.updated(cves) > seen.fillna(-1).to_numpy(dtype=np.int64)].tolist()
+
+    fresh_cves = set(sap_df.loc[~known, 'cve_id'].dropna()) | set(changed)
+    enrich = ~known | sap_df['cve_id'].isin(fresh_cves)
+    reused = master[master_keys.isin(keys[~enrich])]
+    return sap_df[enrich], reused, changed
+
+
+def upsert_master(path, df):
+    """Replaces the master rows with the row keys (row_keys, as diff_patch_day) of df and
+    appends the new ones (written to a temporary file first, the master is never left half
+    written)"""
+    master = read_master(path)
+    keys = row_keys(df)
+    master_keys = row_keys(master)
+    kept = master[~master_keys.isin(keys)]
+    columns = list(master.columns) + [c for c in df.columns if c not in master.columns]
+    merged = pd.concat([kept, df], ignore_index=True).reindex(columns=columns)
+    tmp = Path(f"{path}.tmp")
+    merged.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return {'master_rows': len(merged), 'updated': int(master_keys.isin(keys).sum()),
+            'added': int((~keys.isin(master_keys)).sum())}
+
+
+# ==================== ENRICH ====================
+
+def find_config_file(tool_path='.'):
+    """SploitScan config in the usual places (relative to tool_path), as an absolute path"""
+    for path in (".streamlit/config.json", "config.json", "../config.json"):
+        candidate = Path(tool_path) / path
+        if candidate.exists():
+            return str(candidate.resolve())
+    return str((Path(tool_path) / "config.json").resolve())
+
+
+def run_sploitscan(cve_id, config_file, timeout=SPLOITSCAN_TIMEOUT):
+    """SploitScan record of one CVE, None on failure
+
+    Each call runs in its own temporary directory, so its *_export.json is found without
+    comparing glob snapshots (which races between workers) or waiting for the file.
+    """
+    with tempfile.TemporaryDirectory(prefix='sploitscan_') as tmp:
+        cmd = ["sploitscan", cve_id, "-c", config_file, "-m", SPLOITSCAN_MODULES, "-d", "-e", "json"]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, cwd=tmp)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Timeout: {cve_id}")
+            return None
+        except FileNotFoundError:
+            logger.warning("sploitscan not found")
+            return None
+        if result.returncode != 0:
+            logger.debug(f"SploitScan failed for {cve_id}: {result.stderr[:200]}")
+            return None
+        exports = glob.glob(os.path.join(tmp, "*_export.json"))
+        if not exports:
+            return None
+        with open(exports[0]) as f:
+            data = json.load(f)
+    if isinstance(data, list):
+        return data[0] if data else None
+    return data if isinstance(data, dict) else None
+
+
+def run_cve_prioritizer(cve_ids, tool_path='.', timeout=PRIORITIZER_TIMEOUT):
+    """CVE_Prioritizer rows (records) for a batch of CVEs, [] on failure"""
+    with tempfile.TemporaryDirectory(prefix='prioritizer_') as tmp:
+        output_file = os.path.join(tmp, 'prioritizer.csv')
+        cmd = ["cve_prioritizer", "-l", ",".join(cve_ids), "-vck", "-vc", "-v", "-o", output_file]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, cwd=tool_path)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Timeout: CVE_Prioritizer batch of {len(cve_ids)}")
+            return []
+        except FileNotFoundError:
+            logger.warning("cve_prioritizer not found")
+            return []
+        if result.returncode != 0 or not os.path.exists(output_file):
+            return []
+        df = pd.read_csv(output_file)
+    # records (not a DataFrame) so the rows can go to the checkpoint as JSON
+    return json.loads(df.to_json(orient='records'))
+
+
+def sploitscan_frame(records):
+    """One row per CVE from SploitScan records (fields used by the CSV maestro)"""
+    dict_list = []
+    for i in records:
+        cna = i['CVE Data']['containers']['cna']
+        # CWE
+        if 'problemTypes' in cna.keys():
+            description = cna['problemTypes'][0]['descriptions'][0]
+            cweId = description['cweId'] if 'cweId' in description.keys() else description['description']
+        else:
+            cweId = None
+
+        # EPSS
+        if len(i['EPSS Data']['data']) == 1:
+            epss_l = i['EPSS Data']['data'][0]['epss']
+            percentile = i['EPSS Data']['data'][0]['percentile']
+        else:
+            epss_l = None
+            percentile = None
+
+        # Note ID
+        if 'references' in cna.keys():
+            note_id = re.findall('[2,3]{1}[0-9]{6}', str(cna['references'][0]['url']))
+        else:
+            note_id = None
+
+        dict_list.append({
+            'cve_id': i['CVE Data']['cveMetadata']['cveId'],
+            'datePublished': i['CVE Data']['cveMetadata'].get('datePublished', None),
+            'dateUpdated': i['CVE Data']['cveMetadata']['dateUpdated'],
+            'descriptions': cna['descriptions'][0]['value'],
+            'product_l': cna['affected'][0]['product'],
+            'epss_l': epss_l,
+            'percentile': percentile,
+            'priority_l': i['Priority']['Priority'],
+            'cweId': cweId,
+            'note_id': str(note_id)
+        })
+
+    data = pd.DataFrame.from_dict(dict_list)
+    if not data.empty:
+        data.drop_duplicates(subset=['cve_id'], inplace=True)
+    return data
+
+
+# ==================== MERGE ====================
+
+def merge_enrichment(sap_df, sploitscan_df, prioritizer_df, year, archive=False):
+    """SAP rows + SploitScan + CVE_Prioritizer, KEV from the local set, normalized CWE IDs,
+    columns in the CSV maestro order (all of them with archive)"""
+    result_df = sap_df.copy()
+    if sploitscan_df is not None and not sploitscan_df.empty:
+        result_df = result_df.merge(sploitscan_df, on=['cve_id'], how='left')
+    if prioritizer_df is not None and not prioritizer_df.empty:
+        result_df = result_df.merge(prioritizer_df.drop_duplicates(subset=['cve_id']), on=['cve_id'], how='left')
+
+    # KEV local (CISA + VulnCheck): completa el flag sin llamadas de red
+    kev = kev_lookup()
+    if len(kev) and 'cve_id' in result_df.columns:
+        in_kev = kev.flags(result_df['cve_id'])
+        if 'kev' not in result_df.columns:
+            result_df['kev'] = None
+        result_df['kev'] = result_df['kev'].astype(object)
+        result_df.loc[in_kev, 'kev'] = True
+
+    # CWE: nombres libres y correcciones por CVE -> CWE-ID (data/cwe_normalization.csv)
+    if 'cweId' in result_df.columns:
+        result_df['cweId'] = normalize_cwe_ids(result_df['cweId'], result_df['cve_id'])
+
+    result_df['sap_note_year'] = str(year)
+    result_df.rename(columns={'Col0': 'Note#', 'Col1': 'Title', 'Col2': 'Priority', 'Col3': 'CVSS'},
+                     inplace=True)
+
+    if archive:
+        for col in FINAL_COLUMNS:
+            if col not in result_df.columns:
+                result_df[col] = None
+        return result_df[FINAL_COLUMNS]
+    return result_df[[col for col in FINAL_COLUMNS if col in result_df.columns]]
+
+
+# ==================== PIPELINE ====================
+
+@dataclass
+class PatchDayConfig:
+    """What one CLI entry point runs; every field maps to a stage option"""
+    year: int
+    month: Optional[int] = None
+    archive: bool = False
+    output_dir: Path = Path('.')
+    output_name: Optional[str] = None
+    sploitscan: bool = True
+    prioritizer: bool = True
+    sploitscan_path: str = '.'
+    prioritizer_path: str = '.'
+    sploitscan_workers: int = 3
+    sploitscan_delay: float = 2.0
+    prioritizer_batch: int = 50
+    prioritizer_delay: float = 3.0
+    enrich: str = 'tools'
+    checkpoint: Optional[Path] = None
+    master: Optional[Path] = None  # incremental: diff against and upsert into this CSV
+    versions: Optional[Path] = None  # record the output (or the master) as a delta version here
+    score: bool = False
+    score_table: Optional[Path] = None  # with score: dashboard table the run's scores are merged into
+    merge: bool = True
+    on_item: Optional[Callable[[str], None]] = None
+
+    @property
+    def suffix(self):
+        return f"{self.year}_bulletin" if self.archive else f"{self.year}{self.month:02d}"
+
+
+class PatchDayRun:
+    """Pipeline of one Patch Day (or yearly bulletin) and what it produced"""
+
+    def __init__(self, config: PatchDayConfig):
+        self.config = config
+        self.sap_df = pd.DataFrame()
+        self.cve_list: List[str] = []
+        self.result: Optional[pd.DataFrame] = None
+        self.output_file = ''
+        self.scores_file = ''
+        self.failed: Dict[str, List[str]] = {}
+        self.reused = pd.DataFrame()
+        self.enriched = pd.DataFrame()
+        self.incremental: Dict[str, int] = {}
+        self.version: Dict[str, object] = {}
+        Path(config.output_dir).mkdir(parents=True, exist_ok=True)
+        self.pipeline = Pipeline(self.stages(), checkpoint=Checkpoint(config.checkpoint)
+                                 if config.checkpoint else None)
+
+    def _progress(self, stage):
+        on_item = self.config.on_item
+        return (lambda item: on_item(stage)) if on_item else None
+
+    def stages(self):
+        c = self.config
+        stages = [
+            Stage('extract', lambda url: scrape_patch_day(url), fatal=True),
+            Stage('normalize', self.normalize, fan_out=True),
+        ]
+        if c.enrich == 'api':
+            stages.append(Stage('api', self.enrich_api, batch_size=API_BATCH_SIZE, fan_out=True,
+                                on_item=self._progress('api')))
+        elif c.enrich != 'tools':
+            raise ValueError(f"enrich must be one of {ENRICH_BACKENDS}: {c.enrich}")
+        if c.enrich == 'tools' and c.sploitscan:
+            config_file = find_config_file(c.sploitscan_path)
+            stages.append(Stage(
+                'sploitscan', lambda item: {**item, 'sploitscan': run_sploitscan(item['cve_id'], config_file)},
+                workers=c.sploitscan_workers, delay=c.sploitscan_delay,
+                key=lambda item: f"sploitscan:{item['cve_id']}",
+                cache_if=lambda r: r['sploitscan'] is not None,
+                on_item=self._progress('sploitscan')))
+        if c.enrich == 'tools' and c.prioritizer:
+            stages.append(Stage(
+                'prioritizer', self.prioritize, batch_size=c.prioritizer_batch, fan_out=True,
+                delay=c.prioritizer_delay, on_item=self._progress('prioritizer')))
+        if c.merge:
+            stages.append(Stage('merge', self.merge, gather=True, fatal=True))
+        stages.append(Stage('persist', self.persist, gather=not c.merge, fatal=True))
+        if c.merge and c.score:
+            # After persist: a scoring error only loses the score tables, not the CSV
+            stages.append(Stage('score', self.score))
+        return stages
+
+    def normalize(self, df):
+        self.sap_df, self.cve_list = extract_cve_ids(df)
+        logger.info(f"{len(self.sap_df)} rows, {len(self.cve_list)} CVEs")
+        if self.config.master is None:
+            return [{'cve_id': cve} for cve in self.cve_list]
+
+        from sap_cve_store import cve_store
+
+        rows = len(self.sap_df)
+        self.sap_df, self.reused, changed = diff_patch_day(self.sap_df, read_master(self.config.master), cve_store())
+        cves = self.sap_df['cve_id'].dropna().unique().tolist() if not self.sap_df.empty else []
+        self.incremental = {'rows': rows, 'reused': len(self.reused), 'enriched': len(self.sap_df),
+                            'cves': len(cves), 'changed': len(changed)}
+        logger.info(f"Incremental: {self.incremental}")
+        return [{'cve_id': cve} for cve in cves]
+
+    def prioritize(self, batch):
+        rows = {r['cve_id']: r for r in run_cve_prioritizer([i['cve_id'] for i in batch],
+                                                           self.config.prioritizer_path)}
+        return [{**item, 'prioritizer': rows.get(item['cve_id'])} for item in batch]
+
+    def enrich_api(self, batch):
+        """SploitScan-like records and CVE_Prioritizer-like rows from the APIs (sap_enrich),
+        reusing the checkpoint per CVE"""
+        from sap_cve_store import cve_store
+        from sap_enrich import enrich_cves
+
+        cp = self.pipeline.checkpoint
+        keys = {item['cve_id']: f"api:{item['cve_id']}" for item in batch}
+        cached = {cve: cp.get(key) for cve, key in keys.items() if cp is not None and key in cp}
+        fetched = enrich_cves([cve for cve in keys if cve not in cached], store=cve_store())
+        if cp is not None:
+            for cve, result in fetched.items():
+                cp.put(keys[cve], result)
+        results = {**fetched, **cached}
+        return [{**item, **results.get(item['cve_id'], {})} for item in batch]
+
+    def merge(self, items):
+        c = self.config
+        records = [i['sploitscan'] for i in items if i.get('sploitscan')]
+        prioritizer_rows = [i['prioritizer'] for i in items if i.get('prioritizer')]
+        api = c.enrich == 'api'
+        self.failed['sploitscan'] = [i['cve_id'] for i in items if (api or c.sploitscan) and not i.get('sploitscan')]
+        self.failed['prioritizer'] = [i['cve_id'] for i in items if (api or c.prioritizer) and not i.get('prioritizer')]
+
+        # Artefactos intermedios, como antes: JSON de SploitScan y CSV de CVE_Prioritizer
+        if records:
+            with open(Path(c.output_dir) / f"sploitscan_{c.suffix}.json", 'w', encoding='utf-8') as f:
+                json.dump(records, f, indent=4, ensure_ascii=False)
+        prioritizer_df = pd.DataFrame(prioritizer_rows)
+        if not prioritizer_df.empty:
+            prioritizer_df.to_csv(Path(c.output_dir) / f"prioritizer_{c.suffix}.csv", index=False)
+
+        self.result = self.enriched = merge_enrichment(self.sap_df, sploitscan_frame(records), prioritizer_df,
+                                                       c.year, c.archive)
+        if not self.reused.empty:
+            reused = self.reused.reindex(columns=self.result.columns)
+            self.result = reused if self.result.empty else pd.concat([self.result, reused], ignore_index=True)
+        return self.result
+
+    def score(self, output_file):
+        c = self.config
+        df = self.result
+        if df is None or df.empty or 'cvss' not in df.columns:
+            return output_file
+        scores_file = Path(c.output_dir) / f"rethink_scores_{c.suffix}.parquet"
+        scores, epss = build_score_table(df)
+        write_score_table(scores, epss, scores_file, sources=[self.output_name()])
+        self.scores_file = str(scores_file)
+        if c.score_table is not None:
+            update_score_table(scores, epss, c.score_table, sources=[self.output_name()])
+        return output_file
+
+    def output_name(self):
+        c = self.config
+        return str(Path(c.output_dir) / f"{c.output_name or f'sap_cve_{c.suffix}'}.csv")
+
+    def persist(self, df):
+        if isinstance(df, list):  # without merge: the raw SAP rows
+            df = self.result = self.sap_df
+        if df.empty:
+            return ''
+        df.to_csv(self.output_name(), index=False)
+        self.output_file = self.output_name()
+        if self.config.master is not None and not self.enriched.empty:
+            self.incremental.update(upsert_master(self.config.master, self.enriched))
+        if self.config.versions is not None:
+            from sap_versions import VersionStore
+
+            dataset = self.config.master if self.config.master is not None else self.output_file
+            self.version = VersionStore(self.config.versions).record_csv(dataset, label=f"sap_cve_{self.config.suffix}")
+        return self.output_file
+
+    def run(self):
+        """Runs every stage; the DataFrame is in .result and the CSV path in .output_file"""
+        url = patch_day_url(self.config.year, self.config.month, self.config.archive)
+        self.pipeline.run([url])
+        return self.result
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+SAP Pipeline Engine
+Staged pipeline (extract -> normalize -> enrich -> merge -> score -> persist) shared by the
+CLI scripts: every stage runs on its own worker threads and hands items to the next one
+through a bounded queue, so a slow stage (SploitScan) applies backpressure instead of
+buffering the whole run. Standard library only, so sap_cve_updater can use it as is.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 32  # items waiting between two stages
+CHECKPOINT_INTERVAL = 20  # checkpoint saved every N new results
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """One pipeline step
+
+    Args:
+        name: label for logs and stats
+        fn: item -> result; None drops the item
+        workers: threads running fn concurrently
+        batch_size: fn receives lists of up to batch_size items
+        gather: fn receives the list of every upstream item once, after upstream finishes
+        fan_out: the result is an iterable of items for the next stage
+        delay: seconds each worker waits after a call (rate limit of external tools)
+        key: item -> checkpoint key; results of keyed items are reused from the checkpoint
+        cache_if: result -> bool, which results are checkpointed (default: not None)
+        fatal: an exception aborts the run instead of dropping the item
+        on_item: callback after each fn call (progress bars)
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    batch_size: Optional[int] = None
+    gather: bool = False
+    fan_out: bool = False
+    delay: float = 0.0
+    key: Optional[Callable[[Any], str]] = None
+    cache_if: Optional[Callable[[Any], bool]] = None
+    fatal: bool = False
+    on_item: Optional[Callable[[Any], None]] = None
+
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    cached: int = 0
+    failed: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+class Checkpoint:
+    """Results of keyed stages ({key: result}, JSON), reused by the next run
+
+    Unlike a list of processed IDs, a resumed run gets the results back and can still merge
+    them. Saved atomically every `interval` new results and at the end of the run.
+    """
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL, reset=False):
+        self.path = Path(path)
+        self.interval = interval
+        self.results = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        if not reset and self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.results = json.load(f).get('results', {})
+                logger.info(f"Checkpoint {self.path}: {len(self.results)} results")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Checkpoint {self.path} not loaded: {e}")
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def __len__(self):
+        return len(self.results)
+
+    def get(self, key):
+        return self.results[key]
+
+    def put(self, key, result):
+        with self._lock:
+            self.results[key] = result
+            self._pending += 1
+            due = self._pending >= self.interval
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            data = {'results': dict(self.results), 'timestamp': datetime.now().isoformat()}
+            self._pending = 0
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"Checkpoint {self.path} not saved: {e}")
+
+
+class Pipeline:
+    """Runs items through the stages; run() returns the outputs of the last stage
+
+    Stage order is kept, item order is not once a stage has several workers.
+    Failed items are logged, counted in stats[stage].failed and dropped.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = QUEUE_SIZE,
+                 checkpoint: Optional[Checkpoint] = None):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.checkpoint = checkpoint
+        self.stats = {s.name: StageStats() for s in stages}
+        self._error = None
+        self._abort = threading.Event()
+        self._stats_lock = threading.Lock()
+
+    def _workers(self, stage):
+        return 1 if stage.gather else max(1, stage.workers)
+
+    def _call(self, stage, item, stats):
+        cp = self.checkpoint
+        key = None
+        try:
+            key = stage.key(item) if stage.key is not None and not isinstance(item, list) else None
+            if key is not None and cp is not None and key in cp:
+                with self._stats_lock:
+                    stats.cached += 1
+                return cp.get(key)
+        except Exception as e:
+            return self._failed(stage, item, key, e, stats)
+
+        start = time.perf_counter()
+        try:
+            result = stage.fn(item)
+            if key is not None and cp is not None and (stage.cache_if or (lambda r: r is not None))(result):
+                cp.put(key, result)
+        except Exception as e:
+            return self._failed(stage, item, key, e, stats)
+        finally:
+            with self._stats_lock:
+                stats.seconds += time.perf_counter() - start
+                stats.processed += 1
+            if stage.on_item is not None:
+                stage.on_item(item)
+
+        if stage.delay:
+            time.sleep(stage.delay)
+        return result
+
+    def _failed(self, stage, item, key, error, stats):
+        """Logs and counts a failed item (a fatal stage aborts the run), the item is dropped"""
+        if stage.fatal:
+            self._error = self._error or error
+            self._abort.set()
+        logger.error(f"[{stage.name}] {key or type(item).__name__}: {error}", exc_info=stage.fatal)
+        with self._stats_lock:
+            stats.failed.append(str(key) if key is not None else repr(item)[:80])
+        return None
+
+    def _emit(self, stage, result, out):
+        if result is None:
+            return
+        for item in (result if stage.fan_out else (result,)):
+            while not self._abort.is_set():
+                try:
+                    out.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def _worker(self, stage, inq, out, stats):
+        batch, gathered = [], []
+        while True:
+            item = inq.get()
+            if item is _DONE:
+                break
+            if self._abort.is_set():
+                continue  # drain so upstream never blocks
+            if stage.gather:
+                gathered.append(item)
+            elif stage.batch_size:
+                batch.append(item)
+                if len(batch) >= stage.batch_size:
+                    self._emit(stage, self._call(stage, batch, stats), out)
+                    batch = []
+            else:
+                self._emit(stage, self._call(stage, item, stats), out)
+        if self._abort.is_set():
+            return
+        if stage.gather:
+            self._emit(stage, self._call(stage, gathered, stats), out)
+        elif batch:
+            self._emit(stage, self._call(stage, batch, stats), out)
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        sink = queue.Queue()
+        outputs = queues[1:] + [sink]
+        threads = []
+
+        for i, stage in enumerate(self.stages):
+            n = self._workers(stage)
+            next_workers = self._workers(self.stages[i + 1]) if i + 1 < len(self.stages) else 1
+            remaining = [n]
+            lock = threading.Lock()
+
+            def work(stage=stage, inq=queues[i], out=outputs[i], remaining=remaining, lock=lock,
+                     next_workers=next_workers, stats=self.stats[stage.name]):
+                try:
+                    self._worker(stage, inq, out, stats)
+                finally:
+                    with lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:  # the last worker of a stage closes the next one
+                        for _ in range(next_workers):
+                            out.put(_DONE)
+
+            for w in range(n):
+                t = threading.Thread(target=work, name=f"{stage.name}-{w}", daemon=True)
+                t.start()
+                threads.append(t)
+
+        first_workers = self._workers(self.stages[0])
+        for item in items:
+            if self._abort.is_set():
+                break
+            queues[0].put(item)
+        for _ in range(first_workers):
+            queues[0].put(_DONE)
+
+        for t in threads:
+            t.join()
+        if self.checkpoint is not None:
+            self.checkpoint.save()
+        if self._error is not None:
+            raise self._error
+
+        results = []
+        while True:
+            item = sink.get()
+            if item is _DONE:
+                break
+            results.append(item)
+        return results
+
+    def report(self):
+        """One line per stage: processed, cached, failed, seconds"""
+        return [f"{name}: {s.processed} processed, {s.cached} cached, {len(s.failed)} failed, {s.seconds:.1f}s"
+                for name, s in self.stats.items()]
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+SAP Rethink Scoring
+Rethink Priority Score (data/model.md) shared by the dashboard and the CLI pipeline
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from sap_cwe import cwe_rank_index, normalize_cwe_ids
+from sap_epss import EPSSMatrix, epss_store
+from sap_kev import kev_lookup
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+SCORE_TABLE_FILE = DATA_DIR / 'rethink_scores.parquet'
+SCORE_TABLE_VERSION = 3
+
+EPSS_API = 'https://api.first.org/data/v1/epss'
+EPSS_WORKERS = 8
+EPSS_DAYS = 30
+
+SCORE_COLUMNS = ['epss_trend', 'epss_avg', 'epss_slope', 'kev_score', 'cvss_score',
+                 'epss_score', 'cwe_score', 'priority_score', 'composite_score']
+
+
+def fetch_epss_history(cve):
+    """EPSS time-series (last 30 days, oldest first) in % for one CVE"""
+    r = httpx.get(f'{EPSS_API}?cve={cve}&scope=time-series', timeout=30)
+    data = r.json()['data']
+    if not data:
+        return []
+    return [float(l['epss'])*100 for l in reversed(data[0]['time-series'])]
+
+
+def fetch_epss_histories(cves, workers=EPSS_WORKERS):
+    """EPSS time-series for many CVEs, fetched concurrently; failures give []"""
+    def _fetch(cve):
+        try:
+            return fetch_epss_history(cve)
+        except Exception:
+            return []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(cves, executor.map(_fetch, cves)))
+
+
+def load_epss_matrix(cves, workers=EPSS_WORKERS, days=EPSS_DAYS):
+    """EPSSMatrix of many CVEs: one slice of the local EPSS store (sap_epss.py) when it is
+    current, else the API per CVE"""
+    store = epss_store()
+    if store.is_current():
+        return store.matrix(cves, days)
+    cves = list(dict.fromkeys(cves))
+    return EPSSMatrix.from_histories(cves, fetch_epss_histories(cves, workers), days)
+
+
+def load_cwe_top25(edition=None):
+    """CWE IDs of one CWE Top 25 edition (default: latest)"""
+    return cwe_rank_index().members(edition)
+
+
+def cwe_top25_ranks(cwe_ids, years=None):
+    """CWE Top 25 rank of each CWE ID in the edition in force for its year (NaN if not listed)"""
+    return cwe_rank_index().ranks(cwe_ids, years)
+
+
+def cwe_rank_scores(ranks):
+    """Rank-weighted CWE Top 25 component: 1 for rank 1 down to 0.04 for rank 25, 0 if not listed"""
+    return np.nan_to_num((26 - np.asarray(ranks, dtype=float)) / 25)
+
+
+def kev_flags(values):
+    """Boolean KEV flags from the mixed True/'Yes'/NaN values found in the CSVs"""
+    return values.map(lambda v: str(v).strip().lower() in ('true', 'yes', '1'))
+
+
+def select_top_priority(xdf):
+    """Rows considered by Rethink: SploitScan A+, CVE_Prioritizer 1+ or CVSS > 7.5"""
+    #sap_cve_top = xdf[(xdf['priority_l'].isin(['A+', 'B'])) | (xdf['priority'] == 'Priority 1+')]
+    return xdf[(xdf['priority_l'].isin(['A+'])) |
+               (xdf['priority'] == 'Priority 1+') |
+               (xdf['cvss'] > 7.5)]
+
+
+# Function to calculate EPSS trend
+def calculate_epss_trend(epss_values, up_threshold=1.01, down_threshold=0.99):
+    if len(epss_values) < 2:
+        return 'stable'
+    first_val, last_val = epss_values[0], epss_values[-1]
+    if last_val > first_val * up_threshold:
+        return 'up'
+    elif last_val < first_val * down_threshold:
+        return 'down'
+    return 'stable'
+
+
+# ==================== WEIGHT PROFILES ====================
+
+# Order of the component matrix columns: composite_score = component_matrix(ydf) @ weight_vector(weights)
+WEIGHT_NAMES = ['kev_weight', 'cvss_multiplier', 'epss_up_multiplier', 'epss_stable_multiplier',
+                'epss_down_multiplier', 'cwe_weight', 'priority_weight', 'cwe_rank_weight']
+
+WEIGHT_PROFILES = {
+    # data/model.md
+    'Rethink': dict(kev_weight=3, cvss_multiplier=2, epss_up_multiplier=3, epss_stable_multiplier=2,
+                    epss_down_multiplier=1, cwe_weight=1.5, priority_weight=1, cwe_rank_weight=0),
+    # Exploitation evidence first: KEV and EPSS dominate CVSS
+    'Exploitation': dict(kev_weight=50, cvss_multiplier=1, epss_up_multiplier=4, epss_stable_multiplier=3,
+                         epss_down_multiplier=2, cwe_weight=1.5, priority_weight=1, cwe_rank_weight=0),
+    # Severity first: CVSS dominates, EPSS only breaks ties, higher-ranked Top 25 weaknesses count more
+    'Severity': dict(kev_weight=3, cvss_multiplier=10, epss_up_multiplier=0.5, epss_stable_multiplier=0.25,
+                     epss_down_multiplier=0.1, cwe_weight=1.5, priority_weight=1, cwe_rank_weight=1.5),
+}
+DEFAULT_PROFILE = 'Rethink'
+
+
+def weight_vector(weights):
+    """Weights dict -> vector in WEIGHT_NAMES order, missing weights from the default profile"""
+    weights = {**WEIGHT_PROFILES[DEFAULT_PROFILE], **weights}
+    return np.array([weights[name] for name in WEIGHT_NAMES], dtype=float)
+
+
+def component_matrix(ydf):
+    """Unweighted score components of each row (needs kev, cvss, cwe_t25, epss_avg, epss_trend;
+    cwe_rank is optional)"""
+    trend = ydf['epss_trend'].to_numpy()
+    epss_avg = ydf['epss_avg'].to_numpy(dtype=float)
+    cwe_rank = ydf['cwe_rank'] if 'cwe_rank' in ydf else np.full(len(ydf), np.nan)
+    return np.column_stack([
+        ydf['kev'].astype(bool).to_numpy(dtype=float),
+        ydf['cvss'].to_numpy(dtype=float),
+        epss_avg * (trend == 'up'),
+        epss_avg * (trend == 'stable'),
+        epss_avg * (trend == 'down'),
+        ydf['cwe_t25'].astype(bool).to_numpy(dtype=float),
+        np.ones(len(ydf)),
+        cwe_rank_scores(cwe_rank),
+    ])
+
+
+def rescore(ydf, weights, sort=True):
+    """Re-ranks already scored rows with other weights, without touching the EPSS series
+    (sort=False leaves the ranking to top_k)"""
+    components = component_matrix(ydf)
+    w = weight_vector(weights)
+    weighted = components * w
+    ydf = ydf.assign(
+        kev_score=weighted[:, 0],
+        cvss_score=weighted[:, 1],
+        epss_score=weighted[:, 2:5].sum(axis=1),
+        cwe_score=weighted[:, 5] + weighted[:, 7],
+        priority_score=weighted[:, 6],
+        composite_score=components @ w,
+    )
+    return ydf.sort_values(by='composite_score', ascending=False) if sort else ydf
+
+
+def top_k(ydf, k, keep_ties=True, by_cve=True):
+    """The k best scored CVEs (rows if by_cve=False), best first, without sorting the whole frame
+
+    keep_ties keeps every CVE tied with the k-th one, so the result can be longer than k.
+    With by_cve all the rows (SAP Notes) of a selected CVE stay together, in frame order.
+    """
+    keep = 'all' if keep_ties else 'first'
+    if not by_cve:
+        return ydf.nlargest(k, 'composite_score', keep=keep)
+
+    # The best row of each top CVE is among the m best rows once these hold k distinct CVEs
+    m = k
+    while True:
+        candidates = ydf.nlargest(m, 'composite_score', keep='all')
+        if m >= len(ydf) or candidates['cve_id'].nunique() >= k:
+            break
+        m *= 2
+    best = candidates.groupby('cve_id', sort=False, observed=True)['composite_score'].max().nlargest(k, keep=keep)
+    if len(best) < k:
+        # Unscored CVEs (no CVSS) go last, as in a full sort
+        rest = ydf.loc[~ydf['cve_id'].isin(best.index), 'cve_id'].unique()[:k - len(best)]
+        best = pd.concat([best, pd.Series(np.nan, index=rest)])
+    rank = pd.Series(np.arange(len(best)), index=best.index)
+    head = ydf[ydf['cve_id'].isin(best.index)]
+    return head.iloc[np.argsort(head['cve_id'].map(rank).to_numpy(), kind='stable')]
+
+
+def score_vulnerabilities(ydf, kev_weight=3, cvss_multiplier=2, epss_up_multiplier=3, epss_stable_multiplier=2, cwe_weight=1.5,
+                          epss_down_multiplier=1, priority_weight=1, epss=None):
+    """Adds the score columns to ydf (needs cve_id, kev, cvss, cwe_t25) and ranks it
+
+    EPSS trend, average and slope come from the EPSSMatrix `epss` (rows looked up by cve_id);
+    without it, from an epss_l_30 column of lists.
+    """
+    if epss is None:
+        epss = EPSSMatrix.from_histories(ydf['cve_id'], dict(zip(ydf['cve_id'], ydf['epss_l_30'])), EPSS_DAYS)
+    summary = epss.summary(ydf['cve_id'])
+    ydf = ydf.assign(epss_trend=summary['epss_trend'].to_numpy(), epss_avg=summary['epss_avg'].to_numpy(),
+                     epss_slope=summary['epss_slope'].to_numpy())
+    return rescore(ydf, dict(kev_weight=kev_weight, cvss_multiplier=cvss_multiplier,
+                             epss_up_multiplier=epss_up_multiplier, epss_stable_multiplier=epss_stable_multiplier,
+                             epss_down_multiplier=epss_down_multiplier, cwe_weight=cwe_weight,
+                             priority_weight=priority_weight))
+
+
+# ==================== SCORE TABLE ====================
+
+def build_score_table(df, cwe_top25=None, epss=None, workers=EPSS_WORKERS):
+    """Per-CVE Rethink score table for the top priority rows of a SAP CVE dataset, returns
+    (scores, EPSSMatrix of the scored CVEs)
+
+    Args:
+        df: dataset with the CSV columns (cve_id, cvss, kev, cweId, priority, priority_l)
+        cwe_top25: CWE IDs for cwe_t25, defaults to the CWE Top 25 edition in force for each
+            row's sap_note_year
+        epss: optional EPSSMatrix, defaults to load_epss_matrix
+        workers: concurrent EPSS requests
+    """
+    top = select_top_priority(df).drop_duplicates(subset=['cve_id'])
+    years = top['sap_note_year'] if 'sap_note_year' in top else None
+    top = top[['cve_id', 'cvss', 'kev', 'cweId']].copy()
+    top['kev'] = kev_flags(top['kev']) | kev_lookup().flags(top['cve_id'])
+    top['cweId'] = normalize_cwe_ids(top['cweId'], top['cve_id'])
+    top['cwe_rank'] = cwe_top25_ranks(top['cweId'], years)
+    top['cwe_t25'] = top['cwe_rank'].notna() if cwe_top25 is None else top['cweId'].isin(cwe_top25)
+
+    if epss is None:
+        epss = load_epss_matrix(top['cve_id'].tolist(), workers)
+
+    scored = score_vulnerabilities(top, epss=epss)
+    scores = scored[['cve_id', 'cvss', 'kev', 'cweId', 'cwe_t25', 'cwe_rank'] + SCORE_COLUMNS].reset_index(drop=True)
+    return scores, epss
+
+
+def write_score_table(scores, epss, path=SCORE_TABLE_FILE, sources=()):
+    """Writes the score table as Parquet, with version and build info in the schema metadata
+
+    The EPSS windows go in epss_l_30 as a fixed-size list<float32> column (null for days
+    without a score), and their date axis in the metadata.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    meta = {
+        'version': SCORE_TABLE_VERSION,
+        'built_at': datetime.now(timezone.utc).isoformat(),
+        'sources': [str(s) for s in sources],
+        'rows': len(scores),
+        'epss_dates': [str(d) for d in epss.dates],
+    }
+    table = pa.Table.from_pandas(scores, preserve_index=False)
+    flat = pa.array(epss.take(scores['cve_id']).ravel(), type=pa.float32(), from_pandas=True)
+    table = table.append_column('epss_l_30', pa.FixedSizeListArray.from_arrays(flat, epss.days))
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b'rethink': json.dumps(meta).encode()})
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, path)
+    return meta
+
+
+def update_score_table(scores, epss, path=SCORE_TABLE_FILE, sources=()):
+    """Merges scores into the table at path (written if missing or of another table version):
+    their CVEs replace the stored ones, the other stored CVEs are kept. The stored EPSS windows
+    are aligned by date on the window of the new ones (EPSSMatrix.concat): days before it
+    are dropped, days after the stored run are empty."""
+    stored, stored_epss, meta = read_score_table(path)
+    if stored is not None:
+        scores = pd.concat([scores, stored], ignore_index=True).drop_duplicates(subset=['cve_id'])
+        epss = EPSSMatrix.concat([epss, stored_epss])
+        sources = list(dict.fromkeys([str(s) for s in sources] + meta.get('sources', [])))
+    return write_score_table(scores.reset_index(drop=True), epss, path, sources)
+
+
+def read_score_table(path=SCORE_TABLE_FILE):
+    """Returns (scores, EPSSMatrix, meta), or (None, None, meta) if missing or built by another
+    table version"""
+    import pyarrow.parquet as pq
+
+    if not Path(path).exists():
+        return None, None, None
+    table = pq.read_table(path)
+    meta = json.loads((table.schema.metadata or {}).get(b'rethink', b'{}'))
+    if meta.get('version') != SCORE_TABLE_VERSION:
+        return None, None, meta
+    series = table.column('epss_l_30').combine_chunks()
+    values = series.flatten().to_numpy(zero_copy_only=False).astype(np.float32)
+    scores = table.drop_columns(['epss_l_30']).to_pandas()
+    dates = np.array(meta['epss_dates'], dtype='datetime64[D]')
+    epss = EPSSMatrix(scores['cve_id'].to_numpy(dtype=object), dates, values.reshape(len(scores), len(dates)))
+    return scores, epss, meta
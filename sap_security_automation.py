@@ -25,25 +25,14 @@ Enfoque en hacer funcionar SploitScan correctamente
 """
 
 import pandas as pd
-import numpy as np
-import re
-import json
 import subprocess
-import os
-import sys
-import time
-from pathlib import Path
 from datetime import datetime
-from typing import Optional, List
 import typer
 from rich.console import Console
-from rich.table import Table
-from rich.panel import Panel
-import requests
-from bs4 import BeautifulSoup
+from rich.progress import Progress
 import logging
-import glob
-import shutil
+
+from sap_patchday import PatchDayConfig, PatchDayRun, patch_day_url
 
 # Configurar Rich Console
 console = Console()
@@ -55,366 +44,28 @@ logger = logging.getLogger(__name__)
 # Crear la app Typer
 app = typer.Typer(help="🔒 SAP CVE Automation Tool")
 
-class SAPCVEAutomation:
-    def __init__(self):
-        self.months = {
-            1: 'january', 2: 'february', 3: 'march', 4: 'april',
-            5: 'may', 6: 'june', 7: 'july', 8: 'august',
-            9: 'september', 10: 'october', 11: 'november', 12: 'december'
-        }
-        self.output_dir = Path(f"sap_cve_analysis_{datetime.now().strftime('%Y%m%d')}")
-        self.output_dir.mkdir(exist_ok=True)
-
-    def extract_sap_data(self, year: int, month: int) -> pd.DataFrame:
-        """Extrae y parsea todas las tablas SAP con BeautifulSoup"""
-        month_name = self.months.get(month, '')
-        url = f"https://support.sap.com/en/my-support/knowledge-base/security-notes-news/{month_name}-{year}.html"
-
-        console.print(f"📡 Extrayendo datos de SAP: {month_name.title()} {year}")
-        console.print(f"🌐 URL: {url}")
-
-        resp = requests.get(url, timeout=30)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
-
-        tables = soup.find_all("table")
-        console.print(f"📊 Encontradas {len(tables)} tablas en la página")
-
-        all_rows = []
-        for idx, tbl in enumerate(tables, start=1):
-            for tr in tbl.find_all("tr"):
-                cells = [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"])]
-                if cells:
-                    all_rows.append(cells)
-
-        note_pattern = re.compile(r'[23]\d{6,7}')
-        cve_pattern = re.compile(r'CVE-\d{4}-\d{4,7}')
-
-        valid_rows = [
-            row for row in all_rows
-            if any(note_pattern.search(cell) or cve_pattern.search(cell) for cell in row)
-        ]
+def print_summary(df: pd.DataFrame) -> None:
+    """Imprime un resumen de los resultados"""
+    if df is None or df.empty:
+        return
 
-        df = pd.DataFrame(valid_rows)
-        console.print(f"✅ Filtradas {len(df)} filas válidas con Notas o CVEs")
-        return df
-    
-    def process_sap_data(self, df: pd.DataFrame) -> tuple:
-        """Procesa filas extraídas y normaliza CVEs"""
-        if df.empty:
-            return pd.DataFrame(), []
-
-        # Renombrar columnas genéricas
-        col_count = df.shape[1]
-        col_names = [f"Col{i}" for i in range(col_count)]
-        df.columns = col_names
-
-        # Buscar CVEs en cualquier columna
-        df["cve_id"] = df.apply(
-            lambda row: next(
-                (m.group(0) for cell in row.astype(str) if (m := re.search(r'CVE-\d{4}-\d{4,7}', cell))),
-                None
-            ),
-            axis=1
-        )
-
-        cves = df["cve_id"].dropna().unique().tolist()
-        console.print(f"✅ Procesados {len(df)} registros, encontrados {len(cves)} CVEs")
-
-        return df, cves
-    
-    def create_cve_strings(self, cve_list: List[str]) -> tuple:
-        """Crea strings de CVEs para las herramientas - igual que tu notebook"""
-        if not cve_list:
-            return "", ""
-        
-        # Para SploitScan (separado por espacios)
-        string_list = [str(element) for element in cve_list]
-        delimiter = " "
-        result_string_cve = delimiter.join(string_list)
-        
-        # Para CVE_Prioritizer (separado por comas)
-        prioritizer_string = ",".join(string_list)
-        
-        console.print(f"📝 Creados strings para herramientas:")
-        console.print(f"   • SploitScan: {len(cve_list)} CVEs separados por espacios")
-        console.print(f"   • CVE_Prioritizer: {len(cve_list)} CVEs separados por comas")
-        
-        return result_string_cve, prioritizer_string
-    
-    def run_sploitscan(self, cve_list: List[str], tool_path: str = ".") -> str:
-        """Ejecuta SploitScan en lotes para evitar timeouts y problemas de línea de comandos."""
-        console.print("🔍 Ejecutando SploitScan en lotes...")
-        console.print(f"CVEs a procesar: {len(cve_list)} CVEs")
-        
-        original_dir = os.getcwd()
-        all_sploitscan_results = []
-        CHUNK_SIZE = 10  # Procesar en lotes de 10 para evitar timeouts
-
-        try:
-            if tool_path != "." and os.path.exists(tool_path):
-                os.chdir(tool_path)
-                console.print(f"📁 Cambiado a directorio: {tool_path}")
-
-            for i in range(0, len(cve_list), CHUNK_SIZE):
-                chunk = cve_list[i:i + CHUNK_SIZE]
-                num_lote = (i // CHUNK_SIZE) + 1
-                total_lotes = (len(cve_list) + CHUNK_SIZE - 1) // CHUNK_SIZE
-                
-                console.print(f"\n🔄 Procesando lote {num_lote}/{total_lotes} ({len(chunk)} CVEs)...")
-                
-                cmd = ["sploitscan"] + chunk + ["-c", ".streamlit/config.json", "-m", "cisa,epss,prio,references", "-d", "-e", "json"]
-                
-                try:
-                    # Obtener la lista de archivos JSON antes de ejecutar
-                    files_before = set(glob.glob("*_export.json")) | set(glob.glob("*_and_*more_export.json"))
-
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=300) # Timeout de 5 mins por lote
-
-                    if result.returncode != 0:
-                        console.print(f"   STDERR: {result.stderr.strip()[:200]}...")
-                        continue
-
-                    time.sleep(2) # Esperar que se escriba el archivo
-                    
-                    # Encontrar el nuevo archivo generado
-                    files_after = set(glob.glob("*_export.json")) | set(glob.glob("*_and_*more_export.json"))
-                    new_files = files_after - files_before
-
-                    if not new_files:
-                        console.print(f"⚠️ No se encontró el archivo JSON para el lote {num_lote}.")
-                        # Fallback al método de archivo más reciente si no se encuentra uno nuevo
-                        all_files = list(files_after)
-                        if not all_files: continue
-                        generated_file = max(all_files, key=os.path.getmtime)
-                    else:
-                        generated_file = new_files.pop()
-
-                    console.print(f"✅ Lote {num_lote} procesado. Archivo: '{generated_file}'")
-
-                    with open(generated_file, 'r') as f:
-                        data = json.load(f)
-                        all_sploitscan_results.extend(data)
-                    
-                    os.remove(generated_file)
-                    console.print(f"   -> Archivo temporal procesado y eliminado.")
-
-                except subprocess.TimeoutExpired:
-                    console.print(f"⏰ Timeout en lote {num_lote}. Saltando al siguiente.")
-                except FileNotFoundError:
-                    console.print("❌ Comando 'sploitscan' no encontrado. Abortando ejecución de SploitScan.")
-                    return ""
-                except Exception as e:
-                    console.print(f"❌ Error inesperado en lote {num_lote}: {e}")
-
-            if not all_sploitscan_results:
-                console.print("❌ No se generaron resultados de SploitScan.")
-                return ""
-
-            # Guardar el resultado consolidado
-            merged_filename = f"sploitscan_consolidated_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
-            with open(merged_filename, 'w') as f:
-                json.dump(all_sploitscan_results, f, indent=4)
-            
-            console.print(f"\n✅ SploitScan completado. Resultados guardados en: {merged_filename}")
-            return merged_filename
+    console.print("\n" + "="*60)
+    console.print("📊 RESUMEN DEL ANÁLISIS")
+    console.print("="*60)
 
-        except Exception as e:
-            console.print(f"❌ Error general en la ejecución de SploitScan: {e}")
-            return ""
-        finally:
-            os.chdir(original_dir)
-    
-    def run_cve_prioritizer(self, cve_string: str, output_file: str, tool_path: str = ".") -> bool:
-        """Ejecuta CVE_Prioritizer - SIMPLIFICADO, solo primera opción"""
-        console.print("📊 Ejecutando CVE_Prioritizer...")
-        console.print(f"CVEs a procesar: {cve_string[:100]}...")
-        
-        original_dir = os.getcwd()
-        
-        try:
-            if tool_path != "." and os.path.exists(tool_path):
-                os.chdir(tool_path)
-                console.print(f"📁 Cambiado a directorio: {tool_path}")
-            
-            # SOLO ejecutar la primera opción: comando cve_prioritizer global
-            cmd = ["cve_prioritizer", "-l", cve_string, "-vck", "-vc", "-v", "-o", output_file]
-            
-            console.print(f"🔄 Ejecutando: {' '.join(cmd)}")
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-            
-            console.print(f"📊 Return code: {result.returncode}")
-            
-            if result.stdout:
-                console.print(f"📄 STDOUT:\n{result.stdout}")
-            
-            if result.stderr:
-                console.print(f"⚠️ STDERR:\n{result.stderr}")
-            
-            if result.returncode == 0 and os.path.exists(output_file):
-                console.print(f"✅ CVE_Prioritizer completado: {output_file}")
-                return True
-            else:
-                console.print("❌ CVE_Prioritizer falló")
-                return False
-            
-        except subprocess.TimeoutExpired:
-            console.print("⏰ Timeout en CVE_Prioritizer (600 segundos)")
-            return False
-        except FileNotFoundError:
-            console.print("❌ Comando 'cve_prioritizer' no encontrado")
-            console.print("💡 Verificar que CVE_Prioritizer esté instalado globalmente")
-            return False
-        except Exception as e:
-            console.print(f"❌ Error ejecutando CVE_Prioritizer: {str(e)}")
-            return False
-            
-        finally:
-            os.chdir(original_dir)
-    
-    def dataframeSplotscan(self, file_json: str) -> pd.DataFrame:
-        """Procesa SploitScan - EXACTAMENTE igual que tu notebook"""
-        try:
-            if not os.path.exists(file_json):
-                console.print(f"❌ Archivo no encontrado: {file_json}")
-                return pd.DataFrame()
-            
-            console.print("🔄 Procesando resultados de SploitScan...")
-            
-            data = pd.DataFrame(columns=['cve_id', 'dateUpdated', 'descriptions', 'product_l', 'epss_l', 'percentile', 'priority_l', 'cweId'])
-            dict_list = []
-            sap_sp = pd.read_json(file_json, typ='series')
-            
-            for i in sap_sp:
-                if 'problemTypes' in i['CVE Data']['containers']['cna'].keys():            
-                    if 'cweId' in i['CVE Data']['containers']['cna']['problemTypes'][0]['descriptions'][0].keys():
-                        cweId = i['CVE Data']['containers']['cna']['problemTypes'][0]['descriptions'][0]['cweId']
-                    else:
-                        cweId = i['CVE Data']['containers']['cna']['problemTypes'][0]['descriptions'][0]['description']
-                else:
-                    cweId = None
-                    
-                if len(i['EPSS Data']['data']) == 1:
-                    epss_l = i['EPSS Data']['data'][0]['epss']
-                    percentile = i['EPSS Data']['data'][0]['percentile']
-                else:
-                    epss_l = None
-                    percentile = None
-                    
-                if 'datePublished' in i['CVE Data']['cveMetadata']:
-                    datePublished = i['CVE Data']['cveMetadata']['datePublished']
-                else:
-                    datePublished = None
-                    
-                if 'references' in i['CVE Data']['containers']['cna'].keys():            
-                    note_id = re.findall('[2,3]{1}[0-9]{6}', str(i['CVE Data']['containers']['cna']['references'][0]['url']))
-                else:
-                    note_id = None
-                    
-                row_list = {
-                    'cve_id': i['CVE Data']['cveMetadata']['cveId'],
-                    'datePublished': datePublished,
-                    'dateUpdated': i['CVE Data']['cveMetadata']['dateUpdated'],
-                    'descriptions': i['CVE Data']['containers']['cna']['descriptions'][0]['value'],
-                    'product_l': i['CVE Data']['containers']['cna']['affected'][0]['product'],
-                    'epss_l': epss_l,
-                    'percentile': percentile,
-                    'priority_l': i['Priority']['Priority'],
-                    'cweId': cweId,
-                    'note_id': str(note_id)
-                }
-                dict_list.append(row_list)
+    total_records = len(df)
+    total_cves = len(df[df['cve_id'].notna()])
 
-            data = pd.DataFrame.from_dict(dict_list)
-            data.drop_duplicates(subset=['cve_id'], inplace=True)
-            
-            console.print(f"✅ Procesados {len(data)} registros de SploitScan")
-            return data
-            
-        except Exception as e:
-            console.print(f"❌ Error procesando SploitScan: {str(e)}")
-            return pd.DataFrame()
-    
-    def merge_results(self, sap_df: pd.DataFrame, sploitscan_df: pd.DataFrame, 
-                     prioritizer_file: str, year: int) -> pd.DataFrame:
-        """Combina todos los resultados - igual que tu notebook"""
-        console.print("🔗 Combinando resultados...")
-        
-        try:
-            # Empezar con los datos SAP procesados (que ya tienen cve_id)
-            result_df = sap_df.copy()
-            
-            # Merge con SploitScan
-            if not sploitscan_df.empty:
-                result_df = result_df.merge(sploitscan_df, on=['cve_id'], how='left')
-                console.print(f"✅ Datos de SploitScan combinados")
-            
-            # Merge con CVE_Prioritizer
-            if os.path.exists(prioritizer_file):
-                cp_df = pd.read_csv(prioritizer_file)
-                cp_df.drop_duplicates(subset=['cve_id'], inplace=True)
-                result_df = result_df.merge(cp_df, on=['cve_id'], how='left')
-                console.print(f"✅ Datos de CVE_Prioritizer combinados")
-            
-            # Añadir año igual que en tu notebook
-            result_df['sap_note_year'] = str(year)
+    console.print(f"📋 Total de registros: {total_records}")
+    console.print(f"🔍 CVE-IDs encontrados: {total_cves}")
 
-            # Renombrar columnas
-            result_df.rename(columns={'Col0': 'Note#', 'Col1': 'Title', 'Col2': 'Priority', 'Col3': 'CVSS'}, inplace=True)
-            
-            # Orden final de columnas
-            final_cols = ['cve_id', 'datePublished', 'dateUpdated',
-                          'descriptions', 'product_l', 'epss_l', 'percentile', 'priority_l', 'cweId', 
-                          'note_id', 'Note#', 'Title', 'Priority', 'CVSS', 'priority', 'epss', 'cvss', 'cvss_version',
-                          'cvss_severity', 'kev', 'ransomware', 'kev_source', 'cpe', 'vendor',
-                          'product', 'vector', 'sap_note_year']
-            
-            # Filtrar columnas existentes en el dataframe para evitar errores
-            existing_cols = [col for col in final_cols if col in result_df.columns]
-            result_df = result_df[existing_cols]
-            
-            console.print(f"✅ Combinación completada. Total registros: {len(result_df)}")
-            return result_df
-            
-        except Exception as e:
-            console.print(f"❌ Error combinando resultados: {str(e)}")
-            return sap_df
-    
-    def save_results(self, df: pd.DataFrame, filename: str) -> str:
-        """Guarda los resultados finales"""
-        output_file = self.output_dir / f"{filename}.csv"
-        
-        try:
-            df.to_csv(output_file, index=False)
-            console.print(f"💾 Resultados guardados en: {output_file}")
-            return str(output_file)
-        except Exception as e:
-            console.print(f"❌ Error guardando resultados: {str(e)}")
-            return ""
-    
-    def print_summary(self, df: pd.DataFrame) -> None:
-        """Imprime un resumen de los resultados"""
-        if df.empty:
-            return
-        
-        console.print("\n" + "="*60)
-        console.print("📊 RESUMEN DEL ANÁLISIS")
-        console.print("="*60)
-        
-        total_records = len(df)
-        total_cves = len(df[df['cve_id'].notna()])
-        
-        console.print(f"📋 Total de registros: {total_records}")
-        console.print(f"🔍 CVE-IDs encontrados: {total_cves}")
-        
-        # Distribución por prioridad
-        if 'Priority' in df.columns:
-            console.print(f"\n📊 Distribución por prioridad:")
-            priority_counts = df['Priority'].value_counts()
-            for priority, count in priority_counts.items():
-                percentage = (count/total_records)*100
-                console.print(f"   • {priority}: {count} ({percentage:.1f}%)")
+    # Distribución por prioridad
+    if 'Priority' in df.columns:
+        console.print(f"\n📊 Distribución por prioridad:")
+        priority_counts = df['Priority'].value_counts()
+        for priority, count in priority_counts.items():
+            percentage = (count/total_records)*100
+            console.print(f"   • {priority}: {count} ({percentage:.1f}%)")
 
 @app.command()
 def analyze(
@@ -424,6 +75,7 @@ def analyze(
     skip_prioritizer: bool = typer.Option(False, "--skip-prioritizer", help="Saltar CVE_Prioritizer"),
     sploitscan_path: str = typer.Option(".", help="Ruta donde ejecutar SploitScan"),
     prioritizer_path: str = typer.Option(".", help="Ruta donde ejecutar CVE_Prioritizer"),
+    workers: int = typer.Option(3, help="Procesos SploitScan en paralelo"),
     output_name: str = typer.Option(None, help="Nombre para archivo de salida")
 ):
     """🚀 Ejecuta el análisis completo de vulnerabilidades SAP"""
@@ -446,91 +98,36 @@ def analyze(
     console.print(f"🔍 SploitScan: {'❌ Saltado' if skip_sploitscan else '✅ Habilitado'}")
     console.print(f"📊 CVE_Prioritizer: {'❌ Saltado' if skip_prioritizer else '✅ Habilitado'}")
     console.print("="*60)
-    
-    automation = SAPCVEAutomation()
-    
-    # Paso 1: Extraer datos de SAP
-    console.print("\n1️⃣ EXTRAYENDO DATOS DE SAP")
-    console.print("-" * 40)
-    sap_data = automation.extract_sap_data(year, month)
-    
-    #if not sap_data:
-    #    console.print("❌ No se pudieron obtener datos de SAP. Abortando.")
-    #    raise typer.Exit(1)
-    
-    # Paso 2: Procesar datos
-    console.print("\n2️⃣ PROCESANDO DATOS SAP")
-    console.print("-" * 40)
-    sap_df, cve_list = automation.process_sap_data(sap_data)
-    
-    if not cve_list:
-        console.print("⚠️ No se encontraron CVE-IDs. Solo se guardarán datos SAP.")
-        skip_sploitscan = skip_prioritizer = True
-    else:
-        # No crear strings, usar directamente la lista
-        console.print(f"📝 {len(cve_list)} CVEs listos para procesar")
-        prioritizer_string = ",".join(cve_list)
-    
-    # Paso 3: Ejecutar SploitScan
-    sploitscan_df = pd.DataFrame()
-    if not skip_sploitscan and cve_list:
-        console.print("\n3️⃣ EJECUTANDO SPLOITSCAN")
-        console.print("-" * 40)
-        
-        sploitscan_file = automation.run_sploitscan(cve_list, sploitscan_path)
-        
-        if sploitscan_file:
-            # Copiar archivo al directorio de salida
-            sploitscan_source = os.path.join(sploitscan_path, sploitscan_file) if sploitscan_path != "." else sploitscan_file
-            sploitscan_dest = automation.output_dir / f"sploitscan_{year}{month:02d}.json"
-            
-            try:
-                shutil.copy(sploitscan_source, sploitscan_dest)
-                sploitscan_df = automation.dataframeSplotscan(str(sploitscan_dest))
-            except Exception as e:
-                console.print(f"❌ Error copiando archivo SploitScan: {e}")
-                sploitscan_df = automation.dataframeSplotscan(sploitscan_source)
-    
-    # Paso 4: Ejecutar CVE_Prioritizer
-    prioritizer_file = ""
-    if not skip_prioritizer and cve_list:
-        console.print("\n4️⃣ EJECUTANDO CVE_PRIORITIZER")
-        console.print("-" * 40)
-        
-        csv_file = f"prioritizer_{year}{month:02d}.csv"
-        
-        if automation.run_cve_prioritizer(prioritizer_string, csv_file, prioritizer_path):
-            # Copiar archivo al directorio de salida
-            prioritizer_source = os.path.join(prioritizer_path, csv_file) if prioritizer_path != "." else csv_file
-            prioritizer_dest = automation.output_dir / csv_file
-            
-            try:
-                shutil.copy(prioritizer_source, prioritizer_dest)
-                prioritizer_file = str(prioritizer_dest)
-            except Exception as e:
-                console.print(f"❌ Error copiando archivo CVE_Prioritizer: {e}")
-                if os.path.exists(prioritizer_source):
-                    prioritizer_file = prioritizer_source
-    
-    # Paso 5: Combinar resultados
-    console.print("\n5️⃣ COMBINANDO RESULTADOS")
-    console.print("-" * 40)
-    final_df = automation.merge_results(sap_df, sploitscan_df, prioritizer_file, year)
-    
-    # Paso 6: Guardar resultados
-    console.print("\n6️⃣ GUARDANDO RESULTADOS")
-    console.print("-" * 40)
-    if output_name is None:
-        output_name = f"sap_cve_{year}{month:02d}"
-    
-    output_file = automation.save_results(final_df, output_name)
-    
+    console.print(f"🌐 URL: {patch_day_url(year, month)}")
+
+    # Pipeline: extract -> normalize -> sploitscan -> prioritizer -> merge -> persist
+    output_dir = f"sap_cve_analysis_{datetime.now().strftime('%Y%m%d')}"
+    with Progress(console=console) as progress:
+        task = progress.add_task("CVEs", total=None)
+        config = PatchDayConfig(
+            year=year, month=month, output_dir=output_dir, output_name=output_name,
+            sploitscan=not skip_sploitscan, prioritizer=not skip_prioritizer,
+            sploitscan_path=sploitscan_path, prioritizer_path=prioritizer_path,
+            sploitscan_workers=workers, on_item=lambda stage: progress.advance(task))
+        run = PatchDayRun(config)
+        try:
+            final_df = run.run()
+        except Exception as e:
+            console.print(f"❌ Error: {e}")
+            raise typer.Exit(1)
+
+    for line in run.pipeline.report():
+        console.print(f"   • {line}")
+    for stage, cves in run.failed.items():
+        if cves:
+            console.print(f"⚠️ {stage}: {len(cves)} CVEs sin datos")
+
     # Mostrar resumen
-    automation.print_summary(final_df)
+    print_summary(final_df)
     
-    if output_file:
+    if run.output_file:
         console.print(f"\n✅ ANÁLISIS COMPLETADO EXITOSAMENTE!")
-        console.print(f"📁 Archivo de salida: {output_file}")
+        console.print(f"📁 Archivo de salida: {run.output_file}")
     else:
         console.print(f"\n⚠️ Análisis completado con advertencias")
 
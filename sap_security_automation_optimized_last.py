@@ -25,27 +25,20 @@ Mejoras en SploitScan y CVE_Prioritizer manteniendo funcionalidad original
 """
 
 import pandas as pd
-import re
-import json
 import subprocess
-import os
-import sys
-import time
-import glob
-import shutil
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
+from typing import List
 
 import typer
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
-import requests
-from bs4 import BeautifulSoup
 import logging
 
+from sap_patchday import ENRICH_BACKENDS, PatchDayConfig, PatchDayRun, patch_day_url
+from sap_scoring import SCORE_TABLE_FILE, DATA_DIR, build_score_table, write_score_table
+from sap_versions import VERSIONS_DIR
+
 # ==================== CONFIGURACIÓN ====================
 
 console = Console()
@@ -58,613 +51,46 @@ logger = logging.getLogger(__name__)
 app = typer.Typer(help="🔒 SAP CVE Automation Tool - Optimizado")
 
 # Parámetros de procesamiento
-BATCH_SIZE = 10
+PRIORITIZER_BATCH_SIZE = 50
 MAX_WORKERS = 3
 DELAY_BETWEEN_REQUESTS = 2
 DELAY_BETWEEN_BATCHES = 3
-CHECKPOINT_INTERVAL = 20
-
-# Thread safety
-write_lock = Lock()
-progress_lock = Lock()
 
 
 # ==================== CLASE PRINCIPAL ====================
 
 class SAPCVEAutomation:
-    """Automatización de análisis de CVEs SAP"""
+    """Automatización de análisis de CVEs SAP
+
+    Las etapas (extracción, SploitScan, CVE_Prioritizer, combinación) están en sap_patchday
+    y las ejecuta el motor de sap_pipeline; aquí quedan el score y el resumen.
+    """
     
     def __init__(self):
-        self.months = {
-            1: 'january', 2: 'february', 3: 'march', 4: 'april',
-            5: 'may', 6: 'june', 7: 'july', 8: 'august',
-            9: 'september', 10: 'october', 11: 'november', 12: 'december'
-        }
         self.output_dir = Path(f"sap_cve_analysis_{datetime.now().strftime('%Y%m%d')}")
         self.output_dir.mkdir(exist_ok=True)
-        
-        # Estado
         self.checkpoint_file = self.output_dir / "checkpoint.json"
-        self.processed_cves = set()
-        self.failed_cves = []
-        self.sploitscan_results = []
-    
-    # ==================== CHECKPOINT ====================
-    
-    def _load_checkpoint(self):
-        """Carga progreso previo"""
-        if self.checkpoint_file.exists():
-            try:
-                with open(self.checkpoint_file, 'r') as f:
-                    data = json.load(f)
-                    self.processed_cves = set(data.get('processed', []))
-                    self.failed_cves = data.get('failed', [])
-                    console.print(f"📋 Checkpoint: {len(self.processed_cves)} CVEs procesados")
-            except Exception as e:
-                console.print(f"⚠️ Error cargando checkpoint: {e}")
-    
-    def _save_checkpoint(self):
-        """Guarda progreso actual"""
-        try:
-            with open(self.checkpoint_file, 'w') as f:
-                json.dump({
-                    'processed': list(self.processed_cves),
-                    'failed': self.failed_cves,
-                    'timestamp': datetime.now().isoformat()
-                }, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error guardando checkpoint: {e}")
-    
-    # ==================== EXTRACCIÓN SAP ====================
-    
-    def extract_sap_data(self, year: int, month: Optional[int] = None, archive: bool = False) -> pd.DataFrame:
-        """Extrae datos de SAP Security Notes
-        
-        Args:
-            year: Año
-            month: Mes (1-12), no requerido si archive=True
-            archive: Si True, usa URL de bulletins para años terminados
-        """
-        if archive:
-            url = f"https://support.sap.com/en/my-support/knowledge-base/security-notes-news/bulletin-{year}.html"
-            console.print(f"🔡 Extrayendo archivo: {year}")
-        else:
-            month_name = self.months.get(month, '')
-            url = f"https://support.sap.com/en/my-support/knowledge-base/security-notes-news/{month_name}-{year}.html"
-            console.print(f"🔡 Extrayendo: {month_name.title()} {year}")
-        
-        console.print(f"🌐 URL: {url}")
-        
-        resp = requests.get(url, timeout=30)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
-        
-        tables = soup.find_all("table")
-        console.print(f"📊 Tablas encontradas: {len(tables)}")
-        
-        # Extraer filas
-        all_rows = []
-        for tbl in tables:
-            for tr in tbl.find_all("tr"):
-                cells = [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"])]
-                if cells:
-                    all_rows.append(cells)
-        
-        # Filtrar filas válidas
-        note_pattern = re.compile(r'[23]\d{6,7}')
-        cve_pattern = re.compile(r'CVE-\d{4}-\d{4,7}')
-        valid_rows = [
-            row for row in all_rows
-            if any(note_pattern.search(cell) or cve_pattern.search(cell) for cell in row)
-        ]
-        
-        df = pd.DataFrame(valid_rows)
-        console.print(f"✅ Filas válidas: {len(df)}")
-        return df
-    
-    def process_sap_data(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
-        """Procesa datos SAP y extrae CVEs"""
-        if df.empty:
-            return pd.DataFrame(), []
-        
-        # Renombrar columnas
-        col_names = [f"Col{i}" for i in range(df.shape[1])]
-        df.columns = col_names
-        
-        # Extraer CVE-IDs
-        df["cve_id"] = df.apply(
-            lambda row: next(
-                (m.group(0) for cell in row.astype(str) 
-                 if (m := re.search(r'CVE-\d{4}-\d{4,7}', cell))),
-                None
-            ),
-            axis=1
-        )
-        
-        cves = df["cve_id"].dropna().unique().tolist()
-        console.print(f"✅ CVEs encontrados: {len(cves)}")
-        
-        return df, cves
-    
-    # ==================== SPLOITSCAN OPTIMIZADO ====================
-    
-    def _run_sploitscan_single(self, cve_id: str, config_file: str) -> Optional[Dict]:
-        """
-        Ejecuta SploitScan para un CVE individual
-        Usa el método del script original que funciona
-        """
-        try:
-            # Obtener lista de archivos ANTES de ejecutar
-            files_before = set(glob.glob("*_export.json")) | set(glob.glob("*_and_*more_export.json"))
-            
-            # Comando igual al original
-            cmd = [
-                "sploitscan",
-                cve_id,
-                "-c", config_file,
-                "-m", "cisa,epss,prio,references",
-                "-d",
-                "-e", "json"
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=90)
-            
-            if result.returncode != 0:
-                logger.debug(f"SploitScan falló para {cve_id}")
-                return None
-            
-            # Esperar escritura del archivo
-            time.sleep(2)
-            
-            # Encontrar archivo nuevo
-            files_after = set(glob.glob("*_export.json")) | set(glob.glob("*_and_*more_export.json"))
-            new_files = files_after - files_before
-            
-            if not new_files:
-                # Fallback: archivo más reciente
-                all_files = list(files_after)
-                if not all_files:
-                    return None
-                generated_file = max(all_files, key=os.path.getmtime)
-            else:
-                generated_file = new_files.pop()
-            
-            # Leer y eliminar
-            with open(generated_file, 'r') as f:
-                data = json.load(f)
-            os.remove(generated_file)
-            
-            # Extraer primer resultado
-            if isinstance(data, list) and len(data) > 0:
-                return data[0]
-            return data if isinstance(data, dict) else None
-            
-        except subprocess.TimeoutExpired:
-            logger.warning(f"Timeout: {cve_id}")
-            return None
-        except Exception as e:
-            logger.error(f"Error {cve_id}: {e}")
-            return None
-    
-    def _process_cve_batch(self, cve_id: str, config_file: str) -> Dict[str, Any]:
-        """Procesa un CVE con metadata"""
-        try:
-            result = self._run_sploitscan_single(cve_id, config_file)
-            
-            if result:
-                with progress_lock:
-                    self.processed_cves.add(cve_id)
-                return {'success': True, 'cve_id': cve_id, 'data': result}
-            else:
-                with progress_lock:
-                    self.failed_cves.append(cve_id)
-                return {'success': False, 'cve_id': cve_id, 'data': None}
-                
-        except Exception as e:
-            logger.error(f"Batch error {cve_id}: {e}")
-            with progress_lock:
-                if cve_id not in self.failed_cves:
-                    self.failed_cves.append(cve_id)
-            return {'success': False, 'cve_id': cve_id, 'data': None}
-    
-    def run_sploitscan(
-        self,
-        cve_list: List[str],
-        tool_path: str = ".",
-        batch_size: int = BATCH_SIZE,
-        max_workers: int = MAX_WORKERS
-    ) -> str:
-        """
-        Ejecuta SploitScan optimizado con:
-        - Procesamiento paralelo
-        - Checkpoint
-        - Rate limiting
-        """
-        console.print(f"🔍 SploitScan Optimizado")
-        console.print(f"📊 CVEs totales: {len(cve_list)}")
-        console.print(f"⚙️ Config: {batch_size} CVEs/lote, {max_workers} workers")
-        
-        original_dir = os.getcwd()
-        self.sploitscan_results = []
-        
-        # Cargar checkpoint
-        self._load_checkpoint()
-        
-        # Filtrar procesados
-        pending_cves = [cve for cve in cve_list if cve not in self.processed_cves]
-        
-        if not pending_cves:
-            console.print("✅ Todos procesados previamente")
-            return self._consolidate_results()
-        
-        console.print(f"📋 Pendientes: {len(pending_cves)}/{len(cve_list)}")
-        
-        try:
-            # Cambiar directorio si es necesario
-            if tool_path != "." and os.path.exists(tool_path):
-                os.chdir(tool_path)
-            
-            # Buscar archivo de configuración
-            config_file = self._find_config_file()
-            console.print(f"🔧 Config: {config_file}")
-            
-            total_batches = (len(pending_cves) + batch_size - 1) // batch_size
-            
-            # Procesar con barra de progreso
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                BarColumn(),
-                TaskProgressColumn(),
-                console=console
-            ) as progress:
-                
-                task = progress.add_task("Procesando CVEs...", total=len(pending_cves))
-                
-                for i in range(0, len(pending_cves), batch_size):
-                    batch = pending_cves[i:i + batch_size]
-                    batch_num = (i // batch_size) + 1
-                    
-                    progress.update(task, description=f"Lote {batch_num}/{total_batches}")
-                    
-                    # Procesar lote en paralelo
-                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                        futures = {
-                            executor.submit(self._process_cve_batch, cve, config_file): cve
-                            for cve in batch
-                        }
-                        
-                        for future in as_completed(futures):
-                            try:
-                                result = future.result()
-                                if result['success'] and result['data']:
-                                    self.sploitscan_results.append(result['data'])
-                                progress.advance(task)
-                                time.sleep(max(0.5, DELAY_BETWEEN_REQUESTS / max_workers))
-                            except Exception as e:
-                                logger.error(f"Future error: {e}")
-                                progress.advance(task)
-                    
-                    # Checkpoint periódico
-                    if len(self.processed_cves) % CHECKPOINT_INTERVAL == 0:
-                        self._save_checkpoint()
-                    
-                    # Delay entre lotes
-                    if i + batch_size < len(pending_cves):
-                        time.sleep(DELAY_BETWEEN_BATCHES)
-            
-            # Checkpoint final
-            self._save_checkpoint()
-            
-            # Consolidar y reportar
-            return self._consolidate_and_report()
-            
-        except FileNotFoundError:
-            console.print("❌ 'sploitscan' no encontrado")
-            return ""
-        except Exception as e:
-            console.print(f"❌ Error general: {e}")
-            logger.error(f"Error en run_sploitscan: {e}", exc_info=True)
-            return ""
-        finally:
-            os.chdir(original_dir)
-    
-    def _find_config_file(self) -> str:
-        """Busca archivo de configuración en ubicaciones comunes"""
-        paths = [".streamlit/config.json", "config.json", "../config.json"]
-        for path in paths:
-            if os.path.exists(path):
-                return path
-        return "config.json"  # Default
-    
-    def _consolidate_results(self) -> str:
-        """Consolida resultados existentes"""
-        if not self.sploitscan_results:
-            return ""
-        
-        filename = f"sploitscan_consolidated_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.sploitscan_results, f, indent=4, ensure_ascii=False)
-            return filename
-        except Exception as e:
-            logger.error(f"Error consolidando: {e}")
-            return ""
-    
-    def _consolidate_and_report(self) -> str:
-        """Consolida resultados y muestra reporte"""
-        if not self.sploitscan_results:
-            console.print("❌ Sin resultados")
-            return ""
-        
-        filename = self._consolidate_results()
-        if not filename:
-            return ""
-        
-        # Reporte
-        console.print(f"\n📊 Resumen SploitScan:")
-        console.print(f"   ✅ Exitosos: {len(self.sploitscan_results)}")
-        console.print(f"   ❌ Fallidos: {len(self.failed_cves)}")
-        console.print(f"   📁 Archivo: {filename}")
-        
-        if self.failed_cves:
-            console.print(f"\n⚠️ CVEs fallidos ({len(self.failed_cves)}):")
-            for cve in self.failed_cves[:10]:
-                console.print(f"      • {cve}")
-            if len(self.failed_cves) > 10:
-                console.print(f"      ... y {len(self.failed_cves) - 10} más")
-        
-        return filename
-    
-    # ==================== CVE_PRIORITIZER OPTIMIZADO ====================
-    
-    def run_cve_prioritizer(
-        self,
-        cve_list: List[str],
-        output_file: str,
-        tool_path: str = ".",
-        batch_size: int = 50
-    ) -> bool:
-        """Ejecuta CVE_Prioritizer en lotes"""
-        console.print(f"📊 CVE_Prioritizer Optimizado")
-        console.print(f"📋 CVEs: {len(cve_list)}")
-        
-        original_dir = os.getcwd()
-        all_results = []
-        
-        try:
-            if tool_path != "." and os.path.exists(tool_path):
-                os.chdir(tool_path)
-            
-            total_batches = (len(cve_list) + batch_size - 1) // batch_size
-            
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                BarColumn(),
-                TaskProgressColumn(),
-                console=console
-            ) as progress:
-                
-                task = progress.add_task("Priorizando CVEs...", total=total_batches)
-                
-                for i in range(0, len(cve_list), batch_size):
-                    batch = cve_list[i:i + batch_size]
-                    batch_num = (i // batch_size) + 1
-                    
-                    progress.update(task, description=f"Lote {batch_num}/{total_batches}")
-                    
-                    # Procesar lote
-                    temp_file = f"temp_prioritizer_{batch_num}.csv"
-                    if self._run_prioritizer_batch(batch, temp_file):
-                        try:
-                            df = pd.read_csv(temp_file)
-                            all_results.append(df)
-                            os.remove(temp_file)
-                        except Exception as e:
-                            logger.error(f"Error leyendo lote {batch_num}: {e}")
-                    
-                    progress.advance(task)
-                    time.sleep(DELAY_BETWEEN_BATCHES)
-            
-            # Combinar resultados
-            if all_results:
-                combined_df = pd.concat(all_results, ignore_index=True)
-                combined_df.drop_duplicates(subset=['cve_id'], inplace=True)
-                combined_df.to_csv(output_file, index=False)
-                
-                console.print(f"✅ CVE_Prioritizer: {output_file}")
-                console.print(f"   📊 CVEs procesados: {len(combined_df)}")
-                return True
-            else:
-                console.print("❌ Sin resultados")
-                return False
-                
-        except FileNotFoundError:
-            console.print("❌ 'cve_prioritizer' no encontrado")
-            return False
-        except Exception as e:
-            console.print(f"❌ Error: {e}")
-            logger.error(f"Error en CVE_Prioritizer: {e}", exc_info=True)
-            return False
-        finally:
-            os.chdir(original_dir)
-    
-    def _run_prioritizer_batch(self, cve_batch: List[str], output_file: str) -> bool:
-        """Ejecuta CVE_Prioritizer para un lote"""
-        try:
-            cve_string = ",".join(cve_batch)
-            cmd = [
-                "cve_prioritizer",
-                "-l", cve_string,
-                "-vck", "-vc", "-v",
-                "-o", output_file
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-            return result.returncode == 0 and os.path.exists(output_file)
-            
-        except subprocess.TimeoutExpired:
-            logger.warning("Timeout en lote CVE_Prioritizer")
-            return False
-        except Exception as e:
-            logger.error(f"Error en lote: {e}")
-            return False
     
-    # ==================== PROCESAMIENTO DE RESULTADOS ====================
+    # ==================== RETHINK SCORING ====================
     
-    def dataframeSplotscan(self, file_json: str) -> pd.DataFrame:
-        """Procesa JSON de SploitScan - EXACTO AL ORIGINAL"""
+    def build_rethink_scores(self, df: pd.DataFrame, output_file, sources: List[str] = ()) -> str:
+        """Calcula el Rethink Priority Score por CVE (EPSS 30 días, tendencia y componentes)
+        y lo guarda como artefacto Parquet versionado para el dashboard"""
+        console.print("🧮 Calculando Rethink Priority Score...")
         try:
-            if not os.path.exists(file_json):
-                console.print(f"❌ Archivo no encontrado: {file_json}")
-                return pd.DataFrame()
-            
-            console.print("📄 Procesando resultados SploitScan...")
-            
-            dict_list = []
-            sap_sp = pd.read_json(file_json, typ='series')
-            
-            for i in sap_sp:
-                # CWE
-                if 'problemTypes' in i['CVE Data']['containers']['cna'].keys():
-                    if 'cweId' in i['CVE Data']['containers']['cna']['problemTypes'][0]['descriptions'][0].keys():
-                        cweId = i['CVE Data']['containers']['cna']['problemTypes'][0]['descriptions'][0]['cweId']
-                    else:
-                        cweId = i['CVE Data']['containers']['cna']['problemTypes'][0]['descriptions'][0]['description']
-                else:
-                    cweId = None
-                
-                # EPSS
-                if len(i['EPSS Data']['data']) == 1:
-                    epss_l = i['EPSS Data']['data'][0]['epss']
-                    percentile = i['EPSS Data']['data'][0]['percentile']
-                else:
-                    epss_l = None
-                    percentile = None
-                
-                # Date Published
-                datePublished = i['CVE Data']['cveMetadata'].get('datePublished', None)
-                
-                # Note ID
-                if 'references' in i['CVE Data']['containers']['cna'].keys():
-                    note_id = re.findall('[2,3]{1}[0-9]{6}', str(i['CVE Data']['containers']['cna']['references'][0]['url']))
-                else:
-                    note_id = None
-                
-                row_list = {
-                    'cve_id': i['CVE Data']['cveMetadata']['cveId'],
-                    'datePublished': datePublished,
-                    'dateUpdated': i['CVE Data']['cveMetadata']['dateUpdated'],
-                    'descriptions': i['CVE Data']['containers']['cna']['descriptions'][0]['value'],
-                    'product_l': i['CVE Data']['containers']['cna']['affected'][0]['product'],
-                    'epss_l': epss_l,
-                    'percentile': percentile,
-                    'priority_l': i['Priority']['Priority'],
-                    'cweId': cweId,
-                    'note_id': str(note_id)
-                }
-                dict_list.append(row_list)
-            
-            data = pd.DataFrame.from_dict(dict_list)
-            data.drop_duplicates(subset=['cve_id'], inplace=True)
-            
-            console.print(f"✅ Registros procesados: {len(data)}")
-            return data
-            
-        except Exception as e:
-            console.print(f"❌ Error: {e}")
-            logger.error(f"Error en dataframeSplotscan: {e}", exc_info=True)
-            return pd.DataFrame()
-    
-    def merge_results(
-        self,
-        sap_df: pd.DataFrame,
-        sploitscan_df: pd.DataFrame,
-        prioritizer_file: str,
-        year: int,
-        archive: bool = False
-    ) -> pd.DataFrame:
-        """Combina todos los resultados
-        
-        Args:
-            sap_df: DataFrame de datos SAP
-            sploitscan_df: DataFrame de resultados SploitScan
-            prioritizer_file: Ruta del archivo de CVE_Prioritizer
-            year: Año del análisis
-            archive: Si True, asegura que todas las columnas esperadas estén presentes
-        """
-        console.print("🔗 Combinando resultados...")
-        
-        try:
-            result_df = sap_df.copy()
-            
-            # Merge SploitScan
-            if not sploitscan_df.empty:
-                result_df = result_df.merge(sploitscan_df, on=['cve_id'], how='left')
-                console.print("✅ SploitScan combinado")
-            
-            # Merge CVE_Prioritizer
-            if os.path.exists(prioritizer_file):
-                cp_df = pd.read_csv(prioritizer_file)
-                cp_df.drop_duplicates(subset=['cve_id'], inplace=True)
-                result_df = result_df.merge(cp_df, on=['cve_id'], how='left')
-                console.print("✅ CVE_Prioritizer combinado")
-            
-            # Añadir año
-            result_df['sap_note_year'] = str(year)
-            
-            # Renombrar columnas
-            result_df.rename(columns={
-                'Col0': 'Note#',
-                'Col1': 'Title',
-                'Col2': 'Priority',
-                'Col3': 'CVSS'
-            }, inplace=True)
-            
-            # Orden de columnas
-            final_cols = [
-                'cve_id', 'datePublished', 'dateUpdated', 'descriptions',
-                'product_l', 'epss_l', 'percentile', 'priority_l', 'cweId',
-                'note_id', 'Note#', 'Title', 'Priority', 'CVSS',
-                'priority', 'epss', 'cvss', 'cvss_version', 'cvss_severity',
-                'kev', 'ransomware', 'kev_source', 'cpe', 'vendor',
-                'product', 'vector', 'sap_note_year'
-            ]
-            
-            # En modo archive, asegurar que todas las columnas estén presentes
-            if archive:
-                for col in final_cols:
-                    if col not in result_df.columns:
-                        result_df[col] = None
-                result_df = result_df[final_cols]
-            else:
-                # Modo normal: solo incluir columnas existentes
-                existing_cols = [col for col in final_cols if col in result_df.columns]
-                result_df = result_df[existing_cols]
-            
-            console.print(f"✅ Total registros: {len(result_df)}")
-            return result_df
-            
-        except Exception as e:
-            console.print(f"❌ Error combinando: {e}")
-            logger.error(f"Error en merge: {e}", exc_info=True)
-            return sap_df
-    
-    def save_results(self, df: pd.DataFrame, filename: str) -> str:
-        """Guarda resultados finales"""
-        output_file = self.output_dir / f"{filename}.csv"
-        try:
-            df.to_csv(output_file, index=False)
+            scores, epss = build_score_table(df)
+            meta = write_score_table(scores, epss, output_file, sources=sources)
+            console.print(f"✅ Scores: {len(scores)} CVEs (tabla v{meta['version']})")
             console.print(f"💾 Guardado: {output_file}")
             return str(output_file)
         except Exception as e:
-            console.print(f"❌ Error guardando: {e}")
+            console.print(f"❌ Error calculando scores: {e}")
+            logger.error(f"Error en build_rethink_scores: {e}", exc_info=True)
             return ""
     
     def print_summary(self, df: pd.DataFrame):
         """Imprime resumen"""
-        if df.empty:
+        if df is None or df.empty:
             return
         
         console.print("\n" + "="*60)
@@ -696,8 +122,14 @@ def analyze(
     sploitscan_path: str = typer.Option(".", help="Path SploitScan"),
     prioritizer_path: str = typer.Option(".", help="Path CVE_Prioritizer"),
     output_name: str = typer.Option(None, help="Nombre salida"),
-    batch_size: int = typer.Option(BATCH_SIZE, help="Tamaño lote"),
-    max_workers: int = typer.Option(MAX_WORKERS, help="Workers concurrentes")
+    batch_size: int = typer.Option(PRIORITIZER_BATCH_SIZE, help="Tamaño lote CVE_Prioritizer"),
+    max_workers: int = typer.Option(MAX_WORKERS, help="Workers SploitScan concurrentes"),
+    score: bool = typer.Option(False, "--score", help="Calcular Rethink Priority Score del resultado"),
+    resume: bool = typer.Option(True, "--resume/--no-resume", help="Reusar resultados del checkpoint"),
+    enrich: str = typer.Option("tools", help="Enriquecimiento: tools (SploitScan + CVE_Prioritizer) o api (CVE/EPSS/NVD asyncio)"),
+    incremental: bool = typer.Option(False, "--incremental", help="Solo enriquecer notas nuevas o cambiadas y actualizar el CSV maestro"),
+    master: str = typer.Option(str(DATA_DIR / "sap_cve_all_2026.csv"), help="CSV maestro para --incremental"),
+    versions: bool = typer.Option(False, "--versions", help="Registrar la salida (o el maestro) como versión delta en data/sap_cve_versions")
 ):
     """🚀 Análisis completo SAP CVE (OPTIMIZADO)"""
     
@@ -707,7 +139,6 @@ def analyze(
     if archive:
         # Modo archivo: no se requiere mes
         month = None
-        file_suffix = f"{year}_bulletin"
         mode_label = f"📦 Bulletin {year}"
     else:
         # Modo normal: mes es requerido
@@ -715,100 +146,123 @@ def analyze(
         if not (1 <= month <= 12):
             console.print("❌ Mes debe ser 1-12")
             raise typer.Exit(1)
-        file_suffix = f"{year}{month:02d}"
         mode_label = f"📅 {month:02d}/{year}"
     
+    if enrich not in ENRICH_BACKENDS:
+        console.print(f"❌ --enrich debe ser: {', '.join(ENRICH_BACKENDS)}")
+        raise typer.Exit(1)
+    
     # Header
     console.print("="*60)
     console.print("🔒 SAP CVE AUTOMATION - OPTIMIZADO")
     console.print("="*60)
     console.print(f"{mode_label}")
-    console.print(f"🔍 SploitScan: {'❌ No' if skip_sploitscan else '✅ Sí'}")
-    console.print(f"📊 Prioritizer: {'❌ No' if skip_prioritizer else '✅ Sí'}")
-    console.print(f"⚙️ Lote: {batch_size} | Workers: {max_workers}")
+    if enrich == "api":
+        console.print(f"🌐 Enriquecimiento: APIs CVE / EPSS / NVD (asyncio) + KEV local")
+    else:
+        console.print(f"🔍 SploitScan: {'❌ No' if skip_sploitscan else '✅ Sí'}")
+        console.print(f"📊 Prioritizer: {'❌ No' if skip_prioritizer else '✅ Sí'}")
+        console.print(f"⚙️ Lote: {batch_size} | Workers: {max_workers}")
     if archive:
         console.print(f"📦 Modo: Archivo (Bulletin)")
+    if incremental:
+        console.print(f"♻️ Incremental: {master}")
     console.print("="*60)
+    console.print(f"🌐 URL: {patch_day_url(year, month, archive)}")
     
     automation = SAPCVEAutomation()
+    if not resume and automation.checkpoint_file.exists():
+        automation.checkpoint_file.unlink()
+    
+    # Pipeline: extract -> normalize -> sploitscan -> prioritizer -> merge -> score -> persist
+    # Cada etapa corre en sus propios hilos; los CVEs pasan a CVE_Prioritizer a medida que
+    # SploitScan los termina y los resultados quedan en el checkpoint para reanudar.
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        console=console
+    ) as progress:
+        tasks = {}
+
+        def advance(stage):
+            if stage not in tasks:
+                tasks[stage] = progress.add_task(stage, total=None)
+            progress.advance(tasks[stage])
+
+        run = PatchDayRun(PatchDayConfig(
+            year=year, month=month, archive=archive,
+            output_dir=automation.output_dir, output_name=output_name,
+            sploitscan=not skip_sploitscan, prioritizer=not skip_prioritizer,
+            sploitscan_path=sploitscan_path, prioritizer_path=prioritizer_path,
+            sploitscan_workers=max_workers, sploitscan_delay=DELAY_BETWEEN_REQUESTS,
+            prioritizer_batch=batch_size, prioritizer_delay=DELAY_BETWEEN_BATCHES,
+            checkpoint=automation.checkpoint_file, score=score, score_table=SCORE_TABLE_FILE, enrich=enrich,
+            master=Path(master) if incremental else None,
+            versions=VERSIONS_DIR if versions else None, on_item=advance))
+        try:
+            final_df = run.run()
+        except Exception as e:
+            console.print(f"❌ Error: {e}")
+            logger.error(f"Error en pipeline: {e}", exc_info=True)
+            raise typer.Exit(1)
     
-    # PASO 1: Extraer SAP
-    console.print("\n1️⃣ EXTRAYENDO DATOS SAP")
-    console.print("-" * 40)
-    sap_data = automation.extract_sap_data(year, month, archive)
-    
-    # PASO 2: Procesar
-    console.print("\n2️⃣ PROCESANDO DATOS")
-    console.print("-" * 40)
-    sap_df, cve_list = automation.process_sap_data(sap_data)
-    
-    if not cve_list:
-        console.print("⚠️ Sin CVEs - solo datos SAP")
-        skip_sploitscan = skip_prioritizer = True
-    
-    # PASO 3: SploitScan
-    sploitscan_df = pd.DataFrame()
-    if not skip_sploitscan and cve_list:
-        console.print("\n3️⃣ SPLOITSCAN")
-        console.print("-" * 40)
-        
-        sploitscan_file = automation.run_sploitscan(
-            cve_list,
-            sploitscan_path,
-            batch_size,
-            max_workers
-        )
-        
-        if sploitscan_file:
-            source = os.path.join(sploitscan_path, sploitscan_file) if sploitscan_path != "." else sploitscan_file
-            dest = automation.output_dir / f"sploitscan_{file_suffix}.json"
-            try:
-                shutil.copy(source, dest)
-                sploitscan_df = automation.dataframeSplotscan(str(dest))
-            except Exception as e:
-                console.print(f"⚠️ Error copiando: {e}")
-                if os.path.exists(source):
-                    sploitscan_df = automation.dataframeSplotscan(source)
-    
-    # PASO 4: CVE_Prioritizer
-    prioritizer_file = ""
-    if not skip_prioritizer and cve_list:
-        console.print("\n4️⃣ CVE_PRIORITIZER")
-        console.print("-" * 40)
-        
-        csv_file = f"prioritizer_{file_suffix}.csv"
-        if automation.run_cve_prioritizer(cve_list, csv_file, prioritizer_path):
-            source = os.path.join(prioritizer_path, csv_file) if prioritizer_path != "." else csv_file
-            dest = automation.output_dir / csv_file
-            try:
-                shutil.copy(source, dest)
-                prioritizer_file = str(dest)
-            except Exception as e:
-                console.print(f"⚠️ Error copiando: {e}")
-                if os.path.exists(source):
-                    prioritizer_file = source
-    
-    # PASO 5: Combinar
-    console.print("\n5️⃣ COMBINANDO")
-    console.print("-" * 40)
-    final_df = automation.merge_results(sap_df, sploitscan_df, prioritizer_file, year, archive)
-    
-    # PASO 6: Guardar
-    console.print("\n6️⃣ GUARDANDO")
-    console.print("-" * 40)
-    output_name = output_name or f"sap_cve_{file_suffix}"
-    output_file = automation.save_results(final_df, output_name)
+    # Etapas
+    console.print(f"\n⚙️ Etapas:")
+    for line in run.pipeline.report():
+        console.print(f"   • {line}")
+    for stage, failed in run.failed.items():
+        if failed:
+            console.print(f"\n⚠️ {stage}: CVEs sin datos ({len(failed)}):")
+            for cve in failed[:10]:
+                console.print(f"      • {cve}")
+            if len(failed) > 10:
+                console.print(f"      ... y {len(failed) - 10} más")
+    if run.incremental:
+        inc = run.incremental
+        console.print(f"\n♻️ Incremental: {inc['reused']} filas reutilizadas, {inc['enriched']} enriquecidas "
+                      f"({inc['cves']} CVEs, {inc['changed']} con registro cambiado)")
+        if 'master_rows' in inc:
+            console.print(f"   • Maestro: {inc['added']} nuevas, {inc['updated']} actualizadas, {inc['master_rows']} filas")
+    if run.version:
+        v = run.version
+        console.print(f"🗂️ Versión v{v['version']}: +{v['added']} ~{v['changed']} -{v['removed']} ({v['rows']} filas)")
+    if run.scores_file:
+        console.print(f"💾 Scores: {run.scores_file} (y {SCORE_TABLE_FILE} para el dashboard)")
     
     # Resumen
     automation.print_summary(final_df)
     
-    if output_file:
+    if run.output_file:
         console.print(f"\n✅ COMPLETADO")
-        console.print(f"📁 {output_file}")
+        console.print(f"📁 {run.output_file}")
     else:
         console.print(f"\n⚠️ Completado con advertencias")
 
 
+@app.command()
+def score(
+    input_files: List[str] = typer.Option(
+        [str(DATA_DIR / "sap_cve_2026.csv"), str(DATA_DIR / "sap_cve_all_2026.csv")],
+        "--input", help="CSVs maestros a puntuar"
+    ),
+    output: str = typer.Option(str(SCORE_TABLE_FILE), help="Tabla de scores (Parquet)")
+):
+    """🧮 Precalcula la tabla Rethink Priority Score para el dashboard"""
+    console.print("="*60)
+    console.print("🧮 RETHINK PRIORITY SCORE")
+    console.print("="*60)
+    
+    frames = [pd.read_csv(f) for f in input_files]
+    df = pd.concat(frames, ignore_index=True)
+    console.print(f"📋 Registros: {len(df)} ({len(input_files)} archivos)")
+    
+    automation = SAPCVEAutomation()
+    if not automation.build_rethink_scores(df, output, sources=input_files):
+        raise typer.Exit(1)
+
+
 @app.command()
 def test():
     """🧪 Test herramientas"""
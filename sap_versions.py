@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+SAP CVE Versions
+Versioned history of the SAP CVE dataset: each pipeline output is recorded as a keyed
+delta against the previous version, instead of another full CSV copy in data/, and any
+version can be materialized again (row for row, in the recorded order) or compared with
+another one. Rows are keyed as in the master store, by (Note#, cve_id, Title hash,
+occurrence), so re-published notes and repeated rows are versioned like any other row.
+
+Layout (data/sap_cve_versions/):
+    manifest.json        versions: number, label, source, created, columns, row count and
+                         added/changed/removed counts
+    v0001.delta.json.gz  added rows, changed values ({column: [old, new]}) and removed rows,
+                         each after its key, plus the row order when it is not the order
+                         the delta leaves (kept rows, then added ones)
+    v0001.snap.json.gz   keys and full rows, every SNAPSHOT_EVERY versions (and the first
+                         one), so materializing replays at most SNAPSHOT_EVERY - 1 deltas
+
+Values are kept as the CSV text (empty cells are left out of each row). The changes
+between two versions are composed from the deltas in between, no version is rebuilt.
+Standard library only, like sap_master_store.py.
+
+Usage:
+    python sap_versions.py record data/sap_cve_all_2026.csv --label 2026-06
+    python sap_versions.py list
+    python sap_versions.py changes 3 5
+    python sap_versions.py export 3 sap_cve_v3.csv
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sap_master_store import KEY, row_ids
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+VERSIONS_DIR = DATA_DIR / 'sap_cve_versions'
+SNAPSHOT_EVERY = 10
+
+
+def keyed(rows):
+    """{key: row} of rows in order, keyed by sap_master_store.row_ids"""
+    rows = list(rows)
+    return dict(zip(row_ids(rows), rows))
+
+
+def read_rows(path):
+    """(columns, {key: row}) of a CSV in file order, empty cells left out"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        rows = keyed({k: v for k, v in row.items() if k and v not in (None, '')} for row in reader)
+        return [c for c in reader.fieldnames or [] if c], rows
+
+
+def diff_rows(old, new):
+    """Keyed delta from old to new {key: row}: added rows, changed values, removed rows
+    (each as [*key, item]) and, if apply_delta would not leave new's order, the order"""
+    added = [[*k, new[k]] for k in new if k not in old]
+    removed = [[*k, old[k]] for k in old if k not in new]
+    changed = []
+    for k, row in new.items():
+        prev = old.get(k)
+        if prev is None or prev == row:
+            continue
+        values = {c: [prev.get(c, ''), row.get(c, '')] for c in prev.keys() | row.keys()
+                  if prev.get(c, '') != row.get(c, '')}
+        changed.append([*k, values])
+    delta = {'added': added, 'changed': changed, 'removed': removed}
+    applied = {k: i for i, k in enumerate([k for k in old if k in new] + [k for k in new if k not in old])}
+    if list(applied) != list(new):
+        delta['order'] = [applied[k] for k in new]
+    return delta
+
+
+def apply_delta(rows, delta):
+    """Applies a delta to {key: row} in place"""
+    for *key, _ in delta['removed']:
+        rows.pop(tuple(key), None)
+    for *key, values in delta['changed']:
+        key = tuple(key)
+        row = dict(rows.get(key, {}))
+        for col, (_, value) in values.items():
+            if value == '':
+                row.pop(col, None)
+            else:
+                row[col] = value
+        rows[key] = row
+    for *key, row in delta['added']:
+        rows[tuple(key)] = row
+    if 'order' in delta:
+        items = list(rows.items())
+        rows.clear()
+        rows.update(items[i] for i in delta['order'])
+    return rows
+
+
+class VersionStore:
+    """Versions of the SAP CVE dataset as keyed deltas (see the module docstring)"""
+
+    def __init__(self, path=VERSIONS_DIR, snapshot_every=SNAPSHOT_EVERY):
+        self.path = Path(path)
+        self.snapshot_every = snapshot_every
+        self._head = None  # (version, {key: row}) of the last materialization
+
+    # ---------- manifest ----------
+
+    def versions(self):
+        """Manifest entries, oldest first"""
+        manifest = self.path / 'manifest.json'
+        if not manifest.exists():
+            return []
+        data = json.loads(manifest.read_text(encoding='utf-8'))
+        if data.get('key') != list(KEY):
+            raise ValueError(f"{self.path} was recorded with key {data.get('key')}, not {list(KEY)}: "
+                             f"record the versions again in a new directory")
+        return data['versions']
+
+    def head(self):
+        """Number of the last version, 0 if there is none"""
+        versions = self.versions()
+        return versions[-1]['version'] if versions else 0
+
+    def entry(self, version):
+        for entry in self.versions():
+            if entry['version'] == version:
+                return entry
+        raise KeyError(f"Unknown version: {version}")
+
+    def _write_manifest(self, versions):
+        tmp = self.path / 'manifest.json.tmp'
+        tmp.write_text(json.dumps({'key': list(KEY), 'versions': versions}, indent=1), encoding='utf-8')
+        os.replace(tmp, self.path / 'manifest.json')
+
+    def _file(self, version, kind):
+        return self.path / f"v{version:04d}.{kind}.json.gz"
+
+    def _read(self, version, kind):
+        with gzip.open(self._file(version, kind), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, version, kind, data):
+        tmp = self._file(version, kind).with_suffix('.tmp')
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(tmp, self._file(version, kind))
+
+    # ---------- record ----------
+
+    def record(self, rows, columns, label='', source='', force=False):
+        """Records {key: row} as a new version; returns its manifest entry, or the head
+        entry if nothing changed (unless force)"""
+        versions = self.versions()
+        head = versions[-1]['version'] if versions else 0
+        old = self.rows(head) if head else {}
+        delta = diff_rows(old, rows)
+        columns = list(columns)
+        if head and not force and not any(delta.values()) and columns == versions[-1]['columns']:
+            logger.info(f"No changes against version {head}")
+            return versions[-1]
+
+        version = head + 1
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._write(version, 'delta', delta)
+        snapshot = version == 1 or version % self.snapshot_every == 0
+        if snapshot:
+            self._write(version, 'snap', {'rows': [[*k, row] for k, row in rows.items()]})
+        entry = {'version': version, 'label': label, 'source': str(source),
+                 'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                 'columns': columns, 'rows': len(rows), 'snapshot': snapshot,
+                 **{kind: len(delta[kind]) for kind in ('added', 'changed', 'removed')}}
+        self._write_manifest(versions + [entry])
+        self._head = (version, dict(rows))
+        logger.info(f"Version {version}: {entry['added']} added, {entry['changed']} changed, "
+                    f"{entry['removed']} removed, {entry['rows']} rows")
+        return entry
+
+    def record_csv(self, path, label='', force=False):
+        columns, rows = read_rows(path)
+        return self.record(rows, columns, label or Path(path).stem, source=path, force=force)
+
+    # ---------- read ----------
+
+    def rows(self, version=None):
+        """{key: row} of a version (head if None): the closest snapshot plus the deltas after it"""
+        version = version or self.head()
+        if self._head and self._head[0] == version:
+            return dict(self._head[1])
+        entries = [e for e in self.versions() if e['version'] <= version]
+        if not entries or entries[-1]['version'] != version:
+            raise KeyError(f"Unknown version: {version}")
+        base = max(e['version'] for e in entries if e['snapshot'])
+        if self._head and base <= self._head[0] < version:
+            base, rows = self._head[0], dict(self._head[1])
+        else:
+            rows = {tuple(key): row for *key, row in self._read(base, 'snap')['rows']}
+        for entry in entries:
+            if entry['version'] > base:
+                apply_delta(rows, self._read(entry['version'], 'delta'))
+        self._head = (version, rows)
+        return dict(rows)
+
+    def export_csv(self, version, path):
+        """Writes a version as CSV (its columns, in order); returns the row count"""
+        rows = self.rows(version)
+        columns = self.entry(version or self.head())['columns']
+        tmp = Path(f"{path}.tmp")
+        with open(tmp, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows.values())
+        os.replace(tmp, path)
+        return len(rows)
+
+    def read_frame(self, version=None):
+        import pandas as pd
+
+        columns = self.entry(version or self.head())['columns']
+        return pd.DataFrame(list(self.rows(version).values()), columns=columns)
+
+    # ---------- changes ----------
+
+    def changes(self, start, end=None):
+        """Net changes from version start to end (head if None), composed from the deltas in
+        between: {'added': [rows], 'changed': [[*key, {column: [old, new]}]], 'removed': [rows]},
+        key being (Note#, cve_id, Title hash, occurrence)"""
+        end = end or self.head()
+        if start > end:
+            raise ValueError(f"start ({start}) is after end ({end})")
+        net = {}  # key -> [kind, old values, new values]
+        for entry in self.versions():
+            if not start < entry['version'] <= end:
+                continue
+            delta = self._read(entry['version'], 'delta')
+            for *key, row in delta['removed']:
+                key = tuple(key)
+                kind, old, _ = net.get(key, ('', {}, {}))
+                if kind == 'added':
+                    del net[key]
+                else:
+                    net[key] = ['removed', {**row, **old}, {}]
+            for *key, values in delta['changed']:
+                item = net.setdefault(tuple(key), ['changed', {}, {}])
+                for col, (before, after) in values.items():
+                    item[1].setdefault(col, before)
+                    item[2][col] = after
+            for *key, row in delta['added']:
+                key = tuple(key)
+                if key in net and net[key][0] == 'removed':
+                    old = net[key][1]
+                    net[key] = ['changed', old, {c: row.get(c, '') for c in old.keys() | row.keys()}]
+                else:
+                    net[key] = ['added', {}, dict(row)]
+
+        result = {'added': [], 'changed': [], 'removed': []}
+        for key, (kind, old, new) in net.items():
+            if kind == 'added':
+                result['added'].append({c: v for c, v in new.items() if v != ''})
+            elif kind == 'removed':
+                result['removed'].append(old)
+            else:
+                values = {c: [old.get(c, ''), v] for c, v in new.items() if old.get(c, '') != v}
+                if values:
+                    result['changed'].append([*key, values])
+        return result
+
+
+def version_store(path=VERSIONS_DIR):
+    return VersionStore(path)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Delta-encoded versions of the SAP CVE dataset')
+    parser.add_argument('--path', default=str(VERSIONS_DIR), help='Versions directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+    record = sub.add_parser('record', help='Record CSV files as new versions, in the given order')
+    record.add_argument('files', nargs='+')
+    record.add_argument('--label', default='', help='Version label (default: file name)')
+    record.add_argument('--force', action='store_true', help='Record even if nothing changed')
+    sub.add_parser('list', help='List the versions')
+    changes = sub.add_parser('changes', help='What changed between two versions')
+    changes.add_argument('start', type=int)
+    changes.add_argument('end', type=int, nargs='?')
+    changes.add_argument('--full', action='store_true', help='Print the rows, not only the counts')
+    export = sub.add_parser('export', help='Write a version as CSV')
+    export.add_argument('version', type=int)
+    export.add_argument('output')
+    args = parser.parse_args()
+
+    store = VersionStore(args.path)
+    if args.command == 'record':
+        for path in args.files:
+            print(json.dumps({k: v for k, v in store.record_csv(path, args.label, args.force).items()
+                              if k != 'columns'}))
+    elif args.command == 'list':
+        for e in store.versions():
+            print(f"v{e['version']:<4} {e['created']}  {e['rows']:>6} rows  +{e['added']} ~{e['changed']} "
+                  f"-{e['removed']}  {e['label']}")
+    elif args.command == 'changes':
+        result = store.changes(args.start, args.end)
+        if args.full:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            print(json.dumps({kind: len(items) for kind, items in result.items()}))
+            for note, cve, _, occurrence, values in result['changed']:
+                print(f"{note} {cve}{f' #{occurrence}' if occurrence else ''}: {', '.join(sorted(values))}")
+    else:
+        print(f"{store.export_csv(args.version, args.output)} rows -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
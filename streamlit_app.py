@@ -5,27 +5,96 @@ import plotly.express as px
 import plotly.graph_objects as go
 import streamlit_antd_components as sac
 from datetime import date, timedelta
-import httpx
+import os
 import re
-
-# Caching data loading
-@st.cache_data
-def load_data(use_history_file):
-    if use_history_file:
-        df = pd.read_csv('data/sap_cve_all_2026.csv')
+import json
+from sap_dataset import HISTORY_SPLIT, dataset_is_current, dataset_years, partition_version, read_partitions
+from sap_cwe import cwe_table_version, cwe_top25_version, normalize_cwe_ids
+from sap_epss import EPSSMatrix, epss_store, epss_store_version
+from sap_kev import kev_lookup, kev_sources_version
+from sap_master_store import MASTER_DB, MasterStore, master_store_version
+from sap_scoring import (DEFAULT_PROFILE, SCORE_COLUMNS, SCORE_TABLE_FILE, WEIGHT_NAMES, WEIGHT_PROFILES,
+                         cwe_top25_ranks, fetch_epss_history, kev_flags, read_score_table, rescore, score_vulnerabilities,
+                         select_top_priority, top_k)
+
+DATA_FILES = {
+    True: 'data/sap_cve_all_2026.csv',
+    False: 'data/sap_cve_2026.csv',
+}
+
+# Columns the dashboard shows or derives from; the only ones read from the partitioned dataset
+DASHBOARD_COLUMNS = ['cve_id', 'datePublished', 'dateUpdated', 'descriptions', 'product_l', 'priority_l', 'cweId',
+                     'Note#', 'Priority', 'priority', 'epss', 'cvss', 'cvss_severity', 'kev', 'vendor', 'sap_note_year']
+
+# The history comes from the SQLite master (sap_master_store.py) when there is one
+def use_master_store(use_history_file):
+    return use_history_file and MASTER_DB.exists()
+
+# Years of the year-partitioned dataset (sap_dataset.py) the view needs, [] if it is not built,
+# older than the CSVs it was built from, or the history comes from the master store:
+# the current view reads the HISTORY_SPLIT+ partitions, the history toggle adds the older ones
+def dataset_partitions(use_history_file):
+    if use_master_store(use_history_file) or not dataset_is_current():
+        return []
+    years = dataset_years()
+    return years if use_history_file else [y for y in years if y >= HISTORY_SPLIT]
+
+# Token of the local sources every row derivation depends on (KEV, CWE tables, EPSS store)
+def sources_version():
+    return f"{kev_sources_version()}|{cwe_table_version()}|{cwe_top25_version()}|{epss_store_version()}"
+
+# Dataset version token: changes whenever the partitions, CSV (or master store) behind the
+# dashboard, the local KEV sources, the CWE tables (normalization, Top 25 editions) or the
+# local EPSS store change
+def dataset_version(use_history_file):
+    if years := dataset_partitions(use_history_file):
+        source = partition_version(years)
+    elif use_master_store(use_history_file):
+        source = master_store_version()
     else:
-        df = pd.read_csv('data/sap_cve_2026.csv')
-    df.sort_values(by='cve_id', inplace=True)
-    cwe_top_25 = pd.read_csv('data/cwe_top_25_2024.csv')
-    ll_cwe_t25 = list(cwe_top_25['ID'])
-    
+        path = DATA_FILES[use_history_file]
+        stat = os.stat(path)
+        source = f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+    return f"{source}|{sources_version()}"
+
+# Row-wise derivations, shared by the CSV/master load and the per-year partition load
+def derive_columns(df):
     df['datePublished'] = pd.to_datetime(df['datePublished'], format='mixed', utc=True)
     df['dateUpdated'] = pd.to_datetime(df['dateUpdated'], format='mixed', utc=True)
     df['monthName'] = df['datePublished'].dt.month_name()
     df['year'] = df['datePublished'].dt.year.astype(str)    
     #df['year'] = pd.to_datetime(df['sap_note_year'], format='%Y', utc=True)
-    df['cwe_t25'] = df['cweId'].isin(ll_cwe_t25)
+    df['cweId'] = normalize_cwe_ids(df['cweId'], df['cve_id'])
+    # CWE Top 25 edition in force for each SAP Note year, rank NaN if not listed
+    df['cwe_rank'] = cwe_top25_ranks(df['cweId'], df['sap_note_year'])
+    df['cwe_t25'] = df['cwe_rank'].notna()
+    # KEV: CSV flag (SploitScan / CVE_Prioritizer) or local KEV set (CISA + VulnCheck mirror)
+    df['kev'] = kev_flags(df['kev']) | kev_lookup().flags(df['cve_id'])
+    df['cveInfo'] = df['cve_id'].apply(lambda x: f'https://www.cvedetails.com/cve/{x}')
+    df['cveSAP'] = df['cve_id'].apply(lambda x: f'https://www.cve.org/CVERecord?id={x}')
+    df['epss'] = (df['epss'] * 100).astype('float').round(2)
+    return df
 
+# One partition, cached on its own: toggling history only loads the older years
+@st.cache_data
+def load_year(year, year_version=None):
+    df = read_partitions([year], DASHBOARD_COLUMNS)
+    df['sap_note_year'] = df['sap_note_year'].astype(int)
+    return derive_columns(df)
+
+# Caching data loading
+@st.cache_data
+def load_data(use_history_file, data_version=None):
+    if years := dataset_partitions(use_history_file):
+        sources = sources_version()
+        df = pd.concat([load_year(y, f"{partition_version([y])}|{sources}") for y in years], ignore_index=True)
+    else:
+        if use_master_store(use_history_file):
+            df = MasterStore(MASTER_DB).read_frame()
+        else:
+            df = pd.read_csv(DATA_FILES[use_history_file])
+        df = derive_columns(df)
+    df.sort_values(by='cve_id', inplace=True)
     
     df.drop_duplicates(subset=['Note#'], inplace=True)
     
@@ -35,73 +104,112 @@ def load_data(use_history_file):
     df['priority_l'] = df['priority_l'].astype('category')
     df['Priority'] = df['Priority'].astype('category')
     df['cvss_severity'] = df['cvss_severity'].astype('category')
-    df['kev'].fillna(False, inplace=True)
-    df['cveInfo'] = df['cve_id'].apply(lambda x: f'https://www.cvedetails.com/cve/{x}')
-    df['cveSAP'] = df['cve_id'].apply(lambda x: f'https://www.cve.org/CVERecord?id={x}')
-    df['epss'] = (df['epss'] * 100).astype('float').round(2)
     
     return df
 
 # Caching EPSS data fetching
 @st.cache_data
 def fetch_epss_data(cve):
-    r = httpx.get(f'https://api.first.org/data/v1/epss?cve={cve}&scope=time-series')
-    epss_ts = r.json()['data'][0]
-    return [float(l['epss'])*100 for l in reversed(epss_ts['time-series'])]
+    return fetch_epss_history(cve)
+
+# EPSS last 30 days of the CVEs as an EPSSMatrix (CVEs x days, NaN padded): one slice of the
+# local EPSS store when it is current, else (or with live) api.first.org one CVE at a time
+def epss_matrix(cves, live=False):
+    store = epss_store()
+    if not live and store.is_current():
+        return store.matrix(cves)
+    cves = list(dict.fromkeys(cves))
+    return EPSSMatrix.from_histories(cves, {cve: fetch_epss_data(cve) for cve in cves})
 
 # Select A+|1+ CVEs & Get EPSS data of TOP Priorities CVEs
+# _xdf is not hashed by Streamlit: filter_key (dataset version + filter spec) identifies it
 @st.cache_data
-def sap_cve_top_priority(xdf):
-    #sap_cve_top = xdf[(xdf['priority_l'].isin(['A+', 'B'])) | (xdf['priority'] == 'Priority 1+')]
-    sap_cve_top = xdf[(xdf['priority_l'].isin(['A+'])) |
-                       (xdf['priority'] == 'Priority 1+') |
-                       (xdf['cvss'] > 7.5)]
-    col_epss_hist = [fetch_epss_data(row['cve_id']) for _, row in sap_cve_top.iterrows()]
-    return sap_cve_top, col_epss_hist
-
-# Function to calculate EPSS trend
-def calculate_epss_trend(epss_values, up_threshold=1.01, down_threshold=0.99):
-    if len(epss_values) < 2:
-        return 'stable'
-    first_val, last_val = epss_values[0], epss_values[-1]
-    if last_val > first_val * up_threshold:
-        return 'up'
-    elif last_val < first_val * down_threshold:
-        return 'down'
-    return 'stable'
-
-# Function to calculate individual scores
-def calculate_scores(row, kev_weight=3, cvss_multiplier=2, epss_up_multiplier=3, epss_stable_multiplier=2, cwe_weight=1.5):
-    kev_score = kev_weight if row['kev'] else 0
-    cvss_score = row['cvss'] * cvss_multiplier
-    epss_trend = calculate_epss_trend(row['epss_l_30'])
-    epss_avg = np.mean(row['epss_l_30']) if len(row['epss_l_30']) > 0 else 0
-    epss_score = epss_avg * (epss_up_multiplier if epss_trend == 'up' else epss_stable_multiplier if epss_trend == 'stable' else 1)
-    cwe_score = cwe_weight if row['cwe_t25'] else 0
-    priority_score = 1
-    
-    return {
-        'epss_trend': epss_trend,
-        'epss_avg': epss_avg,
-        'kev_score': kev_score,
-        'cvss_score': cvss_score,
-        'epss_score': epss_score,
-        'cwe_score': cwe_score,
-        'priority_score': priority_score,
-        'composite_score': kev_score + cvss_score + epss_score + cwe_score + priority_score
-    }
+def sap_cve_top_priority(_xdf, filter_key, live=False):
+    sap_cve_top = select_top_priority(_xdf)
+    return sap_cve_top, epss_matrix(sap_cve_top['cve_id'].tolist(), live)
 
 # Main function to process the DataFrame and rank vulnerabilities
+# _ydf and _epss are not hashed by Streamlit: filter_key identifies them
+# Scored once with the default weights, weight_controls() profiles are applied on top with rescore()
 @st.cache_data
-def process_vulnerability_data(ydf, kev_weight=3, cvss_multiplier=2, epss_up_multiplier=3, epss_stable_multiplier=2, cwe_weight=1.5):
-    score_columns = ydf.apply(
-        lambda row: calculate_scores(row, kev_weight, cvss_multiplier, epss_up_multiplier, epss_stable_multiplier, cwe_weight), 
-        axis=1, 
-        result_type='expand'
-    )
-    
-    ydf = pd.concat([ydf, score_columns], axis=1)
-    return ydf.sort_values(by='composite_score', ascending=False)
+def process_vulnerability_data(_ydf, filter_key, _epss):
+    return score_vulnerabilities(_ydf, epss=_epss)
+
+RETHINK_PAGE = 25  # CVE-IDs per "Load more"
+
+def load_more_rethink():
+    st.session_state["rethink_k"] += RETHINK_PAGE
+
+# Weight profile + sliders, sliders restart from the profile values when the profile changes
+def weight_controls():
+    profile = st.selectbox("Weight profile", list(WEIGHT_PROFILES), key="weight_profile",
+                           index=list(WEIGHT_PROFILES).index(DEFAULT_PROFILE))
+    defaults = WEIGHT_PROFILES[profile]
+    with st.popover(":material/tune: Weights"):
+        return {
+            name: st.slider(name.replace('_', ' ').capitalize(), 0.0, float(max(10, defaults[name] * 2)),
+                            float(defaults[name]), 0.25, key=f"w_{profile}_{name}")
+            for name in WEIGHT_NAMES
+        }
+
+# Precomputed Rethink score table (built by the CLI pipeline, see sap_scoring.py)
+def score_table_version():
+    if not SCORE_TABLE_FILE.exists():
+        return None
+    stat = SCORE_TABLE_FILE.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+@st.cache_data
+def load_score_table(table_version):
+    return read_score_table(SCORE_TABLE_FILE)
+
+# Rank the top priority rows with the precomputed scores, CVEs missing from the table are scored live
+# Returns (ranked rows, EPSSMatrix of their CVEs)
+@st.cache_data
+def precomputed_top_priority(_xdf, filter_key, table_version):
+    scores, epss, _ = load_score_table(table_version)
+    sap_cve_top = select_top_priority(_xdf)
+    ranked = sap_cve_top.merge(scores[['cve_id'] + SCORE_COLUMNS], on='cve_id', how='left')
+    missing = ~ranked['cve_id'].isin(scores['cve_id'])
+    if missing.any():
+        live = ranked[missing].drop(columns=SCORE_COLUMNS)
+        live_epss = epss_matrix(live['cve_id'].tolist())
+        ranked = pd.concat([ranked[~missing], score_vulnerabilities(live, epss=live_epss)])
+        epss = EPSSMatrix.concat([epss, live_epss])
+    return ranked.sort_values(by='composite_score', ascending=False), epss
+
+# Plotly figures are memoized as JSON keyed by name + key (filter spec, dataset version...), _build is not hashed.
+# The cached JSON comes from an already validated figure, so it is rehydrated without validating it again
+@st.cache_data
+def figure_json(name, key, _build):
+    return _build().to_json()
+
+def cached_figure(name, key, build):
+    return go.Figure(json.loads(figure_json(name, key, build)), _validate=False)
+
+# Scatters with more than SCATTER_MAX_POINTS rows are aggregated before being sent to the browser:
+# identical (x, y) points are merged with a count, and if there are still too many they are binned
+# on a grid of at most SCATTER_MAX_POINTS cells (count-weighted centroid per cell). name + key identify _data
+SCATTER_MAX_POINTS = 1000
+
+@st.cache_data
+def scatter_points(name, _data, key, x='cvss', y='epss', max_points=SCATTER_MAX_POINTS):
+    points = _data[[x, y, 'cve_id']].dropna(subset=[x, y])
+    if len(points) <= max_points:
+        return points, False
+
+    points = points.groupby([x, y], sort=False, observed=True).agg(
+        count=('cve_id', 'size'), cve_id=('cve_id', 'first')).reset_index()
+    if len(points) > max_points:
+        n = int(np.sqrt(max_points))
+        cells = [pd.cut(points[x], n, labels=False), pd.cut(points[y], n, labels=False)]
+        points = points.assign(wx=points[x] * points['count'], wy=points[y] * points['count'])
+        points = points.groupby(cells, observed=True).agg(
+            wx=('wx', 'sum'), wy=('wy', 'sum'), count=('count', 'sum'), cve_id=('cve_id', 'first')).reset_index(drop=True)
+        points[x] = (points['wx'] / points['count']).round(2)
+        points[y] = (points['wy'] / points['count']).round(2)
+        points = points[[x, y, 'count', 'cve_id']]
+    return points, True
 
 # Streamlit app setup
 st.set_page_config(
@@ -119,7 +227,8 @@ sac.divider(label="<img height='96' width='96' src='https://cdn.simpleicons.org/
 # Load data
 use_history_file = st.toggle(":blue[:material/history_edu:] History SAP CVE-IDs",
                              key="load_history", help="Load history SAP CVE-IDs")
-df = load_data(use_history_file)
+data_version = dataset_version(use_history_file)
+df = load_data(use_history_file, data_version)
 
 if use_history_file:
     ref_data_from = "2001"
@@ -149,84 +258,91 @@ st.sidebar.caption(":blue[:material/south_america:] :blue-badge[AR]")
 #st.toast('New 2024 CWE Top 25 for Rethink process', icon=":material/emergency_heat:")
 
 
-with st.expander(f"Vulnerability Summary {ref_data_from}-2026", expanded=True, icon=":material/explore:"):
+summary = st.expander(f"Vulnerability Summary {ref_data_from}-2026", expanded=True, icon=":material/explore:",
+                      key="exp_summary", on_change="rerun")
+with summary:
     st.header(f"From January {ref_data_from} to date, :blue[{df.shape[0]} SAP Notes] related to :orange[{len(df['cve_id'].unique())} CVE-IDs] are reported.", anchor=False)
 
-    count_by_month = df.groupby([df['datePublished'].dt.to_period('M'), 'Priority']).size().reset_index(name='v')
-    #count_by_month['cumulative_v'] = count_by_month.groupby('Priority')['v'].cumsum()
-    total_by_priority = count_by_month.groupby('Priority')['v'].sum().reset_index()
-
-    today_utc = pd.Timestamp.now(tz='UTC')
-    twelve_months_ago = today_utc - pd.DateOffset(years=1)
-    last_12_months_df = df[df['datePublished'] >= twelve_months_ago]
-
-    with st.container():
-        metrics = st.columns(4, gap='large')
-        priorities = ['Critical', 'High', 'Medium', 'Low']
-        colors = ['violet', 'red', 'orange', 'blue']
-        
-        # Mapping streamlit colors to hex for plotly
-        color_map = {
-            'violet': '#ba38f2',
-            'red': '#ff4b4b',
-            'orange': '#ffa500',
-            'blue': '#0080ff'
-        }
+    # Metrics and sparklines are only computed while the summary is expanded
+    if summary.open:
+        count_by_month = df.groupby([df['datePublished'].dt.to_period('M'), 'Priority']).size().reset_index(name='v')
+        #count_by_month['cumulative_v'] = count_by_month.groupby('Priority')['v'].cumsum()
+        total_by_priority = count_by_month.groupby('Priority')['v'].sum().reset_index()
 
-        # --- Prepare data for all sparklines and deltas ---
-        # Use a period range for the last 12 full months for robustness
         today_utc = pd.Timestamp.now(tz='UTC')
-        end_period = today_utc.to_period('M')
-        start_period = (today_utc - pd.DateOffset(months=11)).to_period('M')
-        full_period_range = pd.period_range(start=start_period, end=end_period, freq='M')
+        twelve_months_ago = today_utc - pd.DateOffset(years=1)
+        last_12_months_df = df[df['datePublished'] >= twelve_months_ago]
 
-        # Group all data by month and priority in one go
-        all_monthly_counts = df.groupby([df['datePublished'].dt.to_period('M'), 'Priority']).size().unstack(fill_value=0)
+        with st.container():
+            metrics = st.columns(4, gap='large')
+            priorities = ['Critical', 'High', 'Medium', 'Low']
+            colors = ['violet', 'red', 'orange', 'blue']
         
-        # Reindex to ensure all 12 months are present for all priorities
-        all_monthly_counts = all_monthly_counts.reindex(full_period_range, fill_value=0)
-
-        for i, (priority, color) in enumerate(zip(priorities, colors)):
-            # Total value for the metric
-            total_value_series = total_by_priority.loc[total_by_priority['Priority'] == priority, 'v']
-            total_value = total_value_series.values[0] if not total_value_series.empty else 0
-
-            # --- Monthly data for sparkline (last 12 months) ---
-            if priority in all_monthly_counts.columns:
-                monthly_counts = all_monthly_counts[priority]
-            else:
-                # If a priority has no vulns, create a series of zeros
-                monthly_counts = pd.Series([0] * 12, index=full_period_range)
-
-            # --- Delta calculation ---
-            delta = 0
-            if len(monthly_counts) >= 2:
-                # Compare the last two months in the 12-month period
-                delta = int(monthly_counts.iloc[-1] - monthly_counts.iloc[-2])
-
-            with metrics[i]:
-                delta_color = "inverse" if delta != 0 else "off"
-                st.metric(f":{color}[{priority}]", value=total_value, delta=delta, delta_color=delta_color, help="Delta from previous month")
+            # Mapping streamlit colors to hex for plotly
+            color_map = {
+                'violet': '#ba38f2',
+                'red': '#ff4b4b',
+                'orange': '#ffa500',
+                'blue': '#0080ff'
+            }
+
+            # --- Prepare data for all sparklines and deltas ---
+            # Use a period range for the last 12 full months for robustness
+            today_utc = pd.Timestamp.now(tz='UTC')
+            end_period = today_utc.to_period('M')
+            start_period = (today_utc - pd.DateOffset(months=11)).to_period('M')
+            full_period_range = pd.period_range(start=start_period, end=end_period, freq='M')
+
+            # Group all data by month and priority in one go
+            all_monthly_counts = df.groupby([df['datePublished'].dt.to_period('M'), 'Priority']).size().unstack(fill_value=0)
+        
+            # Reindex to ensure all 12 months are present for all priorities
+            all_monthly_counts = all_monthly_counts.reindex(full_period_range, fill_value=0)
+
+            for i, (priority, color) in enumerate(zip(priorities, colors)):
+                # Total value for the metric
+                total_value_series = total_by_priority.loc[total_by_priority['Priority'] == priority, 'v']
+                total_value = total_value_series.values[0] if not total_value_series.empty else 0
+
+                # --- Monthly data for sparkline (last 12 months) ---
+                if priority in all_monthly_counts.columns:
+                    monthly_counts = all_monthly_counts[priority]
+                else:
+                    # If a priority has no vulns, create a series of zeros
+                    monthly_counts = pd.Series([0] * 12, index=full_period_range)
+
+                # --- Delta calculation ---
+                delta = 0
+                if len(monthly_counts) >= 2:
+                    # Compare the last two months in the 12-month period
+                    delta = int(monthly_counts.iloc[-1] - monthly_counts.iloc[-2])
+
+                with metrics[i]:
+                    delta_color = "inverse" if delta != 0 else "off"
+                    st.metric(f":{color}[{priority}]", value=total_value, delta=delta, delta_color=delta_color, help="Delta from previous month")
                 
-                # --- Sparkline ---
-                spark_fig = go.Figure(go.Scatter(
-                    y=monthly_counts.values,
-                    x=monthly_counts.index.to_timestamp(), # Convert period index to timestamp for plotting
-                    mode='lines',
-                    fill='tozeroy',
-                    line_color=color_map.get(color, color), # Use mapped color, fallback to original
-                    hoverinfo='none' # Clean look
-                ))
-                spark_fig.update_layout(
-                    height=60, # Small height for sparkline
-                    margin=dict(l=0, r=0, t=5, b=0), # Tight margin
-                    xaxis=dict(visible=False),
-                    yaxis=dict(visible=False),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    showlegend=False,
-                )
-                st.plotly_chart(spark_fig, use_container_width=True, config={'displayModeBar': False})
+                    # --- Sparkline ---
+                    def build_sparkline():
+                        spark_fig = go.Figure(go.Scatter(
+                            y=monthly_counts.values,
+                            x=monthly_counts.index.to_timestamp(), # Convert period index to timestamp for plotting
+                            mode='lines',
+                            fill='tozeroy',
+                            line_color=color_map.get(color, color), # Use mapped color, fallback to original
+                            hoverinfo='none' # Clean look
+                        ))
+                        spark_fig.update_layout(
+                            height=60, # Small height for sparkline
+                            margin=dict(l=0, r=0, t=5, b=0), # Tight margin
+                            xaxis=dict(visible=False),
+                            yaxis=dict(visible=False),
+                            plot_bgcolor='rgba(0,0,0,0)',
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            showlegend=False,
+                        )
+                        return spark_fig
+                    spark_fig = cached_figure("sparkline", (data_version, priority, str(end_period)), build_sparkline)
+                    st.plotly_chart(spark_fig, use_container_width=True, config={'displayModeBar': False})
 
 st.divider()
 
@@ -292,70 +408,117 @@ filtered_df = df[
     (df['monthName'].isin(month_filter))
 ]
 
+# Cheap cache key for the cached functions that take filtered_df
+filter_key = (
+    data_version,
+    tuple(sorted(map(str, priority_filter))),
+    tuple(sorted(map(str, year_filter))),
+    tuple(month_filter),
+)
+
 st.divider()
 
 if on:
     with st.container():
-        epss_h = sap_cve_top_priority(filtered_df)
-        sap_cve_top25 = epss_h[0].copy()
-        sap_cve_top25['epss_l_30'] = epss_h[1]
-        sap_cve_top25 = process_vulnerability_data(sap_cve_top25)
-        top = sap_cve_top25.shape[0]
+        table_version = score_table_version()
+        scores, _, scores_meta = load_score_table(table_version) if table_version else (None, None, None)
+        col1w, col2w = st.columns(2, vertical_alignment="bottom")
+        with col1w:
+            live_epss = st.toggle(":blue[:material/refresh:] Live EPSS refresh", key="live_epss",
+                                  help="Fetch the last 30 days of EPSS from api.first.org instead of the precomputed score table")
+        with col2w:
+            weights = weight_controls()
+        score_source = "live" if live_epss or scores is None else table_version
+        if score_source == "live":
+            sap_cve_top25, epss = sap_cve_top_priority(filtered_df, filter_key, live_epss)
+            sap_cve_top25 = process_vulnerability_data(sap_cve_top25, filter_key, epss)
+        else:
+            st.caption(f"Rethink scores precomputed {scores_meta['built_at'][:10]}")
+            sap_cve_top25, epss = precomputed_top_priority(filtered_df, filter_key, table_version)
+        scored = rescore(sap_cve_top25, weights, sort=False)
+        top = scored.shape[0]
+        all_vs = scored.drop_duplicates(subset=['cve_id'])
+        kev = all_vs[all_vs['kev']]
+        cweT25 = all_vs[all_vs['cwe_t25']]
+        
+        # Only the first rethink_k CVE-IDs are ranked and shown, "Load more" adds another page
+        if st.session_state.get("rethink_k_key") != filter_key:
+            st.session_state["rethink_k_key"] = filter_key
+            st.session_state["rethink_k"] = RETHINK_PAGE
+        sap_cve_top25 = top_k(scored, st.session_state["rethink_k"])
         top_vs = sap_cve_top25.drop_duplicates(subset=['cve_id'])
-        kev = top_vs[top_vs['kev']]
-        cweT25 = top_vs[top_vs['cwe_t25']]
+        # Python lists only for the CVE-IDs shown (AreaChartColumn), scores come from the matrix
+        top_vs = top_vs.assign(epss_l_30=epss.lists(top_vs['cve_id']))
         
-        tab1, tab2 = st.tabs(["Vunls Top Priority", "CVE Info"])
+        tab1, tab2 = st.tabs(["Vunls Top Priority", "CVE Info"], key="tabs_rethink", on_change="rerun")
         with tab1:
-            st.header(f":violet[Top {top}] Priority Vulnerabilities of :blue[{filtered_df.shape[0]}] selected SAP Notes", anchor=False)
-            st.header(f':orange[{top_vs.shape[0]}] Unique CVE-IDs & :red[{kev.shape[0]} on KEV]', anchor=False)
+            if tab1.open:
+                st.header(f":violet[Top {top}] Priority Vulnerabilities of :blue[{filtered_df.shape[0]}] selected SAP Notes", anchor=False)
+                st.header(f':orange[{all_vs.shape[0]}] Unique CVE-IDs & :red[{kev.shape[0]} on KEV]', anchor=False)
             
-            st.dataframe(
-                sap_cve_top25[['Note#','cve_id','Priority','priority_l','priority','cvss','kev','epss','cweId','cwe_t25','composite_score']],
-                column_config = {
-                    "composite_score": st.column_config.NumberColumn("Score", help="Rethink Priority Score.", format="%.3f"),
-                },
-                hide_index=True,
-            )
+                st.dataframe(
+                    sap_cve_top25[['Note#','cve_id','Priority','priority_l','priority','cvss','kev','epss','cweId','cwe_t25','composite_score']],
+                    column_config = {
+                        "composite_score": st.column_config.NumberColumn("Score", help="Rethink Priority Score.", format="%.3f"),
+                    },
+                    hide_index=True,
+                )
+                col1m, col2m = st.columns([3, 1], vertical_alignment="center")
+                col1m.caption(f"Top {top_vs.shape[0]} of {all_vs.shape[0]} CVE-IDs by Rethink Priority Score")
+                col2m.button(":material/expand_more: Load more", key="rethink_more", on_click=load_more_rethink,
+                             disabled=top_vs.shape[0] >= all_vs.shape[0], use_container_width=True)
             
-            # CVSS Distribution
-            chart_data = sap_cve_top25[["cvss","epss","cve_id","Note#"]]
-            fig = px.scatter(chart_data, x='cvss', y='epss', color_discrete_sequence=["#ff1493"],
-                             labels={"cvss": "CVSS score", "epss": "EPSS %"})
-            fig.add_hline(y=25, line_color='grey', line_dash='dash', 
-                          annotation_text="Threshold EPSS: 25%", annotation_position="bottom right")
-            fig.add_vline(x=6.0, line_color='grey', line_dash='dash', 
-                          annotation_text="Threshold CVSS: 6.0", annotation_position="top right")
-            fig.update_layout(xaxis_title="CVSS Score", yaxis_title="EPSS %")
-            st.subheader("EPSS Score Distribution", anchor=False)
-            st.plotly_chart(fig, use_container_width=True)
+                # CVSS Distribution
+                def build_rethink_scatter():
+                    chart_data, aggregated = scatter_points("rethink", scored, filter_key)
+                    fig = px.scatter(chart_data, x='cvss', y='epss', color_discrete_sequence=["#ff1493"],
+                                     size='count' if aggregated else None,
+                                     hover_data=['count', 'cve_id'] if aggregated else None,
+                                     labels={"cvss": "CVSS score", "epss": "EPSS %", "count": "SAP Notes"})
+                    fig.add_hline(y=25, line_color='grey', line_dash='dash', 
+                                  annotation_text="Threshold EPSS: 25%", annotation_position="bottom right")
+                    fig.add_vline(x=6.0, line_color='grey', line_dash='dash', 
+                                  annotation_text="Threshold CVSS: 6.0", annotation_position="top right")
+                    fig.update_layout(xaxis_title="CVSS Score", yaxis_title="EPSS %")
+                    return fig
+                fig = cached_figure("rethink_scatter", filter_key, build_rethink_scatter)
+                st.subheader("EPSS Score Distribution", anchor=False)
+                st.plotly_chart(fig, use_container_width=True)
 
         with tab2:
-            st.subheader('CVE Details by Rethink Priority Score', anchor=False)
-            st.header(f':orange[{top_vs.shape[0]} CVE-IDs] | :red[{kev.shape[0]} on KEV] | :blue[{cweT25.shape[0]} on CWE Top 25]', anchor=False)
-            st.dataframe(
-                top_vs[['cveInfo','Priority','priority_l','priority','cweId','epss','cvss',
-                        'cvss_severity','kev','sap_note_year','cwe_t25','epss_l_30','epss_trend',
-                        'epss_avg','kev_score','cvss_score','epss_score','cwe_score','priority_score',
-                        'composite_score','vendor','product_l','descriptions']],
-                column_config={
-                    "cveInfo": st.column_config.LinkColumn("cveInfo", help="CVE Details", max_chars=50, display_text=r"(CVE-....-\d+)", pinned=True),
-                    "epss_l_30": st.column_config.AreaChartColumn("EPSS (Last 30 days)", y_min=0, y_max=100),
-                    "composite_score": st.column_config.NumberColumn("Score", help="Rethink Priority Score.", format="%.2f"),
-                },
-                hide_index=True
-            )
+            if tab2.open:
+                st.subheader('CVE Details by Rethink Priority Score', anchor=False)
+                st.header(f':orange[{all_vs.shape[0]} CVE-IDs] | :red[{kev.shape[0]} on KEV] | :blue[{cweT25.shape[0]} on CWE Top 25]', anchor=False)
+                st.dataframe(
+                    top_vs[['cveInfo','Priority','priority_l','priority','cweId','epss','cvss',
+                            'cvss_severity','kev','sap_note_year','cwe_t25','epss_l_30','epss_trend',
+                            'epss_avg','epss_slope','kev_score','cvss_score','epss_score','cwe_score','priority_score',
+                            'composite_score','vendor','product_l','descriptions']],
+                    column_config={
+                        "cveInfo": st.column_config.LinkColumn("cveInfo", help="CVE Details", max_chars=50, display_text=r"(CVE-....-\d+)", pinned=True),
+                        "epss_l_30": st.column_config.AreaChartColumn("EPSS (Last 30 days)", y_min=0, y_max=100),
+                        "epss_slope": st.column_config.NumberColumn("EPSS slope", help="Least-squares EPSS change, % per day.", format="%.3f"),
+                        "composite_score": st.column_config.NumberColumn("Score", help="Rethink Priority Score.", format="%.2f"),
+                    },
+                    hide_index=True
+                )
             
-            st.subheader('Treemap Score Priorities', anchor=False)
-            # Filter out rows with NaN values in 'priority' to prevent treemap errors
-            top_vs_clean = top_vs[top_vs['priority'].notna()].copy()
-            if len(top_vs_clean) > 0:
-                fig_tm = px.treemap(top_vs_clean, path=[px.Constant("CVE Details"), 'Priority', 'sap_note_year', 'priority', 'priority_l'], values='composite_score')
-                fig_tm.update_traces(marker_colorscale=['#5eadf2','#3b2e8c','#04adbf','#ba38f2','#ff1493'])                                        
-                fig_tm.update_layout(margin = dict(t=50, l=25, r=25, b=25))
-                st.plotly_chart(fig_tm, theme=None, use_container_width=True)
-            else:
-                st.warning("No data available for treemap visualization (all records have missing priority values)")
+                st.subheader('Treemap Score Priorities', anchor=False)
+                # Filter out rows with NaN values in 'priority' to prevent treemap errors
+                top_vs_clean = top_vs[top_vs['priority'].notna()].copy()
+                if len(top_vs_clean) > 0:
+                    def build_treemap():
+                        fig_tm = px.treemap(top_vs_clean, path=[px.Constant("CVE Details"), 'Priority', 'sap_note_year', 'priority', 'priority_l'], values='composite_score')
+                        fig_tm.update_traces(marker_colorscale=['#5eadf2','#3b2e8c','#04adbf','#ba38f2','#ff1493'])                                        
+                        fig_tm.update_layout(margin = dict(t=50, l=25, r=25, b=25))
+                        return fig_tm
+                    # The treemap also depends on the weights and on how many CVE-IDs are loaded
+                    fig_tm = cached_figure("rethink_treemap",
+                                           (filter_key, score_source, tuple(weights.values()), st.session_state["rethink_k"]),
+                                           build_treemap)
+                    st.plotly_chart(fig_tm, theme=None, use_container_width=True)
+                else:
+                    st.warning("No data available for treemap visualization (all records have missing priority values)")
   
     st.divider()
 
@@ -375,14 +538,17 @@ col1, col2 = st.columns(2, vertical_alignment="bottom")
 with col1:
     # Show CVSS Distribution
     st.subheader("EPSS Score Distribution", anchor=False)
-    chart_data = filtered_df[["cvss","epss","cve_id","Note#"]]
+    chart_data, aggregated = scatter_points("selected", filtered_df, filter_key)
     st.scatter_chart(chart_data,
                     y="epss",
                     x="cvss",
                     x_label="CVSS Score",
                     y_label="EPSS %",
                     color="#ff1493",
+                    size="count" if aggregated else None,
                     width='stretch')
+    if aggregated:
+        st.caption(f"{filtered_df.shape[0]} SAP Notes aggregated into {chart_data.shape[0]} points, size = count")
 
 with col2:
     # Potentially Display another chart (like by date)
@@ -400,177 +566,193 @@ with col2:
 
 st.subheader("Parallel Category Diagram", anchor=False)
 
-# Preparar datos con categorías ordenadas
-dfp = filtered_df[['sap_note_year','year','priority_l','priority','Priority','cvss_severity']].copy()
-
-# Definir el orden específico para cada categoría
-sap_priority_order = ['Critical', 'High', 'Medium', 'Low']
-cvss_severity_order = ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']
-sploitscan_order = ['A+', 'A', 'B', 'C', 'D', 'E']
-cve_prioritizer_order = ['Priority 1+', 'Priority 1', 'Priority 2', 'Priority 3', 'Priority 4']
-
-# Convertir a categorías ordenadas
-dfp['Priority'] = pd.Categorical(dfp['Priority'], categories=sap_priority_order, ordered=True)
-dfp['cvss_severity'] = pd.Categorical(dfp['cvss_severity'], categories=cvss_severity_order, ordered=True)
-dfp['priority_l'] = pd.Categorical(dfp['priority_l'], categories=sploitscan_order, ordered=True)
-dfp['priority'] = pd.Categorical(dfp['priority'], categories=cve_prioritizer_order, ordered=True)
-
-# Ordenar el DataFrame por año y luego por las categorías
-dfp = dfp.sort_values(by=['sap_note_year', 'Priority', 'cvss_severity', 'priority_l', 'priority'])
-
-#dfp = filtered_df[['sap_note_year','year','priority_l','priority','Priority','cvss_severity']].sort_values(by='sap_note_year')
-#dfp['team'] = pd.factorize(dfp['year'])[0].astype('int')
-fig_parallel = px.parallel_categories(
-    dfp, dimensions=['sap_note_year','Priority','cvss_severity','priority_l','priority'],
-    labels={'sap_note_year':'Year',
-            'priority_l':'SploitScan',
-            'priority':'CVE-Prioritizer',
-            'Priority':'SAP',
-            'cvss_severity':'cvssSeverity'},
-            color=dfp['sap_note_year'],
-            #range_color=year_c[1])  '#4e79a7' #5f45bf '#3b2e8c' #5eadf2
-            color_continuous_scale=['#210d4f','#610046','#070108','#04adbf','#4e79a7',
-                                    '#5f45bf','#5eadf2','#3b2e8c','#ba38f2','#ff1493','#bf00c4'],
-            color_continuous_midpoint=2022)
+def build_parallel():
+    # Preparar datos con categorías ordenadas
+    dfp = filtered_df[['sap_note_year','year','priority_l','priority','Priority','cvss_severity']].copy()
+
+    # Definir el orden específico para cada categoría
+    sap_priority_order = ['Critical', 'High', 'Medium', 'Low']
+    cvss_severity_order = ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']
+    sploitscan_order = ['A+', 'A', 'B', 'C', 'D', 'E']
+    cve_prioritizer_order = ['Priority 1+', 'Priority 1', 'Priority 2', 'Priority 3', 'Priority 4']
+
+    # Convertir a categorías ordenadas
+    dfp['Priority'] = pd.Categorical(dfp['Priority'], categories=sap_priority_order, ordered=True)
+    dfp['cvss_severity'] = pd.Categorical(dfp['cvss_severity'], categories=cvss_severity_order, ordered=True)
+    dfp['priority_l'] = pd.Categorical(dfp['priority_l'], categories=sploitscan_order, ordered=True)
+    dfp['priority'] = pd.Categorical(dfp['priority'], categories=cve_prioritizer_order, ordered=True)
+
+    # Ordenar el DataFrame por año y luego por las categorías
+    dfp = dfp.sort_values(by=['sap_note_year', 'Priority', 'cvss_severity', 'priority_l', 'priority'])
+
+    #dfp = filtered_df[['sap_note_year','year','priority_l','priority','Priority','cvss_severity']].sort_values(by='sap_note_year')
+    #dfp['team'] = pd.factorize(dfp['year'])[0].astype('int')
+    fig_parallel = px.parallel_categories(
+        dfp, dimensions=['sap_note_year','Priority','cvss_severity','priority_l','priority'],
+        labels={'sap_note_year':'Year',
+                'priority_l':'SploitScan',
+                'priority':'CVE-Prioritizer',
+                'Priority':'SAP',
+                'cvss_severity':'cvssSeverity'},
+                color=dfp['sap_note_year'],
+                #range_color=year_c[1])  '#4e79a7' #5f45bf '#3b2e8c' #5eadf2
+                color_continuous_scale=['#210d4f','#610046','#070108','#04adbf','#4e79a7',
+                                        '#5f45bf','#5eadf2','#3b2e8c','#ba38f2','#ff1493','#bf00c4'],
+                color_continuous_midpoint=2022)
+    return fig_parallel
+
+fig_parallel = cached_figure("parallel", filter_key, build_parallel)
 st.plotly_chart(fig_parallel, theme=None, use_container_width=True)
 
 st.divider()
 
 # Vista Comparativa de Meses entre Años
-with st.expander("Comparative Analysis: Vulnerabilities by Month across Years",
-                 expanded=False, icon=":material/view_timeline:"):
+comparative = st.expander("Comparative Analysis: Vulnerabilities by Month across Years",
+                          expanded=False, icon=":material/view_timeline:", key="exp_comparative", on_change="rerun")
+with comparative:
+    # Nothing below runs while the expander is collapsed, and only the selected tab builds its content
+    if comparative.open:
     
-    # Preparar datos para la comparación mensual
-    def prepare_monthly_comparison_data(df_data):
-        # Definir el orden correcto de los meses
-        month_order = [
-            'January', 'February', 'March', 'April', 'May', 'June',
-            'July', 'August', 'September', 'October', 'November', 'December'
-        ]
+        # Preparar datos para la comparación mensual
+        def prepare_monthly_comparison_data(df_data):
+            # Definir el orden correcto de los meses
+            month_order = [
+                'January', 'February', 'March', 'April', 'May', 'June',
+                'July', 'August', 'September', 'October', 'November', 'December'
+            ]
         
-        # Agrupar por año y mes
-        #monthly_data = df_data.groupby(['sap_note_year', 'monthName']).size().reset_index(name='vulnerability_count')
-        #st.write(monthly_data)
+            # Agrupar por año y mes
+            #monthly_data = df_data.groupby(['sap_note_year', 'monthName']).size().reset_index(name='vulnerability_count')
+            #st.write(monthly_data)
 
-        monthly_data = df_data.groupby(df_data['datePublished'].dt.to_period('M')).size().reset_index(name='vulnerability_count')
-        monthly_data['monthName'] = monthly_data['datePublished'].apply(lambda x: x.strftime('%B'))
-        monthly_data['sap_note_year'] = monthly_data['datePublished'].apply(lambda x: x.strftime('%Y'))
-        #st.write(monthly_data)
+            monthly_data = df_data.groupby(df_data['datePublished'].dt.to_period('M')).size().reset_index(name='vulnerability_count')
+            monthly_data['monthName'] = monthly_data['datePublished'].apply(lambda x: x.strftime('%B'))
+            monthly_data['sap_note_year'] = monthly_data['datePublished'].apply(lambda x: x.strftime('%Y'))
+            #st.write(monthly_data)
 
-        # Crear pivot table para facilitar la visualización
-        pivot_data = monthly_data.pivot(index='monthName', columns='sap_note_year', values='vulnerability_count').fillna(0)
+            # Crear pivot table para facilitar la visualización
+            pivot_data = monthly_data.pivot(index='monthName', columns='sap_note_year', values='vulnerability_count').fillna(0)
         
-        # Reordenar los meses cronológicamente
-        pivot_data = pivot_data.reindex([month for month in month_order if month in pivot_data.index])
+            # Reordenar los meses cronológicamente
+            pivot_data = pivot_data.reindex([month for month in month_order if month in pivot_data.index])
         
-        return pivot_data, monthly_data
+            return pivot_data, monthly_data
     
-    pivot_data, monthly_data = prepare_monthly_comparison_data(filtered_df)
+        pivot_data, monthly_data = prepare_monthly_comparison_data(filtered_df)
 
     
-    # Crear tabs para diferentes visualizaciones
-    tab1, tab2, tab3, tab4 = st.tabs([":material/show_chart: Line Chart",
-                                ":material/bar_chart_4_bars: Bar Chart",
-                                ":material/shadow_add: Summary",
-                                ":material/network_intel_node: Data Model"])
+        # Crear tabs para diferentes visualizaciones
+        tab1, tab2, tab3, tab4 = st.tabs([":material/show_chart: Line Chart",
+                                    ":material/bar_chart_4_bars: Bar Chart",
+                                    ":material/shadow_add: Summary",
+                                    ":material/network_intel_node: Data Model"],
+                                   key="tabs_comparative", on_change="rerun")
     
-    with tab1:
-        st.subheader("Trend Analysis: Monthly Vulnerabilities by Year", anchor=False)
-        
-        # Convertir pivot_data para plotly
-        fig_line = go.Figure()
+        with tab1:
+            if tab1.open:
+                st.subheader("Trend Analysis: Monthly Vulnerabilities by Year", anchor=False)
         
-        colors = ['#ff1493', '#ba38f2', '#5eadf2', '#04adbf', '#3b2e8c', '#bf00c4', '#4e79a7', '#5f45bf']
+                def build_line():
+                    # Convertir pivot_data para plotly
+                    fig_line = go.Figure()
         
-        for i, year in enumerate(pivot_data.columns):
-            fig_line.add_trace(go.Scatter(
-                x=pivot_data.index,
-                y=pivot_data[year],
-                mode='lines+markers',
-                name=f'Year {year}',
-                line=dict(color=colors[i % len(colors)], width=3),
-                marker=dict(size=8)
-            ))
+                    colors = ['#ff1493', '#ba38f2', '#5eadf2', '#04adbf', '#3b2e8c', '#bf00c4', '#4e79a7', '#5f45bf']
         
-        fig_line.update_layout(
-            title="Monthly Vulnerability Trends Across Years",
-            xaxis_title="Month",
-            yaxis_title="Number of Vulnerabilities",
-            hovermode='x unified',
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-        )
+                    for i, year in enumerate(pivot_data.columns):
+                        fig_line.add_trace(go.Scatter(
+                            x=pivot_data.index,
+                            y=pivot_data[year],
+                            mode='lines+markers',
+                            name=f'Year {year}',
+                            line=dict(color=colors[i % len(colors)], width=3),
+                            marker=dict(size=8)
+                        ))
         
-        st.plotly_chart(fig_line, use_container_width=True)
+                    fig_line.update_layout(
+                        title="Monthly Vulnerability Trends Across Years",
+                        xaxis_title="Month",
+                        yaxis_title="Number of Vulnerabilities",
+                        hovermode='x unified',
+                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+                    )
+                    return fig_line
+                fig_line = cached_figure("monthly_line", filter_key, build_line)
+                st.plotly_chart(fig_line, use_container_width=True)
     
-    with tab2:
-        st.subheader("Monthly Distribution: Vulnerabilities by Year", anchor=False)
-        
-        # Crear gráfico de barras agrupadas
-        fig_bar = px.bar(
-            monthly_data, 
-            x='monthName', 
-            y='vulnerability_count', 
-            color='sap_note_year',
-            title="Monthly Vulnerability Distribution by Year",
-            labels={
-                'monthName': 'Month',
-                'vulnerability_count': 'Number of Vulnerabilities',
-                'sap_note_year': 'Year'
-            },
-            color_discrete_sequence=['#ff1493', '#ba38f2', '#5eadf2', '#04adbf', '#3b2e8c', '#bf00c4', '#4e79a7', '#5f45bf']
-        )
+        with tab2:
+            if tab2.open:
+                st.subheader("Monthly Distribution: Vulnerabilities by Year", anchor=False)
         
-        # Ordenar meses cronológicamente
-        month_order = [
-            'January', 'February', 'March', 'April', 'May', 'June',
-            'July', 'August', 'September', 'October', 'November', 'December'
-        ]
-        fig_bar.update_xaxes(categoryorder='array', categoryarray=month_order)
-        fig_bar.update_layout(legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+                def build_bar():
+                    # Crear gráfico de barras agrupadas
+                    fig_bar = px.bar(
+                        monthly_data, 
+                        x='monthName', 
+                        y='vulnerability_count', 
+                        color='sap_note_year',
+                        title="Monthly Vulnerability Distribution by Year",
+                        labels={
+                            'monthName': 'Month',
+                            'vulnerability_count': 'Number of Vulnerabilities',
+                            'sap_note_year': 'Year'
+                        },
+                        color_discrete_sequence=['#ff1493', '#ba38f2', '#5eadf2', '#04adbf', '#3b2e8c', '#bf00c4', '#4e79a7', '#5f45bf']
+                    )
         
-        st.plotly_chart(fig_bar, use_container_width=True)
+                    # Ordenar meses cronológicamente
+                    month_order = [
+                        'January', 'February', 'March', 'April', 'May', 'June',
+                        'July', 'August', 'September', 'October', 'November', 'December'
+                    ]
+                    fig_bar.update_xaxes(categoryorder='array', categoryarray=month_order)
+                    fig_bar.update_layout(legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+                    return fig_bar
+                fig_bar = cached_figure("monthly_bar", filter_key, build_bar)
+                st.plotly_chart(fig_bar, use_container_width=True)
     
-    with tab3:
-        st.subheader("Statistical Summary", anchor=False)
+        with tab3:
+            if tab3.open:
+                st.subheader("Statistical Summary", anchor=False)
         
-        col1, col2 = st.columns(2)
+                col1, col2 = st.columns(2)
         
-        with col1:
-            st.write("**Top 3 Months (Total Vulnerabilities)**")
-            monthly_totals = pivot_data.sum(axis=1).sort_values(ascending=False).head(3)
-            for month, total in monthly_totals.items():
-                st.metric(month, int(total), delta=int(total) - int(pivot_data.sum(axis=1).min()),
-                            delta_color="inverse" if int(total) < int(pivot_data.sum(axis=1).mean()) else "normal", border=True,
-                            help="Total vulnerabilities reported in this month across all selected years.")
+                with col1:
+                    st.write("**Top 3 Months (Total Vulnerabilities)**")
+                    monthly_totals = pivot_data.sum(axis=1).sort_values(ascending=False).head(3)
+                    for month, total in monthly_totals.items():
+                        st.metric(month, int(total), delta=int(total) - int(pivot_data.sum(axis=1).min()),
+                                    delta_color="inverse" if int(total) < int(pivot_data.sum(axis=1).mean()) else "normal", border=True,
+                                    help="Total vulnerabilities reported in this month across all selected years.")
         
-        with col2:
-            st.write("**Year with Most Vulnerabilities**")
-            yearly_totals = pivot_data.sum(axis=0).sort_values(ascending=False)
-            for year, total in yearly_totals.head(3).items():
-                st.metric(f"Year {year}", int(total), delta=int(total) - int(yearly_totals.min()),
-                          delta_color="inverse" if int(total) < int(yearly_totals.mean()) else "normal", border=True,
-                          help="Total vulnerabilities reported in this year across all selected months.")
+                with col2:
+                    st.write("**Year with Most Vulnerabilities**")
+                    yearly_totals = pivot_data.sum(axis=0).sort_values(ascending=False)
+                    for year, total in yearly_totals.head(3).items():
+                        st.metric(f"Year {year}", int(total), delta=int(total) - int(yearly_totals.min()),
+                                  delta_color="inverse" if int(total) < int(yearly_totals.mean()) else "normal", border=True,
+                                  help="Total vulnerabilities reported in this year across all selected months.")
         
-        st.write("**Detailed Monthly Statistics by Year**")
-        st.dataframe(
-            pivot_data.round(0).astype(int),
-            width='stretch'
-        )
+                st.write("**Detailed Monthly Statistics by Year**")
+                st.dataframe(
+                    pivot_data.round(0).astype(int),
+                    width='stretch'
+                )
         
-        # Estadísticas adicionales
-        st.write("**Monthly Averages and Peaks**")
-        stats_df = pd.DataFrame({
-            'Month': pivot_data.index,
-            'Average': pivot_data.mean(axis=1).round(2),
-            'Peak Year': pivot_data.idxmax(axis=1),
-            'Peak Value': pivot_data.max(axis=1),
-            'Total': pivot_data.sum(axis=1)
-        })
-        st.dataframe(stats_df, hide_index=True, width='stretch')
-
-    with tab4:
-            st.subheader(':primary[Data Flow] Diagram', anchor=False)
-            st.image('static/data_flow_rich.svg', width='stretch')
+                # Estadísticas adicionales
+                st.write("**Monthly Averages and Peaks**")
+                stats_df = pd.DataFrame({
+                    'Month': pivot_data.index,
+                    'Average': pivot_data.mean(axis=1).round(2),
+                    'Peak Year': pivot_data.idxmax(axis=1),
+                    'Peak Value': pivot_data.max(axis=1),
+                    'Total': pivot_data.sum(axis=1)
+                })
+                st.dataframe(stats_df, hide_index=True, width='stretch')
+
+        with tab4:
+            if tab4.open:
+                    st.subheader(':primary[Data Flow] Diagram', anchor=False)
+                    st.image('static/data_flow_rich.svg', width='stretch')
 
 # Continúa con el resto del código original...# ...existing code...
 
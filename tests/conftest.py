@@ -0,0 +1,44 @@
+import csv
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+for path in (REPO_ROOT, REPO_ROOT / 'sap_cve_updater'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+COLUMNS = ['cve_id', 'Note#', 'Title', 'Priority', 'epss']
+
+
+def sap_row(note, cve, title=None, **values):
+    return {'cve_id': cve, 'Note#': str(note), 'Title': title or f"[{cve}] Vulnerability in SAP NetWeaver",
+            'Priority': values.pop('Priority', 'High'), 'epss': values.pop('epss', '0.1'), **values}
+
+
+@pytest.fixture
+def sap_rows():
+    """Rows shaped like data/sap_cve_2026.csv, with the repeats the real masters have: an
+    'Update to security note' re-publication, a Title differing only in case, an exact copy"""
+    return [
+        sap_row(3000001, 'CVE-2025-0001'),
+        sap_row(3000001, 'CVE-2025-0001', 'Update to security note released on May 2025 Patch Day: [CVE-2025-0001]'),
+        sap_row(3000001, 'CVE-2025-0001', 'UPDATE TO SECURITY NOTE released on May 2025 Patch Day: [CVE-2025-0001]'),
+        sap_row(3000002, 'CVE-2025-0002', Priority='Medium'),
+        sap_row(3000002, 'CVE-2025-0002', Priority='Medium'),
+        sap_row(3000003, 'CVE-2025-0003', epss=''),
+    ]
+
+
+def write_csv(path, rows, columns=COLUMNS):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
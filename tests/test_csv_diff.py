@@ -0,0 +1,52 @@
+import json
+
+from sap_utils import CSVAnalyzer, CSVDiff
+from conftest import sap_row, write_csv
+
+
+def diff(tmp_path, old, new, key=None):
+    return CSVDiff(write_csv(tmp_path / 'old.csv', old), write_csv(tmp_path / 'new.csv', new), key).run()
+
+
+def test_identical_files(tmp_path, sap_rows):
+    rows = diff(tmp_path, sap_rows, sap_rows).summary()['rows']
+    assert (rows['added'], rows['removed'], rows['changed']) == (0, 0, 0)
+    assert rows['duplicate_keys'] == {'file1': 3, 'file2': 3}
+
+
+def test_repeated_keys_are_diffed_like_other_rows(tmp_path, sap_rows):
+    new = [dict(r) for r in sap_rows]
+    new[1]['epss'] = '0.9'  # the re-publication row
+    del new[4]  # the exact copy
+    new.append(sap_row(3000004, 'CVE-2025-0004'))
+    result = diff(tmp_path, sap_rows, new)
+
+    rows = result.summary()['rows']
+    assert (rows['added'], rows['removed'], rows['changed']) == (1, 1, 1)
+    (key, fields), = result.changed
+    assert key[:2] == ('3000001', 'CVE-2025-0001') and fields == {'epss': ['0.1', '0.9']}
+    assert result.removed[0][0][-1] == 1  # second occurrence of the copy
+    assert result.summary()['fields_changed'] == {'epss': 1}
+
+
+def test_cve_key_uses_the_occurrence(tmp_path, sap_rows):
+    new = [dict(r) for r in sap_rows]
+    new[2]['Priority'] = 'Low'
+    result = diff(tmp_path, sap_rows, new, key=['cve_id'])
+    assert result.id_columns == ['cve_id', '_occurrence']
+    assert [dict(zip(result.id_columns, k)) for k, _ in result.changed] == [{'cve_id': 'CVE-2025-0001', '_occurrence': 2}]
+
+
+def test_compare_prints_and_exports_the_change_set(tmp_path, sap_rows, capsys):
+    new = [dict(r) for r in sap_rows]
+    new[4]['Priority'] = 'Low'  # the repeated (Note#, cve_id, Title) row
+    old_path, new_path = write_csv(tmp_path / 'old.csv', sap_rows), write_csv(tmp_path / 'new.csv', new)
+
+    result = CSVAnalyzer(old_path).load().compare(new_path, output_file=tmp_path / 'changes.jsonl')
+    assert '3000002 / CVE-2025-0002' in capsys.readouterr().out
+
+    with open(tmp_path / 'changes.jsonl', encoding='utf-8') as f:
+        summary, *changes = [json.loads(line) for line in f]
+    assert summary['rows']['changed'] == 1 and len(changes) == 1 == len(result.changed)
+    assert changes[0]['key']['_occurrence'] == 1
+    assert changes[0]['fields'] == {'Priority': ['Medium', 'Low']}
@@ -0,0 +1,47 @@
+from sap_cve_store import CVEStore
+
+
+def record(cve_id, updated, product='SAP NetWeaver'):
+    return {
+        'dataType': 'CVE_RECORD', 'dataVersion': '5.1',
+        'cveMetadata': {'cveId': cve_id, 'state': 'PUBLISHED', 'datePublished': '2025-01-14T00:00:00',
+                        'dateUpdated': updated, 'assignerOrgId': 'dropped'},
+        'containers': {'cna': {
+            'descriptions': [{'lang': 'en', 'value': f'{cve_id} in {product}'}],
+            'affected': [{'vendor': 'SAP_SE', 'product': product, 'versions': [{'version': '7.50'}]}],
+            'x_generator': 'dropped',
+        }},
+    }
+
+
+def test_update_adds_newer_records_only(tmp_path):
+    store = CVEStore(tmp_path / 'store')
+    assert store.update([record('CVE-2025-0001', '2025-01-14T00:00:00'),
+                         record('CVE-2025-0002', '2025-01-14T00:00:00')])['added'] == 2
+
+    stats = store.update([record('CVE-2025-0001', '2025-03-01T00:00:00', 'SAP S/4HANA'),
+                          record('CVE-2025-0002', '2024-12-01T00:00:00', 'older'),
+                          record('CVE-2025-0003', '2025-01-14T00:00:00')])
+    assert stats == {'read': 3, 'added': 1, 'updated': 1, 'unchanged': 1}
+    assert len(store) == 3
+    assert store.get('CVE-2025-0001')['containers']['cna']['affected'] == [{'vendor': 'SAP_SE', 'product': 'SAP S/4HANA'}]
+    assert store.get('CVE-2025-0002')['containers']['cna']['affected'][0]['product'] == 'SAP NetWeaver'
+
+
+def test_get_many_and_updated_from_a_new_instance(tmp_path):
+    CVEStore(tmp_path / 'store').update([record(f'CVE-2025-{i:04d}', '2025-01-14T00:00:00') for i in range(1, 6)]
+                                        + [record('CVE-2025-0002', '2025-02-01T00:00:00', 'newest')])
+
+    store = CVEStore(tmp_path / 'store')
+    records = store.get_many(['cve-2025-0002', 'CVE-2025-0005', 'CVE-2025-9999'])
+    assert sorted(records) == ['CVE-2025-0002', 'CVE-2025-0005']
+    assert records['CVE-2025-0002']['containers']['cna']['affected'][0]['product'] == 'newest'
+    assert 'assignerOrgId' not in records['CVE-2025-0005']['cveMetadata']
+    assert 'CVE-2025-0003' in store and 'CVE-2025-9999' not in store
+    assert store.updated(['CVE-2025-0001', 'CVE-2025-9999']).tolist() == [1736812800, -1]
+
+
+def test_empty_store():
+    store = CVEStore('/nonexistent/cve_store')
+    assert len(store) == 0
+    assert store.get_many(['CVE-2025-0001']) == {}
@@ -0,0 +1,23 @@
+import pytest
+
+from sap_cve_updater_v3 import CVEDataUpdater
+
+
+def updater(tmp_path, input_csv):
+    return CVEDataUpdater(str(input_csv), str(tmp_path / 'out.csv'), str(tmp_path / 'updater.log'),
+                          str(tmp_path / 'checkpoint.json'))
+
+
+def test_unreadable_input_exits_non_zero(tmp_path, monkeypatch):
+    run = updater(tmp_path, tmp_path / 'in.csv')
+    monkeypatch.setattr(run, 'read_input_csv', lambda: None)
+    with pytest.raises(SystemExit) as exit_info:
+        run.run()
+    assert exit_info.value.code == 1
+    assert not (tmp_path / 'out.csv').exists()
+
+
+def test_missing_input_exits_non_zero(tmp_path):
+    with pytest.raises(SystemExit) as exit_info:
+        updater(tmp_path, tmp_path / 'missing.csv').run()
+    assert exit_info.value.code == 1
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from sap_cwe import (CWENormalizer, CWERankIndex, cwe_normalizer, cwe_rank_index, cwe_table_version,
+                     read_cwe_rank_index, top25_files, top25_sources_version)
+
+TABLE = pd.DataFrame({
+    'kind': ['cve', 'name', 'name', 'pattern', 'pattern'],
+    'key': ['CVE-2025-0001', 'Cross-Site Scripting', 'Missing Authorization check', r'sql\s*injection',
+            r'denial[\s-]+of[\s-]+service'],
+    'cweId': ['CWE-502', 'CWE-79', 'CWE-862', 'CWE-89', 'CWE-400'],
+})
+
+
+def test_normalize_ids_names_and_patterns():
+    normalizer = CWENormalizer(TABLE)
+    values = pd.Series(['CWE-79', 'cwe 20', 'CWE-20,CWE-116', 'CW-653', '  cross-site   SCRIPTING ',
+                        'Blind SQL Injection', 'Denial of service (DoS)', 'Buffer overflow', None, np.nan],
+                       index=range(10, 20), dtype=object)
+    out = normalizer.normalize(values)
+    assert out.index.tolist() == values.index.tolist()
+    assert out.iloc[:8].tolist() == ['CWE-79', 'CWE-20', 'CWE-20', 'CWE-653', 'CWE-79', 'CWE-89', 'CWE-400',
+                                     'Buffer overflow']
+    assert out.iloc[8:].isna().all()
+
+
+def test_cve_fixes_apply_where_the_value_is_not_a_cwe_id():
+    normalizer = CWENormalizer(TABLE)
+    cwe_ids = pd.Series(['NVD-CWE-noinfo', None, 'CWE-79'])
+    cve_ids = pd.Series(['cve-2025-0001', 'CVE-2025-0001', 'CVE-2025-0001'])
+    assert normalizer.normalize(cwe_ids, cve_ids).tolist() == ['CWE-502', 'CWE-502', 'CWE-79']
+    assert normalizer.normalize_one('Missing Authorization Check') == 'CWE-862'
+    assert normalizer.normalize_one(None, 'CVE-2025-0001') == 'CWE-502'
+
+
+def test_shared_table_file(tmp_path):
+    path = tmp_path / 'cwe_normalization.csv'
+    path.write_text('# version: 7\nkind,key,cweId\nname,Code Injection,CWE-94\n')
+    normalizer = cwe_normalizer(path)
+    assert cwe_table_version(path).startswith('7:')
+    assert normalizer.normalize_one('code injection') == 'CWE-94'
+    assert cwe_normalizer(path) is normalizer
+
+
+def top25_csv(path, cwes, header='Rank,ID,Name'):
+    path.write_text(header + '\n' + ''.join(f'{rank},{cwe},name\n' for rank, cwe in enumerate(cwes, 1)))
+    return path
+
+
+def test_rank_index_uses_the_edition_in_force(tmp_path):
+    top25_csv(tmp_path / 'cwe_top_25.csv', ['CWE-787', 'CWE-79'], 'Rank,ID,Name,Rank Change vs. 2022')
+    top25_csv(tmp_path / 'cwe_top_25_2024.csv', ['CWE-79', 'CWE-787', 'CWE-89'])
+    index = CWERankIndex.from_files(tmp_path, tmp_path / 'ranks.parquet')
+    assert index.editions.tolist() == [2023, 2024] and index.latest == 2024
+
+    cwes = ['CWE-79', 'CWE-89', 'CWE-20', None]
+    np.testing.assert_array_equal(index.ranks(cwes), [1, 3, np.nan, np.nan])
+    np.testing.assert_array_equal(index.ranks(cwes, edition=2023), [2, np.nan, np.nan, np.nan])
+    np.testing.assert_array_equal(index.ranks(['CWE-79'] * 5, years=['2021', 2023, '2024', 2026, None]),
+                                  [2, 2, 1, 1, 1])
+    assert sorted(index.members(2023)) == ['CWE-787', 'CWE-79']
+
+
+def test_rank_index_is_rebuilt_when_an_edition_changes(tmp_path):
+    path = tmp_path / 'ranks.parquet'
+    top25_csv(tmp_path / 'cwe_top_25_2024.csv', ['CWE-79'])
+    CWERankIndex.from_files(tmp_path, path)
+    version = top25_sources_version(top25_files(tmp_path))
+    assert read_cwe_rank_index(version, path) is not None
+
+    top25_csv(tmp_path / 'cwe_top_25_2025.csv', ['CWE-862', 'CWE-79'])
+    assert read_cwe_rank_index(top25_sources_version(top25_files(tmp_path)), path) is None
+    index = cwe_rank_index(tmp_path)
+    assert index.latest == 2025 and index.ranks(['CWE-79']).tolist() == [2]
+    assert cwe_rank_index(tmp_path) is index
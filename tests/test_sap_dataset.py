@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+
+from sap_dataset import build_dataset, dataset_is_current, dataset_years, partition_version, read_partitions
+
+
+def dataset_csvs(tmp_path):
+    current = pd.DataFrame({'cve_id': ['CVE-2022-0001', 'CVE-2024-0001', 'CVE-2025-0001', 'CVE-2020-0009'],
+                            'Note#': [3100001.0, 3400001.0, 3500001.0, 2900009.0],
+                            'cvss': [9.1, 5.4, 7.5, 6.1], 'sap_note_year': [2022, 2024, 2025, 2020]})
+    history = pd.DataFrame({'cve_id': ['CVE-2019-0001', 'CVE-2020-0001', 'CVE-2024-0009'],
+                            'Note#': ['2800001', '2900001', '3400009'],
+                            'cvss': [8.8, 4.3, 9.9], 'sap_note_year': [2019, 2020, 2024]})
+    current.to_csv(tmp_path / 'current.csv', index=False)
+    history.to_csv(tmp_path / 'history.csv', index=False)
+    return tmp_path / 'current.csv', tmp_path / 'history.csv'
+
+
+def test_build_splits_the_years_between_the_csvs(tmp_path):
+    current, history = dataset_csvs(tmp_path)
+    path = tmp_path / 'dataset'
+    assert build_dataset(current, history, path, split=2021) == {'rows': 5, 'years': [2019, 2020, 2022, 2024, 2025]}
+    assert dataset_years(path) == [2019, 2020, 2022, 2024, 2025]
+
+    df = read_partitions([2020, 2024], columns=['cve_id', 'Note#'], path=path)
+    assert sorted(df['cve_id']) == ['CVE-2020-0001', 'CVE-2024-0001']
+    assert set(df.columns) == {'cve_id', 'Note#', 'sap_note_year'}
+    assert sorted(df['Note#']) == ['2900001', '3400001']
+
+
+def test_dataset_is_stale_once_a_source_csv_changes(tmp_path):
+    current, history = dataset_csvs(tmp_path)
+    path = tmp_path / 'dataset'
+    assert not dataset_is_current(path)
+
+    build_dataset(current, history, path)
+    assert dataset_is_current(path)
+    version = partition_version([2024], path)
+
+    stat = os.stat(current)
+    os.utime(current, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not dataset_is_current(path)
+    build_dataset(current, history, path)
+    assert dataset_is_current(path)
+    assert partition_version([2024], path) != version
+
+    history.unlink()
+    assert not dataset_is_current(path)
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import httpx
+
+import sap_enrich
+from sap_cve_store import CVEStore
+from sap_enrich import NVD_HOST, AsyncEnricher, prioritizer_priority, sploitscan_priority, stub_cve_record
+from sap_kev import KEVLookup
+
+
+class FakeAPIs:
+    """CVE Services, EPSS and NVD answers for an httpx.MockTransport, with the requests seen"""
+
+    def __init__(self, no_cvss=(), nvd_status=200, flaky=()):
+        self.no_cvss, self.nvd_status, self.flaky = set(no_cvss), nvd_status, set(flaky)
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append((request.url.host, request.url.path, time.monotonic()))
+        if request.url.host == 'cveawg.mitre.org':
+            cve = request.url.path.rsplit('/', 1)[-1]
+            if cve in self.flaky:
+                self.flaky.discard(cve)
+                return httpx.Response(503, headers={'Retry-After': '0'})
+            if cve.endswith('9999'):
+                return httpx.Response(404)
+            record = stub_cve_record(cve)
+            if cve in self.no_cvss:
+                del record['containers']['cna']['metrics']
+            return httpx.Response(200, json=record)
+        if request.url.host == 'api.first.org':
+            cves = request.url.params['cve'].split(',')
+            return httpx.Response(200, json={'data': [{'cve': c, 'epss': '0.05', 'percentile': '0.5'} for c in cves]})
+        if self.nvd_status != 200:
+            return httpx.Response(self.nvd_status)
+        return httpx.Response(200, json={'vulnerabilities': [{'cve': {'metrics': {'cvssMetricV31': [{'cvssData': {
+            'baseScore': 5.4, 'version': '3.1', 'baseSeverity': 'MEDIUM', 'vectorString': 'CVSS:3.1/AV:N'}}]}}}]})
+
+    def hits(self, host):
+        return [r for r in self.requests if r[0] == host]
+
+
+def enrich(apis, cve_ids, **kwargs):
+    async def run():
+        async with AsyncEnricher(**kwargs) as enricher:
+            await enricher._client.aclose()
+            enricher._client = httpx.AsyncClient(transport=httpx.MockTransport(apis))
+            return await enricher.enrich(cve_ids)
+
+    return asyncio.run(run())
+
+
+def test_priorities_follow_the_tools_rules():
+    assert prioritizer_priority(9.8, 0.01, True) == 'Priority 1+'
+    assert prioritizer_priority(9.8, 0.5, False) == 'Priority 1'
+    assert prioritizer_priority(6.0, None, False) == 'Priority 2'
+    assert prioritizer_priority(None, 0.2, False) == 'Priority 3'
+    assert sploitscan_priority(4.3, 0.01, False) == 'D'
+
+
+def test_results_have_the_shape_of_the_tool_outputs(monkeypatch):
+    monkeypatch.setattr(sap_enrich, 'kev_lookup', lambda: KEVLookup(['CVE-2025-0002']))
+    apis = FakeAPIs(flaky=['CVE-2025-0001'])
+    results = enrich(apis, ['CVE-2025-0001', 'CVE-2025-0002', 'CVE-2025-0001', 'CVE-2025-9999'])
+
+    assert list(results) == ['CVE-2025-0001', 'CVE-2025-0002', 'CVE-2025-9999']
+    row = results['CVE-2025-0001']['prioritizer']
+    assert (row['priority'], row['cvss'], row['epss'], row['kev']) == ('Priority 2', 8.8, 0.05, False)
+    assert results['CVE-2025-0002']['prioritizer']['priority'] == 'Priority 1+'
+    assert results['CVE-2025-0002']['sploitscan']['Priority'] == {'Priority': 'A+'}
+    assert results['CVE-2025-9999']['sploitscan'] is None
+    assert len(apis.hits('api.first.org')) == 1  # one EPSS batch
+
+
+def test_nvd_failures_keep_the_cve_without_cvss(monkeypatch):
+    monkeypatch.setattr(sap_enrich, 'kev_lookup', lambda: KEVLookup())
+    cves = ['CVE-2025-0001', 'CVE-2025-0002', 'CVE-2025-0003']
+    results = enrich(FakeAPIs(no_cvss=cves, nvd_status=403), cves, retries=0, host_intervals={NVD_HOST: 0})
+    assert sorted(results) == cves
+    assert {r['prioritizer']['cvss'] for r in results.values()} == {None}
+
+    results = enrich(FakeAPIs(no_cvss=cves[:1]), cves, host_intervals={NVD_HOST: 0})
+    assert results['CVE-2025-0001']['prioritizer']['cvss_version'] == 'CVSS 3.1'
+    assert results['CVE-2025-0001']['prioritizer']['cvss'] == 5.4
+
+
+def test_nvd_requests_are_paced(monkeypatch):
+    monkeypatch.setattr(sap_enrich, 'kev_lookup', lambda: KEVLookup())
+    cves = [f'CVE-2025-000{i}' for i in range(1, 5)]
+    apis = FakeAPIs(no_cvss=cves)
+    enrich(apis, cves, host_intervals={NVD_HOST: 0.1}, host_limits={NVD_HOST: 4})
+    times = sorted(t for _, _, t in apis.hits(NVD_HOST))
+    assert len(times) == 4
+    assert min(b - a for a, b in zip(times, times[1:])) >= 0.09
+
+
+def test_records_come_from_the_store_once_fetched(tmp_path, monkeypatch):
+    monkeypatch.setattr(sap_enrich, 'kev_lookup', lambda: KEVLookup())
+    store = CVEStore(tmp_path / 'cve_store')
+    apis = FakeAPIs()
+    first = enrich(apis, ['CVE-2025-0001', 'CVE-2025-0002'], store=store)
+    assert len(store) == 2 and len(apis.hits('cveawg.mitre.org')) == 2
+
+    apis = FakeAPIs()
+    assert enrich(apis, ['CVE-2025-0001', 'CVE-2025-0002'], store=CVEStore(tmp_path / 'cve_store')) == first
+    assert apis.hits('cveawg.mitre.org') == []
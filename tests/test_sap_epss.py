@@ -0,0 +1,89 @@
+import numpy as np
+
+import sap_epss
+from sap_epss import EPSSMatrix, EPSSStore
+
+
+def daily_file(directory, day, scores):
+    path = directory / f'epss_scores-{day}.csv'
+    with open(path, 'w') as f:
+        f.write(f'#model_version:v2025.03.14,score_date:{day}T00:00:00+0000\ncve,epss,percentile\n')
+        for cve, epss in scores.items():
+            f.write(f'{cve},{epss},0.5\n')
+    return path
+
+
+def test_ingest_appends_new_days_only(tmp_path):
+    store = EPSSStore(tmp_path / 'store')
+    files = [daily_file(tmp_path, '2025-03-01', {'CVE-2025-0001': 0.1, 'CVE-2025-0002': 0.2}),
+             daily_file(tmp_path, '2025-03-02', {'CVE-2025-0001': 0.3})]
+    assert store.ingest(files) == {'days_added': 2, 'days': 2, 'cves': 2}
+    assert store.ingest(files)['days_added'] == 0
+
+    files.append(daily_file(tmp_path, '2025-03-03', {'CVE-2025-0003': 0.4, 'CVE-2025-0001': 0.5}))
+    assert store.ingest(files) == {'days_added': 1, 'days': 3, 'cves': 3}
+    histories = store.histories(['CVE-2025-0001', 'CVE-2025-0002', 'CVE-2025-0003', 'CVE-2025-9999'])
+    np.testing.assert_allclose(histories['CVE-2025-0001'], [10, 30, 50], rtol=1e-6)
+    np.testing.assert_allclose(histories['CVE-2025-0002'], [20], rtol=1e-6)
+    np.testing.assert_allclose(histories['CVE-2025-0003'], [40], rtol=1e-6)
+    assert histories['CVE-2025-9999'] == []
+
+
+def test_readers_reopen_the_memmap_after_an_ingest(tmp_path):
+    writer, reader = EPSSStore(tmp_path / 'store'), EPSSStore(tmp_path / 'store')
+    assert len(reader) == 0 and reader.last_date is None
+
+    writer.ingest([daily_file(tmp_path, '2025-03-01', {'CVE-2025-0001': 0.1})])
+    assert len(reader) == 1
+    writer.ingest([daily_file(tmp_path, '2025-03-02', {'CVE-2025-0002': 0.2})])
+    assert len(reader) == 2 and str(reader.last_date) == '2025-03-02'
+    assert reader.columns(['CVE-2025-0002', 'CVE-2025-0001', 'CVE-2025-0003']).tolist() == [1, 0, -1]
+
+
+def test_new_cves_past_the_capacity_grow_the_matrix(tmp_path, monkeypatch):
+    monkeypatch.setattr(sap_epss, 'MIN_CAPACITY', 2)
+    store = EPSSStore(tmp_path / 'store')
+    store.ingest([daily_file(tmp_path, '2025-03-01', {'CVE-2025-0001': 0.1, 'CVE-2025-0002': 0.2})])
+    store.ingest([daily_file(tmp_path, '2025-03-02', {f'CVE-2025-000{i}': i / 10 for i in range(1, 6)})])
+    assert store.meta()['capacity'] == 8
+    dates, block = store.window(['CVE-2025-0002', 'CVE-2025-0005'], days=30)
+    assert [str(d) for d in dates] == ['2025-03-01', '2025-03-02']
+    np.testing.assert_allclose(block, [[0.2, 0.2], [np.nan, 0.5]], rtol=1e-6)
+
+
+def test_matrix_pads_a_short_store_on_the_left(tmp_path):
+    store = EPSSStore(tmp_path / 'store')
+    store.ingest([daily_file(tmp_path, '2025-03-01', {'CVE-2025-0001': 0.1}),
+                  daily_file(tmp_path, '2025-03-02', {'CVE-2025-0001': 0.2})])
+    matrix = store.matrix(['CVE-2025-0001', 'CVE-2025-0001'], days=4)
+    assert matrix.cve_ids.tolist() == ['CVE-2025-0001']
+    assert np.isnat(matrix.dates[:2]).all() and str(matrix.dates[-1]) == '2025-03-02'
+    np.testing.assert_allclose(matrix.values, [[np.nan, np.nan, 10, 20]], rtol=1e-6)
+
+
+def test_matrix_rows_follow_cve_ids():
+    matrix = EPSSMatrix.from_histories(['CVE-2025-0002', 'CVE-2025-0001', 'CVE-2025-0002'],
+                                       {'CVE-2025-0001': [1, 2, 3, 4, 5], 'CVE-2025-0002': [9]},
+                                       days=3, end='2025-03-10')
+    assert matrix.cve_ids.tolist() == ['CVE-2025-0002', 'CVE-2025-0001']
+    np.testing.assert_array_equal(matrix.take(['CVE-2025-0001', 'CVE-2025-9999'])[0], [3, 4, 5])
+    assert np.isnan(matrix.take(['CVE-2025-9999'])).all()
+    assert matrix.lists(['CVE-2025-0002', 'CVE-2025-9999']) == [[9.0], []]
+
+
+def test_matrix_summary_matches_the_list_trend_rule():
+    histories = {'up': [1, 2, 4], 'down': [4, 2, 1], 'flat': [2, 2.01, 2], 'one': [5], 'none': []}
+    summary = EPSSMatrix.from_histories(list(histories), histories, days=3).summary(list(histories))
+    assert summary['epss_trend'].tolist() == ['up', 'down', 'stable', 'stable', 'stable']
+    assert summary['epss_days'].tolist() == [3, 3, 3, 1, 0]
+    np.testing.assert_allclose(summary['epss_last'].iloc[:4], [4, 1, 2, 5])
+    np.testing.assert_allclose(summary['epss_avg'].iloc[:2], [7 / 3, 7 / 3], rtol=1e-6)
+    np.testing.assert_allclose(summary['epss_slope'].iloc[:2], [1.5, -1.5], rtol=1e-6)
+
+
+def test_concat_keeps_the_first_matrix_for_repeated_cves():
+    first = EPSSMatrix.from_histories(['A', 'B'], {'A': [1, 2], 'B': [3, 4]}, days=2, end='2025-03-10')
+    second = EPSSMatrix.from_histories(['B', 'C'], {'B': [7, 8], 'C': [5, 6]}, days=2, end='2025-03-10')
+    matrix = EPSSMatrix.concat([first, second])
+    assert matrix.cve_ids.tolist() == ['A', 'B', 'C']
+    np.testing.assert_array_equal(matrix.values, [[1, 2], [3, 4], [5, 6]])
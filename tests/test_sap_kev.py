@@ -0,0 +1,94 @@
+import json
+import random
+
+import pandas as pd
+
+from sap_kev import (KEV_PREFETCH, KEVLookup, OfflineKEVClient, fetch_kev_index, kev_lookup, read_kev_mirror,
+                     sync_kev_mirror, write_kev_mirror)
+
+
+def kev_records(days, per_day=3):
+    return [{'cve': [f'CVE-2025-{day:02d}{i:02d}'], 'vendorProject': 'SAP', 'product': 'NetWeaver',
+             'knownRansomwareCampaignUse': 'Unknown', 'date_added': f'2025-03-{day:02d}T00:00:00Z',
+             'cisa_date_added': None}
+            for day in range(1, days + 1) for i in range(per_day)]
+
+
+class CountingClient(OfflineKEVClient):
+    calls = 0
+
+    def index_vulncheck_kev_get(self, **kwargs):
+        self.calls += 1
+        return super().index_vulncheck_kev_get(**kwargs)
+
+
+class PinnedSDKClient:
+    """Like vulncheck_sdk 0.0.36: no sort/order parameters, pages in no particular order"""
+
+    def __init__(self, records):
+        self.records = random.Random(7).sample(records, len(records))
+        self.calls = 0
+
+    def index_vulncheck_kev_get(self, start_cursor=None, cursor=None, limit=None):
+        self.calls += 1
+        return OfflineKEVClient.index_vulncheck_kev_get(self, start_cursor, cursor, limit)
+
+
+def test_full_fetch_types_the_columns():
+    kev = fetch_kev_index(OfflineKEVClient(kev_records(5)), limit=4)
+    assert len(kev) == 15
+    assert kev['date_added'].dtype.kind == 'M'
+    assert kev['cve'].iloc[0] == 'CVE-2025-0500'
+
+
+def test_ordered_walk_stops_at_the_watermark():
+    client = CountingClient(kev_records(30))
+    kev = fetch_kev_index(client, pd.Timestamp('2025-03-28'), limit=4)
+    assert sorted(kev['date_added'].dt.day.unique()) == [28, 29, 30]
+    # The third page reaches day 27; the prefetch worker may have asked for a few more
+    assert 3 <= client.calls <= 3 + KEV_PREFETCH
+
+
+def test_unordered_walk_reads_every_page():
+    client = PinnedSDKClient(kev_records(30))
+    kev = fetch_kev_index(client, pd.Timestamp('2025-03-28'), limit=4)
+    assert sorted(kev['cve']) == [f'CVE-2025-{d}{i:02d}' for d in (28, 29, 30) for i in range(3)]
+    assert client.calls == 23
+
+
+def test_incremental_sync_adds_new_entries(tmp_path):
+    path = tmp_path / 'kev.parquet'
+    _, meta = sync_kev_mirror(OfflineKEVClient(kev_records(10)), path)
+    assert (meta['mode'], meta['rows'], meta['watermark']) == ('full', 30, '2025-03-10')
+
+    kev, meta = sync_kev_mirror(PinnedSDKClient(kev_records(12)), path)
+    assert (meta['mode'], meta['fetched'], meta['rows']) == ('incremental', 9, 36)
+    assert kev['cve'].is_unique and kev['date_added'].is_monotonic_decreasing
+
+
+def test_mirror_of_another_version_is_not_read(tmp_path):
+    path = tmp_path / 'kev.parquet'
+    write_kev_mirror(fetch_kev_index(OfflineKEVClient(kev_records(2))), path, version=0)
+    kev, meta = read_kev_mirror(path)
+    assert kev is None and meta['version'] == 0
+    _, meta = sync_kev_mirror(OfflineKEVClient(kev_records(2)), path)
+    assert meta['mode'] == 'full' and read_kev_mirror(path)[0] is not None
+
+
+def test_kev_lookup_joins_both_sources_and_reloads_on_change(tmp_path):
+    cisa, mirror = tmp_path / 'cisa_kev.json', tmp_path / 'kev.parquet'
+    assert len(kev_lookup(cisa, mirror)) == 0
+
+    with open(cisa, 'w') as f:
+        json.dump({'vulnerabilities': [{'cveID': 'CVE-2024-0001'}]}, f)
+    sync_kev_mirror(OfflineKEVClient(kev_records(1)), mirror)
+    lookup = kev_lookup(cisa, mirror)
+    assert len(lookup) == 4
+    assert 'cve-2024-0001' in lookup and ' CVE-2025-0100 ' in lookup and 'CVE-2025-9999' not in lookup
+    assert kev_lookup(cisa, mirror) is lookup
+
+    sync_kev_mirror(OfflineKEVClient(kev_records(2)), mirror)
+    assert len(kev_lookup(cisa, mirror)) == 7
+
+    flags = KEVLookup(['CVE-2025-0001']).flags(pd.Series(['cve-2025-0001', None, 'CVE-2025-0002'], dtype=object))
+    assert flags.tolist() == [True, False, False]
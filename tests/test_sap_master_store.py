@@ -0,0 +1,66 @@
+import pytest
+
+from sap_master_store import OCCURRENCE, MasterStore, row_ids
+from conftest import read_csv, sap_row, write_csv
+
+
+def test_load_and_export_keep_every_row(tmp_path, sap_rows):
+    store = MasterStore(tmp_path / 'master.db')
+    result = store.load_csv(write_csv(tmp_path / 'in.csv', sap_rows))
+    assert result == {'rows': 6, 'inserted': 6, 'updated': 0, 'skipped': 0}
+
+    store.export_csv(tmp_path / 'out.csv')
+    exported = read_csv(tmp_path / 'out.csv')
+    key = lambda r: (r['Note#'], r['cve_id'], r['Title'], r['Priority'], r['epss'])
+    assert sorted(map(key, exported)) == sorted(map(key, sap_rows))
+
+
+def test_reloading_a_file_updates_its_rows(tmp_path, sap_rows):
+    store = MasterStore(tmp_path / 'master.db')
+    store.upsert(sap_rows)
+    assert store.upsert(sap_rows) == {'rows': 6, 'inserted': 0, 'updated': 6, 'skipped': 0}
+    assert len(store) == 6
+
+
+def test_priority_and_empty_values():
+    store = MasterStore(':memory:')
+    store.upsert([sap_row(1, 'CVE-2025-0001', epss='0.1', Priority='High')], priority=2)
+    store.upsert([sap_row(1, 'CVE-2025-0001', epss='0.5', Priority='Low')], priority=1)
+    assert store.get('CVE-2025-0001')[0]['epss'] == '0.1'
+
+    store.upsert([sap_row(1, 'CVE-2025-0001', epss='0.3', Priority='  ')], priority=2)
+    row, = store.get('cve-2025-0001')
+    assert (row['epss'], row['Priority']) == ('0.3', 'High')
+
+    store.upsert([sap_row(1, 'CVE-2025-0001', epss='0.9')], priority=5, insert_only=True)
+    assert store.get('CVE-2025-0001')[0]['epss'] == '0.3'
+
+
+def test_rows_without_cve_are_skipped_and_note_numbers_normalized():
+    store = MasterStore(':memory:')
+    result = store.upsert([sap_row('3000001.0', 'CVE-2025-0001'), sap_row(3000002, '  ')])
+    assert result['skipped'] == 1
+    assert store.note(3000001)[0]['Note#'] == '3000001'
+
+
+def test_subset_upsert_with_occurrence_updates_its_own_row(sap_rows):
+    store = MasterStore(':memory:')
+    store.upsert(sap_rows)
+    ids = row_ids(sap_rows)
+    store.upsert([{**sap_rows[4], 'epss': '0.7', OCCURRENCE: ids[4][-1]}], priority=10)
+    assert sorted(r['epss'] for r in store.note(3000002)) == ['0.1', '0.7']
+    assert len(store) == 6
+
+
+def test_cve_keyed_store_merges_rows(sap_rows):
+    store = MasterStore(':memory:', key=('cve_id',))
+    result = store.upsert(sap_rows, replace_equal=False)
+    assert result['inserted'] == 3
+    assert store.get('CVE-2025-0001')[0]['Title'] == sap_rows[0]['Title']
+
+
+def test_store_keyed_without_occurrence_rejects_repeated_keys(sap_rows):
+    store = MasterStore(':memory:', key=('Note#', 'cve_id'))
+    with pytest.raises(ValueError, match='Repeated key'):
+        store.upsert(sap_rows)
+    assert len(store) == 0
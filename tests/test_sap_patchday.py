@@ -0,0 +1,52 @@
+import pandas as pd
+
+import sap_patchday
+from sap_master_store import row_ids
+from sap_patchday import PatchDayConfig, PatchDayRun, diff_patch_day, read_master, row_keys, upsert_master
+from conftest import sap_row, write_csv
+
+
+def scraped(url):
+    return pd.DataFrame({0: ['3000001', '3000002'],
+                         1: ['[CVE-2025-0001] Missing Authorization check', '[CVE-2025-0002] XSS'],
+                         2: ['High', 'Medium'], 3: ['8.1', '6.1']})
+
+
+def enriched(sap_df, *args, **kwargs):
+    return sap_df.rename(columns={'Col0': 'Note#', 'Col1': 'Title', 'Col2': 'Priority', 'Col3': 'CVSS'}).assign(
+        cvss=[8.1, 6.1], sap_note_year='2025')
+
+
+def test_scoring_error_keeps_the_patch_day_csv(tmp_path, monkeypatch):
+    def broken_score_table(df):
+        raise KeyError('epss')
+
+    monkeypatch.setattr(sap_patchday, 'scrape_patch_day', scraped)
+    monkeypatch.setattr(sap_patchday, 'merge_enrichment', enriched)
+    monkeypatch.setattr(sap_patchday, 'build_score_table', broken_score_table)
+    run = PatchDayRun(PatchDayConfig(year=2025, month=3, output_dir=tmp_path, sploitscan=False,
+                                     prioritizer=False, score=True))
+    assert [s.name for s in run.pipeline.stages] == ['extract', 'normalize', 'merge', 'persist', 'score']
+
+    result = run.run()
+    assert result['cve_id'].tolist() == ['CVE-2025-0001', 'CVE-2025-0002']
+    assert pd.read_csv(run.output_file)['Note#'].tolist() == [3000001, 3000002]
+    assert len(run.pipeline.stats['score'].failed) == 1 and run.scores_file == ''
+
+
+def test_incremental_diff_and_upsert_use_the_master_row_identity(tmp_path, sap_rows):
+    master_path = tmp_path / 'master.csv'
+    write_csv(master_path, sap_rows)
+    master = read_master(master_path)
+    assert row_keys(master).tolist() == row_ids(sap_rows)
+
+    scraped_rows = pd.DataFrame({'Col0': [r['Note#'] for r in sap_rows[:3]] + ['3000009'],
+                                 'Col1': [r['Title'] for r in sap_rows[:3]] + ['[CVE-2025-0009] New note'],
+                                 'cve_id': ['CVE-2025-0001'] * 3 + ['CVE-2025-0009']})
+    enrich, reused, changed = diff_patch_day(scraped_rows, master)
+    assert enrich['cve_id'].tolist() == ['CVE-2025-0009']
+    assert len(reused) == 3 and changed == []
+
+    new = pd.DataFrame([sap_row(3000009, 'CVE-2025-0009'), {**sap_rows[0], 'epss': '0.8'}])
+    assert upsert_master(master_path, new) == {'master_rows': 7, 'updated': 1, 'added': 1}
+    assert sorted(read_master(master_path)['epss'].fillna(0).tolist()) == [0, 0.1, 0.1, 0.1, 0.1, 0.1, 0.8]
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from sap_pipeline import Checkpoint, Pipeline, Stage
+
+
+def test_stages_run_in_order_and_keep_item_order_with_one_worker():
+    pipeline = Pipeline([Stage('double', lambda x: x * 2), Stage('inc', lambda x: x + 1)])
+    assert pipeline.run(range(50)) == [x * 2 + 1 for x in range(50)]
+
+
+def test_several_workers_process_every_item():
+    pipeline = Pipeline([Stage('square', lambda x: x * x, workers=4)], queue_size=2)
+    assert sorted(pipeline.run(range(100))) == [x * x for x in range(100)]
+    assert pipeline.stats['square'].processed == 100
+
+
+def test_batches_gather_and_fan_out():
+    sizes = []
+
+    def batch(items):
+        sizes.append(len(items))
+        return items
+
+    pipeline = Pipeline([
+        Stage('batch', batch, batch_size=3, fan_out=True),
+        Stage('gather', lambda items: sorted(items), gather=True),
+    ])
+    assert pipeline.run(range(7)) == [list(range(7))]
+    assert sizes == [3, 3, 1]
+
+
+def test_none_drops_the_item_and_errors_are_counted():
+    def fn(x):
+        if x == 3:
+            raise ValueError('bad item')
+        return None if x % 2 else x
+
+    pipeline = Pipeline([Stage('fn', fn)])
+    assert pipeline.run(range(6)) == [0, 2, 4]
+    assert len(pipeline.stats['fn'].failed) == 1
+
+
+def test_fatal_stage_aborts_the_run():
+    seen = []
+    lock = threading.Lock()
+
+    def persist(x):
+        with lock:
+            seen.append(x)
+        raise OSError('disk full')
+
+    pipeline = Pipeline([Stage('enrich', lambda x: x), Stage('persist', persist, fatal=True)], queue_size=1)
+    with pytest.raises(OSError, match='disk full'):
+        pipeline.run(range(1000))
+    assert len(seen) < 1000
+
+
+def test_checkpoint_results_are_reused_on_resume(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    calls = []
+
+    def enrich(cve):
+        calls.append(cve)
+        return None if cve == 'CVE-3' else {'cve_id': cve, 'score': len(calls)}
+
+    def stages():
+        return [Stage('enrich', enrich, key=lambda cve: f"enrich:{cve}")]
+
+    cves = ['CVE-1', 'CVE-2', 'CVE-3']
+    first = Pipeline(stages(), checkpoint=Checkpoint(path, interval=1)).run(cves)
+    assert calls == cves
+
+    calls.clear()
+    resumed = Pipeline(stages(), checkpoint=Checkpoint(path))
+    assert resumed.run(cves) == first
+    assert calls == ['CVE-3']  # None results are not checkpointed
+    assert resumed.stats['enrich'].cached == 2
+
+    calls.clear()
+    Pipeline(stages(), checkpoint=Checkpoint(path, reset=True)).run(cves)
+    assert calls == cves
+
+
+def test_key_errors_follow_the_stage_error_handling(tmp_path):
+    def key(item):
+        return f"enrich:{item['cve_id']}"
+
+    items = [{'cve_id': 'CVE-1'}, {'id': 'malformed'}, {'cve_id': 'CVE-2'}]
+    pipeline = Pipeline([Stage('enrich', lambda item: item, key=key)], checkpoint=Checkpoint(tmp_path / 'cp.json'))
+    assert pipeline.run(items) == [items[0], items[2]]
+    assert len(pipeline.stats['enrich'].failed) == 1
+
+    pipeline = Pipeline([Stage('enrich', lambda item: item, key=key, fatal=True)], queue_size=1)
+    with pytest.raises(KeyError):
+        pipeline.run(items * 100)
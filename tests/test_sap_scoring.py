@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from sap_epss import EPSSMatrix
+from sap_scoring import (WEIGHT_PROFILES, calculate_epss_trend, read_score_table, rescore, score_vulnerabilities,
+                         top_k, update_score_table)
+
+
+def test_score_table_keeps_each_epss_day_across_runs(tmp_path):
+    path = tmp_path / 'rethink_scores.parquet'
+    monday = EPSSMatrix.from_histories(['CVE-2025-0001', 'CVE-2025-0002'],
+                                       {'CVE-2025-0001': [1, 2, 3, 4], 'CVE-2025-0002': [10, 20, 30, 40]},
+                                       days=4, end='2025-03-10')
+    update_score_table(pd.DataFrame({'cve_id': monday.cve_ids, 'score': [1.0, 2.0]}), monday, path, sources=['a'])
+
+    wednesday = EPSSMatrix.from_histories(['CVE-2025-0002', 'CVE-2025-0003'],
+                                          {'CVE-2025-0002': [31, 41, 51, 61], 'CVE-2025-0003': [7]},
+                                          days=4, end='2025-03-12')
+    update_score_table(pd.DataFrame({'cve_id': wednesday.cve_ids, 'score': [3.0, 4.0]}), wednesday, path,
+                       sources=['b'])
+
+    scores, epss, meta = read_score_table(path)
+    assert scores['cve_id'].tolist() == ['CVE-2025-0002', 'CVE-2025-0003', 'CVE-2025-0001']
+    assert scores['score'].tolist() == [3.0, 4.0, 1.0]
+    assert meta['sources'] == ['b', 'a']
+    assert [str(d) for d in epss.dates] == ['2025-03-09', '2025-03-10', '2025-03-11', '2025-03-12']
+    np.testing.assert_array_equal(epss.take(['CVE-2025-0001'])[0], [3, 4, np.nan, np.nan])
+    np.testing.assert_array_equal(epss.take(['CVE-2025-0002'])[0], [31, 41, 51, 61])
+    np.testing.assert_array_equal(epss.take(['CVE-2025-0003'])[0], [np.nan, np.nan, np.nan, 7])
+
+
+def calculate_scores(row, kev_weight=3, cvss_multiplier=2, epss_up_multiplier=3, epss_stable_multiplier=2,
+                     cwe_weight=1.5):
+    """Row-wise scoring of the dashboard before the score table (streamlit_app.calculate_scores)"""
+    kev_score = kev_weight if row['kev'] else 0
+    cvss_score = row['cvss'] * cvss_multiplier
+    epss_trend = calculate_epss_trend(row['epss_l_30'])
+    epss_avg = np.mean(row['epss_l_30']) if len(row['epss_l_30']) > 0 else 0
+    epss_score = epss_avg * (epss_up_multiplier if epss_trend == 'up' else
+                             epss_stable_multiplier if epss_trend == 'stable' else 1)
+    cwe_score = cwe_weight if row['cwe_t25'] else 0
+    return {'epss_trend': epss_trend, 'epss_avg': epss_avg,
+            'composite_score': kev_score + cvss_score + epss_score + cwe_score + 1}
+
+
+def scored_frame(n=200, seed=1):
+    rng = np.random.default_rng(seed)
+    histories = [list(np.round(rng.uniform(0, 90, rng.integers(0, 31)), 4)) for _ in range(n)]
+    return pd.DataFrame({
+        'cve_id': [f'CVE-2025-{i:04d}' for i in range(n)],
+        'cvss': np.round(rng.uniform(4, 10, n), 1),
+        'kev': rng.random(n) < 0.2,
+        'cwe_t25': rng.random(n) < 0.5,
+        'epss_l_30': histories,
+    })
+
+
+def test_vectorized_scores_rank_like_the_row_wise_ones():
+    ydf = scored_frame()
+    expected = pd.concat([ydf, ydf.apply(calculate_scores, axis=1, result_type='expand')], axis=1)
+    expected = expected.sort_values(by='composite_score', ascending=False)
+
+    scored = score_vulnerabilities(ydf)
+    assert scored['cve_id'].tolist() == expected['cve_id'].tolist()
+    assert scored['epss_trend'].tolist() == expected['epss_trend'].tolist()
+    np.testing.assert_allclose(scored['composite_score'], expected['composite_score'], rtol=1e-5)
+    np.testing.assert_allclose(scored['epss_avg'], expected['epss_avg'], rtol=1e-5)
+
+
+def test_rescore_with_a_profile_matches_scoring_with_its_weights():
+    ydf = scored_frame()
+    weights = WEIGHT_PROFILES['Exploitation']
+    expected = pd.concat([ydf, ydf.apply(calculate_scores, axis=1, result_type='expand', kev_weight=50,
+                                         cvss_multiplier=1, epss_up_multiplier=4, epss_stable_multiplier=3)],
+                         axis=1)
+    # calculate_scores has a fixed down multiplier of 1, the profile uses 2
+    down = expected['epss_trend'] == 'down'
+    expected.loc[down, 'composite_score'] += expected.loc[down, 'epss_avg']
+
+    rescored = rescore(score_vulnerabilities(ydf), weights)
+    assert rescored['composite_score'].is_monotonic_decreasing
+    np.testing.assert_allclose(rescored.sort_index()['composite_score'], expected['composite_score'], rtol=1e-5)
+    assert rescore(ydf.assign(**score_vulnerabilities(ydf)[['epss_trend', 'epss_avg']]), weights,
+                   sort=False)['cve_id'].tolist() == ydf['cve_id'].tolist()
+
+
+def test_top_k_matches_a_full_sort():
+    ydf = score_vulnerabilities(scored_frame(300, seed=2)).sample(frac=1, random_state=3)
+    ydf = pd.concat([ydf, ydf.sample(100, random_state=4).assign(composite_score=lambda d: d['composite_score'] - 1)],
+                    ignore_index=True)
+    ranked = ydf.sort_values(by='composite_score', ascending=False, kind='stable')
+
+    for k in (1, 10, 50, 300):
+        assert top_k(ydf, k, by_cve=False).index.tolist() == ranked.index[:k].tolist()
+        cves = ranked['cve_id'].unique()[:k]
+        head = top_k(ydf, k)
+        assert head['cve_id'].unique().tolist() == cves.tolist()
+        assert len(head) == ydf['cve_id'].isin(cves).sum()
+        assert head.groupby('cve_id', sort=False).apply(lambda g: g.index.tolist(), include_groups=False).tolist() \
+            == [ydf.index[ydf['cve_id'] == cve].tolist() for cve in cves]
+
+
+def test_top_k_ties_and_unscored_cves():
+    ydf = pd.DataFrame({'cve_id': ['A', 'B', 'C', 'D', 'E'], 'composite_score': [5.0, 9.0, 5.0, np.nan, 1.0]})
+    assert top_k(ydf, 2)['cve_id'].tolist() == ['B', 'A', 'C']
+    assert top_k(ydf, 2, keep_ties=False)['cve_id'].tolist() == ['B', 'A']
+    assert top_k(ydf, 5)['cve_id'].tolist() == ['B', 'A', 'C', 'E', 'D']
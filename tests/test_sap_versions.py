@@ -0,0 +1,52 @@
+import pytest
+
+from sap_versions import VersionStore
+from conftest import COLUMNS, read_csv, sap_row, write_csv
+
+EXTRA = ['cve_id', 'Note#', 'Title', 'Priority', 'epss', 'kev']
+
+
+def datasets(sap_rows):
+    """Successive outputs: an edit of a re-published row, a removed exact copy, new rows,
+    a reordered file and a new column"""
+    v2 = [dict(r) for r in sap_rows]
+    v2[1]['epss'] = '0.9'
+    v3 = v2[:4] + v2[5:] + [sap_row(3000004, 'CVE-2025-0004')]
+    v4 = list(reversed(v3)) + [sap_row(3000004, 'CVE-2025-0004')]
+    v5 = [{**r, 'kev': 'True'} for r in v4]
+    return [(sap_rows, COLUMNS), (v2, COLUMNS), (v3, COLUMNS), (v4, COLUMNS), (v5, EXTRA)]
+
+
+def test_export_gives_back_every_recorded_csv(tmp_path, sap_rows):
+    store = VersionStore(tmp_path / 'versions', snapshot_every=3)
+    for i, (rows, columns) in enumerate(datasets(sap_rows)):
+        store.record_csv(write_csv(tmp_path / f"in{i + 1}.csv", rows, columns))
+
+    fresh = VersionStore(tmp_path / 'versions', snapshot_every=3)  # nothing cached
+    assert [e['rows'] for e in fresh.versions()] == [6, 6, 6, 7, 7]
+    for version in (5, 1, 4, 2, 3):
+        fresh.export_csv(version, tmp_path / 'out.csv')
+        assert read_csv(tmp_path / 'out.csv') == read_csv(tmp_path / f"in{version}.csv")
+
+
+def test_unchanged_file_is_not_recorded(tmp_path, sap_rows):
+    store = VersionStore(tmp_path / 'versions')
+    path = write_csv(tmp_path / 'in.csv', sap_rows)
+    assert store.record_csv(path)['version'] == 1
+    assert store.record_csv(path)['version'] == 1
+    assert store.record_csv(path, force=True)['version'] == 2
+
+
+def test_changes_are_composed_between_versions(tmp_path, sap_rows):
+    store = VersionStore(tmp_path / 'versions')
+    for i, (rows, columns) in enumerate(datasets(sap_rows)[:3]):
+        store.record_csv(write_csv(tmp_path / f"in{i + 1}.csv", rows, columns))
+
+    changes = store.changes(1, 3)
+    assert [r['cve_id'] for r in changes['added']] == ['CVE-2025-0004']
+    assert [r['Note#'] for r in changes['removed']] == ['3000002']
+    (note, cve, _, occurrence, values), = changes['changed']
+    assert (note, cve, occurrence, values) == ('3000001', 'CVE-2025-0001', 0, {'epss': ['0.1', '0.9']})
+    assert store.changes(3, 3) == {'added': [], 'changed': [], 'removed': []}
+    with pytest.raises(ValueError):
+        store.changes(3, 1)